@@ -121,6 +121,7 @@ USE_TZ = True
 
 CORS_ALLOW_ALL_ORIGINS = True  # for local dev
 CORS_ALLOW_CREDENTIALS = True
+CORS_EXPOSE_HEADERS = ["ETag", "Link", "X-Next-Cursor"]
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
@@ -140,3 +141,41 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ),
 }
+
+# Time budget for one scheduling request (ScheduleEventsView); callers can
+# ask for less or more with "deadline_ms", up to SCHEDULER_MAX_DEADLINE_MS.
+SCHEDULER_DEADLINE_MS = 50
+SCHEDULER_MAX_DEADLINE_MS = 200
+
+# How often each worker checks the database for a newer forecast than its
+# in-process snapshot (scheduler/forecast.py).
+FORECAST_CHECK_INTERVAL_S = 5.0
+
+# How often run_inference is scheduled, in minutes, aligned to the clock.
+# The forecast endpoint lets clients cache until the next run.
+FORECAST_RUN_INTERVAL_MIN = 30
+
+# Forecast runs older than this are deleted by run_inference; the current
+# run is always kept. Older runs are kept for backtesting.
+FORECAST_RUN_RETENTION_DAYS = 30
+
+# Events that started more than this many days ago are moved to the archive
+# table by the archive_events command; the exports still include them.
+EVENT_ARCHIVE_AFTER_DAYS = 365
+
+# How many days back (today included) the nightly reconcile_savings command
+# rebuilds the carbon savings rollups from the events.
+SAVINGS_RECONCILE_DAYS = 2
+
+# run_inference fetches its upstreams concurrently (scheduler/sources.py).
+# Per-source (request timeout in seconds, retries) overrides, keyed by
+# intensity_lags, weather_lags, generation_mix or weather_forecast.
+INFERENCE_SOURCE_BUDGETS = {}
+
+# Live carbon intensity (scheduler/carbon_intensity.py): upstream timeout,
+# how long a reading is reused, how long a last good reading may be served
+# while the upstream is down, and how long to wait before retrying it.
+CARBON_INTENSITY_TIMEOUT_S = 3.0
+CARBON_INTENSITY_TTL_S = 300.0
+CARBON_INTENSITY_MAX_STALE_S = 6 * 3600.0
+CARBON_INTENSITY_RETRY_AFTER_S = 30.0
@@ -0,0 +1,503 @@
+"""
+Timing comparison between a per-appliance sliding-window loop and the
+batch engine, per-job cost of the kernel itself, batch throughput for
+interruptible (EV) jobs, per-household latency of the joint
+capacity-constrained solver, how the batch engine scales with the
+forecast's slot count (finer slots over a 48-hour horizon), and fleet
+scheduling of 100k homes.
+
+run_suite is the regression suite: every registered engine on synthetic
+forecasts and households (see synthetic.py) at several scales, with
+throughput and peak memory, saved to and compared against a JSON baseline.
+It is what `python manage.py benchmark_scheduler` runs; new engines are
+added with @register_engine.
+
+Run from src/backend:
+    python -m scheduler.benchmarks
+"""
+
+import contextlib
+import io
+import platform
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from .kernel import best_start_slots, cheapest_slot_sets
+from .scheduler_utils import scheduler, batch_scheduler, schedule_households, _job_slots, _slot_index_to_datetime
+from .scheduler_alg import scheduler as strict_scheduler
+from .household_solver import anytime_scheduler, joint_scheduler
+from .fleet import fleet_schedule, fleet_scheduler
+from .synthetic import FORECAST_KINDS, make_forecast, make_households
+from .window_cache import forecast_version
+
+FORECAST_START = datetime(2025, 11, 1, 0, 0)
+JOB_COUNTS = (10, 1_000, 100_000)
+# 48 hours at 30, 15, 10 and 5 minutes: 96 to 576 slots.
+SLOT_WIDTHS = (30, 15, 10, 5)
+
+# Typical household loads in kW, EV charger included.
+HOUSEHOLD_POWERS_KW = (0.5, 1.0, 1.2, 2.0, 2.5, 3.0, 7.0)
+HOUSEHOLD_CAP_KW = 7.5
+
+
+def _diurnal_forecast(total_slots: int = 48, slot_minutes: int = 30) -> list[float]:
+    return make_forecast("diurnal", total_slots, slot_minutes)
+
+
+def _random_jobs(n_jobs: int, total_slots: int, seed: int = 0, slot_minutes: int = 30) -> list[dict]:
+    # Runtimes are 30 min to 4 h whatever the slot width, so finer slots mean longer windows in slots.
+    rng = random.Random(seed)
+    per_half_hour = 30 // slot_minutes
+    jobs = []
+    for i in range(n_jobs):
+        runtime_slots = rng.choice((1, 2, 3, 4, 8)) * per_half_hour
+        earliest = rng.randrange(0, total_slots - runtime_slots + 1)
+        latest_end = rng.randrange(earliest + runtime_slots, total_slots + 1)
+        jobs.append({
+            "name": f"job-{i}",
+            "runtime_min": runtime_slots * slot_minutes,
+            "earliest_start": (FORECAST_START + timedelta(minutes=slot_minutes * earliest)).isoformat(),
+            "latest_end": (FORECAST_START + timedelta(minutes=slot_minutes * latest_end)).isoformat(),
+        })
+    return jobs
+
+
+def _sliding_window_scheduler(appliances: list[dict], carbon_forecast: list[float], forecast_start_time: datetime,
+                              slot_minutes: int = 30) -> dict:
+    # The original per-appliance loop, kept as the baseline the batch engine is measured against.
+    schedule = {}
+    for appliance in appliances:
+        slots = _job_slots(appliance, forecast_start_time, len(carbon_forecast), {}, slot_minutes)
+        if slots is None:
+            schedule[appliance['name']] = None
+            continue
+        earliest, latest_start, runtime = slots
+        cost = sum(carbon_forecast[earliest:earliest + runtime])
+        best_cost, best_start = cost, earliest
+        for start in range(earliest + 1, latest_start + 1):
+            cost += carbon_forecast[start + runtime - 1] - carbon_forecast[start - 1]
+            if cost < best_cost:
+                best_cost, best_start = cost, start
+        schedule[appliance['name']] = _slot_index_to_datetime(best_start, forecast_start_time, slot_minutes).isoformat()
+    return schedule
+
+
+def _random_household(rng: random.Random, total_slots: int) -> list[dict]:
+    # 5-10 appliances whose windows mostly overlap in the evening/overnight,
+    # so the cap actually binds.
+    appliances = []
+    for i in range(rng.randint(5, 10)):
+        runtime_slots = rng.choice((1, 2, 3, 4, 8))
+        earliest = rng.randrange(0, total_slots // 2)
+        latest_end = min(total_slots, earliest + runtime_slots + rng.randrange(4, total_slots // 2))
+        appliances.append({
+            "name": f"appliance-{i}",
+            "runtime_min": runtime_slots * 30,
+            "earliest_start": (FORECAST_START + timedelta(minutes=30 * earliest)).isoformat(),
+            "latest_end": (FORECAST_START + timedelta(minutes=30 * latest_end)).isoformat(),
+            "power_kw": rng.choice(HOUSEHOLD_POWERS_KW),
+        })
+    return appliances
+
+
+def run_interruptible(job_counts=JOB_COUNTS, total_slots: int = 48) -> list[dict]:
+    """
+    Times batch_scheduler on fleets of interruptible EV-style jobs
+    (2-4 hours of charging anywhere in an overnight-sized window).
+    """
+    forecast = _diurnal_forecast(total_slots)
+    rows = []
+    for n_jobs in job_counts:
+        jobs = _random_jobs(n_jobs, total_slots)
+        for job in jobs:
+            job["runtime_min"] = min(job["runtime_min"] * 2, 240)
+            job["earliest_start"] = FORECAST_START.isoformat()
+            job["interruptible"] = True
+        elapsed, _ = _time(batch_scheduler, jobs, forecast, FORECAST_START)
+        rows.append({"jobs": n_jobs, "batch_scheduler_s": elapsed})
+    return rows
+
+
+def run_households(n_households: int = 1_000, total_slots: int = 48, seed: int = 0) -> dict:
+    """
+    Times joint_scheduler on random 5-10 appliance households under
+    HOUSEHOLD_CAP_KW. Returns mean / p99 / max latency in ms and the share of
+    households solved to optimality within the default time budget.
+    """
+    rng = random.Random(seed)
+    forecast = _diurnal_forecast(total_slots)
+    households = [_random_household(rng, total_slots) for _ in range(n_households)]
+
+    timings = []
+    optimal = 0
+    for appliances in households:
+        start = time.perf_counter()
+        _, stats = joint_scheduler(appliances, forecast, FORECAST_START, HOUSEHOLD_CAP_KW)
+        timings.append((time.perf_counter() - start) * 1000)
+        optimal += stats["optimal"]
+
+    timings.sort()
+    return {
+        "households": n_households,
+        "mean_ms": sum(timings) / len(timings),
+        "p99_ms": timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+        "max_ms": timings[-1],
+        "optimal_share": optimal / n_households,
+    }
+
+
+def run_resolution(slot_widths=SLOT_WIDTHS, n_jobs: int = 10_000, horizon_hours: int = 48) -> list[dict]:
+    """
+    Times the batch engine on the same mix of jobs over a 48-hour forecast
+    at each slot width, with the per-appliance loop on a 1,000 job
+    sample for reference. Costs should grow roughly linearly with slots.
+    """
+    rows = []
+    for slot_minutes in slot_widths:
+        total_slots = horizon_hours * 60 // slot_minutes
+        forecast = _diurnal_forecast(total_slots, slot_minutes)
+        jobs = _random_jobs(n_jobs, total_slots, slot_minutes=slot_minutes)
+
+        batch_s, actual = _time(batch_scheduler, jobs, forecast, FORECAST_START, None, slot_minutes)
+        sample = jobs[:1_000]
+        loop_s, expected = _time(_sliding_window_scheduler, sample, forecast, FORECAST_START, slot_minutes)
+        if {name: actual[name] for name in expected} != expected:
+            raise AssertionError(f"batch_scheduler disagrees with the loop at {slot_minutes}-minute slots")
+
+        cache = {}
+        slots = [_job_slots(job, FORECAST_START, total_slots, cache, slot_minutes) for job in jobs]
+        kernel_s, _ = _time(best_start_slots, forecast, *zip(*slots))
+
+        rows.append({
+            "slot_minutes": slot_minutes,
+            "slots": total_slots,
+            "batch_scheduler_s": batch_s,
+            "kernel_s": kernel_s,
+            "loop_1k_s": loop_s,
+        })
+    return rows
+
+
+def run_anytime(deadline_ms: float = 50, n_households: int = 200, total_slots: int = 48, seed: int = 1) -> dict:
+    """
+    Latency of anytime_scheduler under a deadline on large capped households
+    (40 appliances each, so the joint search rarely finishes in time).
+    """
+    rng = random.Random(seed)
+    forecast = _diurnal_forecast(total_slots)
+    timings = []
+    optimal = 0
+    for _ in range(n_households):
+        appliances = [a for _ in range(5) for a in _random_household(rng, total_slots)][:40]
+        for i, appliance in enumerate(appliances):
+            appliance["name"] = f"appliance-{i}"
+        start = time.perf_counter()
+        _, stats = anytime_scheduler(appliances, forecast, FORECAST_START, deadline_ms / 1000, HOUSEHOLD_CAP_KW)
+        timings.append((time.perf_counter() - start) * 1000)
+        optimal += stats["optimal"]
+
+    timings.sort()
+    return {
+        "deadline_ms": deadline_ms,
+        "p50_ms": timings[len(timings) // 2],
+        "p99_ms": timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+        "max_ms": timings[-1],
+        "optimal_share": optimal / n_households,
+    }
+
+
+def run_fleet(n_homes: int = 100_000, jobs_per_home: int = 5, total_slots: int = 48, seed: int = 0) -> dict:
+    """
+    Schedules a synthetic fleet with fleet_schedule and compares its peak
+    load and forecast carbon with the independent placement.
+    """
+    rng = random.Random(seed)
+    forecast = _diurnal_forecast(total_slots)
+    n_jobs = n_homes * jobs_per_home
+    earliest, latest_start, runtime, power, interruptible = [], [], [], [], []
+    for _ in range(n_jobs):
+        r = rng.choice((1, 2, 3, 4))
+        lo = rng.randrange(0, total_slots // 2)
+        earliest.append(lo)
+        latest_start.append(max(lo, min(total_slots - r, lo + rng.randrange(4, total_slots // 2))))
+        runtime.append(r)
+        power.append(rng.choice(HOUSEHOLD_POWERS_KW[:-1]))
+        interruptible.append(rng.random() < 0.05)
+
+    elapsed, solution = _time(fleet_schedule, forecast, earliest, latest_start, runtime, power, interruptible)
+    load, independent = solution["load_kw"], solution["independent_load_kw"]
+    return {
+        "homes": n_homes,
+        "jobs": n_jobs,
+        "seconds": elapsed,
+        "passes": solution["passes"],
+        "peak_kw": float(load.max()),
+        "independent_peak_kw": float(independent.max()),
+        "carbon_ratio": float(sum(f * l for f, l in zip(forecast, load)) / sum(f * l for f, l in zip(forecast, independent))),
+    }
+
+
+def _time(fn, *args) -> tuple[float, dict]:
+    start = time.perf_counter()
+    # The per-appliance scheduler prints warnings; keep them out of the timing output.
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def run_kernel(job_counts=(1_000, 100_000), slot_counts=(48, 576), repeats: int = 5) -> list[dict]:
+    """
+    Per-job cost of the kernel on pre-computed slot arrays, best of
+    `repeats` runs, in nanoseconds: best_start_slots without and with the
+    window cache, and cheapest_slot_sets for the same jobs treated as
+    interruptible.
+    """
+    rows = []
+    for total_slots in slot_counts:
+        slot_minutes = 48 * 60 // total_slots if total_slots > 48 else 30
+        forecast = _diurnal_forecast(total_slots, slot_minutes)
+        version = forecast_version(FORECAST_START, forecast, slot_minutes)
+        for n_jobs in job_counts:
+            jobs = _random_jobs(n_jobs, total_slots, slot_minutes=slot_minutes)
+            cache = {}
+            earliest, latest_start, runtime = zip(
+                *(_job_slots(job, FORECAST_START, total_slots, cache, slot_minutes) for job in jobs)
+            )
+            end = [s + r for s, r in zip(latest_start, runtime)]
+
+            best_start_slots(forecast, earliest, latest_start, runtime, version)
+            timings = {"uncached": [], "cached": [], "interruptible": []}
+            for _ in range(repeats):
+                timings["uncached"].append(_time(best_start_slots, forecast, earliest, latest_start, runtime)[0])
+                timings["cached"].append(
+                    _time(best_start_slots, forecast, earliest, latest_start, runtime, version)[0]
+                )
+                timings["interruptible"].append(_time(cheapest_slot_sets, forecast, earliest, end, runtime)[0])
+
+            rows.append({
+                "slots": total_slots,
+                "jobs": n_jobs,
+                **{f"{name}_ns_per_job": min(values) / n_jobs * 1e9 for name, values in timings.items()},
+            })
+    return rows
+
+
+def run(job_counts=JOB_COUNTS, total_slots: int = 48) -> list[dict]:
+    forecast = _diurnal_forecast(total_slots)
+    # Warm up NumPy so the first row doesn't pay its one-off setup cost.
+    batch_scheduler(_random_jobs(10, total_slots), forecast, FORECAST_START)
+
+    rows = []
+    for n_jobs in job_counts:
+        jobs = _random_jobs(n_jobs, total_slots)
+        loop_s, expected = _time(_sliding_window_scheduler, jobs, forecast, FORECAST_START)
+        batch_s, actual = _time(batch_scheduler, jobs, forecast, FORECAST_START)
+        if actual != expected:
+            raise AssertionError(f"batch_scheduler disagrees with the loop at {n_jobs} jobs")
+
+        # Search cost alone, with the ISO parsing already done.
+        cache = {}
+        slots = [_job_slots(job, FORECAST_START, total_slots, cache) for job in jobs]
+        earliest, latest_start, runtime = zip(*slots)
+        kernel_s, _ = _time(best_start_slots, forecast, earliest, latest_start, runtime)
+        # Same search with the window-sum indexes already in window_cache.
+        version = forecast_version(FORECAST_START, forecast)
+        best_start_slots(forecast, earliest, latest_start, runtime, version)
+        cached_s, _ = _time(best_start_slots, forecast, earliest, latest_start, runtime, version)
+
+        rows.append({
+            "jobs": n_jobs,
+            "loop_s": loop_s,
+            "batch_scheduler_s": batch_s,
+            "kernel_s": kernel_s,
+            "cached_kernel_s": cached_s,
+            "speedup": loop_s / batch_s if batch_s else float('inf'),
+        })
+    return rows
+
+
+# --- Regression suite ---
+
+SUITE_HOUSEHOLDS = (100, 1_000, 10_000)
+SUITE_TOTAL_SLOTS = 96
+# A run slower (or bigger) than the baseline by more than this share is a regression.
+DEFAULT_REGRESSION_THRESHOLD = 0.25
+
+# name -> fn(households, carbon_forecast, forecast_start, slot_minutes)
+ENGINES = {}
+
+
+def register_engine(name: str):
+    """Adds a scheduling engine to the suite under `name`."""
+    def decorator(fn):
+        ENGINES[name] = fn
+        return fn
+    return decorator
+
+
+@register_engine("scheduler_utils.scheduler")
+def _engine_round(households, carbon_forecast, forecast_start, slot_minutes):
+    return {key: scheduler(appliances, carbon_forecast, forecast_start, slot_minutes)
+            for key, appliances in households.items()}
+
+
+@register_engine("scheduler_alg.scheduler")
+def _engine_strict(households, carbon_forecast, forecast_start, slot_minutes):
+    return {key: strict_scheduler(appliances, carbon_forecast, forecast_start, slot_minutes)
+            for key, appliances in households.items()}
+
+
+@register_engine("schedule_households")
+def _engine_batch(households, carbon_forecast, forecast_start, slot_minutes):
+    return schedule_households(households, carbon_forecast, forecast_start, slot_minutes=slot_minutes)
+
+
+@register_engine("anytime_scheduler")
+def _engine_anytime(households, carbon_forecast, forecast_start, slot_minutes):
+    # Capped households with a short deadline, as ScheduleEventsView would run them.
+    return {key: anytime_scheduler(appliances, carbon_forecast, forecast_start, 0.005, HOUSEHOLD_CAP_KW,
+                                   slot_minutes)
+            for key, appliances in households.items()}
+
+
+@register_engine("fleet_scheduler")
+def _engine_fleet(households, carbon_forecast, forecast_start, slot_minutes):
+    return fleet_scheduler(households, carbon_forecast, forecast_start, slot_minutes)
+
+
+def _peak_memory(fn, *args) -> int:
+    # Peak bytes allocated by Python and NumPy during one call.
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_suite(household_counts=SUITE_HOUSEHOLDS, forecast_kinds=FORECAST_KINDS, engines=None,
+              total_slots: int = SUITE_TOTAL_SLOTS, slot_minutes: int = 30, repeats: int = 3,
+              seed: int = 0) -> dict:
+    """
+    Times every engine on every (forecast kind, household count) pair.
+
+    Each row records the best of `repeats` wall-clock runs, appliances per
+    second, and peak traced memory from a separate run (tracemalloc slows
+    the code it traces, so it is kept out of the timings).
+
+    Returns:
+        A JSON-serialisable dict with the environment, the configuration and
+        one row per measurement, in the format compare_to_baseline reads.
+    """
+    engines = list(ENGINES) if engines is None else list(engines)
+    unknown = [name for name in engines if name not in ENGINES]
+    if unknown:
+        raise ValueError(f"Unknown engines: {', '.join(unknown)}")
+
+    rows = []
+    for kind in forecast_kinds:
+        forecast = make_forecast(kind, total_slots, slot_minutes, seed)
+        for n_households in household_counts:
+            households = make_households(n_households, FORECAST_START, total_slots, slot_minutes, seed=seed)
+            n_appliances = sum(len(appliances) for appliances in households.values())
+            for name in engines:
+                args = (households, forecast, FORECAST_START, slot_minutes)
+                seconds = min(_time(ENGINES[name], *args)[0] for _ in range(repeats))
+                rows.append({
+                    "engine": name,
+                    "forecast": kind,
+                    "households": n_households,
+                    "appliances": n_appliances,
+                    "seconds": seconds,
+                    "appliances_per_s": n_appliances / seconds if seconds else float("inf"),
+                    "peak_memory_bytes": _peak_memory(ENGINES[name], *args),
+                })
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+        },
+        "config": {
+            "total_slots": total_slots,
+            "slot_minutes": slot_minutes,
+            "repeats": repeats,
+            "seed": seed,
+        },
+        "results": rows,
+    }
+
+
+def compare_to_baseline(current: dict, baseline: dict,
+                        threshold: float = DEFAULT_REGRESSION_THRESHOLD) -> list[dict]:
+    """
+    Returns the rows of `current` that are slower or use more memory than
+    the matching baseline row by more than `threshold`, each with the
+    baseline value and the ratio. Rows without a baseline match are skipped.
+    """
+    key = lambda row: (row["engine"], row["forecast"], row["households"])
+    previous = {key(row): row for row in baseline.get("results", [])}
+    regressions = []
+    for row in current["results"]:
+        old = previous.get(key(row))
+        if old is None:
+            continue
+        for metric in ("seconds", "peak_memory_bytes"):
+            if old[metric] and row[metric] > old[metric] * (1 + threshold):
+                regressions.append({
+                    "engine": row["engine"],
+                    "forecast": row["forecast"],
+                    "households": row["households"],
+                    "metric": metric,
+                    "baseline": old[metric],
+                    "current": row[metric],
+                    "ratio": row[metric] / old[metric],
+                })
+    return regressions
+
+
+if __name__ == "__main__":
+    print(f"{'jobs':>8} {'loop':>12} {'batch':>12} {'kernel':>12} {'cached':>12} {'speedup':>8}")
+    for row in run():
+        print(f"{row['jobs']:>8} {row['loop_s']:>11.4f}s {row['batch_scheduler_s']:>11.4f}s "
+              f"{row['kernel_s']:>11.4f}s {row['cached_kernel_s']:>11.4f}s {row['speedup']:>7.1f}x")
+
+    print("\nkernel cost per job (ns):")
+    print(f"{'slots':>6} {'jobs':>8} {'uncached':>10} {'cached':>10} {'split':>10}")
+    for row in run_kernel():
+        print(f"{row['slots']:>6} {row['jobs']:>8} {row['uncached_ns_per_job']:>10.0f} "
+              f"{row['cached_ns_per_job']:>10.0f} {row['interruptible_ns_per_job']:>10.0f}")
+
+    print("\ninterruptible jobs:")
+    for row in run_interruptible():
+        print(f"{row['jobs']:>8} {row['batch_scheduler_s']:>11.4f}s")
+
+    household = run_households()
+    print(f"\njoint solver, {household['households']} households of 5-10 appliances, "
+          f"cap {HOUSEHOLD_CAP_KW} kW:")
+    print(f"  mean {household['mean_ms']:.2f} ms, p99 {household['p99_ms']:.2f} ms, "
+          f"max {household['max_ms']:.2f} ms, optimal {household['optimal_share']:.1%}")
+
+    anytime = run_anytime()
+    print(f"\nanytime, 40-appliance households, {anytime['deadline_ms']:.0f} ms deadline: "
+          f"p50 {anytime['p50_ms']:.1f} ms, p99 {anytime['p99_ms']:.1f} ms, max {anytime['max_ms']:.1f} ms, "
+          f"optimal {anytime['optimal_share']:.1%}")
+
+    fleet = run_fleet()
+    print(f"\nfleet, {fleet['homes']} homes / {fleet['jobs']} jobs: {fleet['seconds']:.2f}s, "
+          f"{fleet['passes']} passes, peak {fleet['peak_kw']:.0f} kW "
+          f"(independent {fleet['independent_peak_kw']:.0f} kW), carbon x{fleet['carbon_ratio']:.2f}")
+
+    print("\nslot resolution, 10,000 jobs over 48 hours:")
+    print(f"{'minutes':>8} {'slots':>6} {'batch':>12} {'kernel':>12} {'loop 1k':>13}")
+    for row in run_resolution():
+        print(f"{row['slot_minutes']:>8} {row['slots']:>6} {row['batch_scheduler_s']:>11.4f}s "
+              f"{row['kernel_s']:>11.4f}s {row['loop_1k_s']:>12.4f}s")
@@ -0,0 +1,197 @@
+"""
+Cached access to the live national carbon intensity (carbonintensity.org.uk).
+
+The upstream value only changes every half hour, so every worker keeps the
+last good reading in a SingleFlightCache:
+  - a reading younger than CARBON_INTENSITY_TTL_S is served as is;
+  - when it expires, concurrent callers share one upstream request (one per
+    process for threads, one per event loop for async callers);
+  - if the upstream fails, the last good reading is served as stale for up
+    to CARBON_INTENSITY_MAX_STALE_S, and the upstream is left alone for
+    CARBON_INTENSITY_RETRY_AFTER_S before it is tried again.
+
+Requests time out after CARBON_INTENSITY_TIMEOUT_S. The async path uses
+httpx when it is installed and otherwise runs the blocking request in a
+worker thread.
+
+fetch_range pages historic half-hours for history.sync_history.
+"""
+
+import asyncio
+import threading
+import time
+import weakref
+from datetime import datetime, timedelta
+
+import requests
+from django.conf import settings
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+CURRENT_INTENSITY_URL = "https://api.carbonintensity.org.uk/intensity"
+
+# Longest range the upstream serves in one request.
+MAX_RANGE = timedelta(days=14)
+
+DEFAULT_TIMEOUT_S = 3.0
+DEFAULT_TTL_S = 300.0
+DEFAULT_MAX_STALE_S = 6 * 3600.0
+DEFAULT_RETRY_AFTER_S = 30.0
+
+
+class UpstreamError(Exception):
+    """The upstream could not be reached or sent something unusable."""
+
+
+def _setting(name: str, default: float) -> float:
+    return getattr(settings, name, default)
+
+
+def _parse_current(payload: dict) -> dict:
+    try:
+        intensity = payload["data"][0]["intensity"]
+        return {"intensity": intensity["actual"], "index": intensity["index"]}
+    except (KeyError, IndexError, TypeError) as e:
+        raise UpstreamError(f"Unexpected carbon intensity payload: {e!r}") from e
+
+
+def fetch_current(timeout: float) -> dict:
+    try:
+        response = requests.get(CURRENT_INTENSITY_URL, timeout=timeout)
+        response.raise_for_status()
+        payload = response.json()
+    except (requests.RequestException, ValueError) as e:
+        raise UpstreamError(str(e)) from e
+    return _parse_current(payload)
+
+
+async def afetch_current(timeout: float) -> dict:
+    if httpx is None:
+        return await asyncio.to_thread(fetch_current, timeout)
+    try:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            response = await client.get(CURRENT_INTENSITY_URL)
+            response.raise_for_status()
+            payload = response.json()
+    except (httpx.HTTPError, ValueError) as e:
+        raise UpstreamError(str(e)) from e
+    return _parse_current(payload)
+
+
+def _api_time(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%MZ")
+
+
+def fetch_range(start: datetime, end: datetime, timeout: float) -> list[dict]:
+    """
+    Returns the upstream's half-hour records between two UTC datetimes as
+    {'timestamp', 'forecast', 'actual', 'index'} dicts, fetched in chunks of
+    at most MAX_RANGE. Raises UpstreamError on the first failing chunk.
+    """
+    records = []
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + MAX_RANGE, end)
+        url = f"{CURRENT_INTENSITY_URL}/{_api_time(chunk_start)}/{_api_time(chunk_end)}"
+        try:
+            response = requests.get(url, timeout=timeout)
+            response.raise_for_status()
+            rows = response.json()["data"]
+            for row in rows:
+                records.append({
+                    "timestamp": datetime.fromisoformat(row["from"].replace("Z", "+00:00")),
+                    "forecast": row["intensity"]["forecast"],
+                    "actual": row["intensity"]["actual"],
+                    "index": row["intensity"]["index"] or "",
+                })
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            raise UpstreamError(f"Fetching {url} failed: {e!r}") from e
+        chunk_start = chunk_end
+    return records
+
+
+class SingleFlightCache:
+    """
+    One cached upstream value with TTL, request coalescing and stale-on-error.
+
+    `fetch(timeout)` and `afetch(timeout)` return a fresh value or raise
+    UpstreamError. get() and aget() return (value, stale) or raise
+    UpstreamError when there is no value recent enough to serve.
+    """
+
+    def __init__(self, fetch, afetch):
+        self._fetch = fetch
+        self._afetch = afetch
+        # Held by the one thread fetching; the others wait on it and then reuse its result.
+        self._lock = threading.Lock()
+        self._value = None
+        self._fetched_at = float("-inf")
+        self._failed_at = float("-inf")
+        self._tasks = weakref.WeakKeyDictionary()
+
+    def _stale(self):
+        if self._value is not None and time.monotonic() - self._fetched_at < _setting(
+                "CARBON_INTENSITY_MAX_STALE_S", DEFAULT_MAX_STALE_S):
+            return self._value, True
+        raise UpstreamError("Upstream unavailable and no recent value cached.")
+
+    def _cached(self):
+        # (value, stale) if no upstream request is due, else None.
+        now = time.monotonic()
+        if self._value is not None and now - self._fetched_at < _setting("CARBON_INTENSITY_TTL_S", DEFAULT_TTL_S):
+            return self._value, False
+        if now - self._failed_at < _setting("CARBON_INTENSITY_RETRY_AFTER_S", DEFAULT_RETRY_AFTER_S):
+            return self._stale()
+        return None
+
+    def _store(self, value):
+        self._value = value
+        self._fetched_at = time.monotonic()
+        self._failed_at = float("-inf")
+
+    def get(self) -> tuple:
+        hit = self._cached()
+        if hit is not None:
+            return hit
+        with self._lock:
+            hit = self._cached()
+            if hit is not None:
+                return hit
+            try:
+                value = self._fetch(_setting("CARBON_INTENSITY_TIMEOUT_S", DEFAULT_TIMEOUT_S))
+            except UpstreamError:
+                self._failed_at = time.monotonic()
+                return self._stale()
+            self._store(value)
+            return value, False
+
+    async def _refresh(self) -> tuple:
+        try:
+            value = await self._afetch(_setting("CARBON_INTENSITY_TIMEOUT_S", DEFAULT_TIMEOUT_S))
+        except UpstreamError:
+            self._failed_at = time.monotonic()
+            return self._stale()
+        self._store(value)
+        return value, False
+
+    async def aget(self) -> tuple:
+        hit = self._cached()
+        if hit is not None:
+            return hit
+        loop = asyncio.get_running_loop()
+        task = self._tasks.get(loop)
+        if task is None or task.done():
+            task = self._tasks[loop] = loop.create_task(self._refresh())
+        # Shielded so one caller going away doesn't cancel the request the others wait on.
+        return await asyncio.shield(task)
+
+    def clear(self):
+        with self._lock:
+            self._value = None
+            self._fetched_at = self._failed_at = float("-inf")
+
+
+current_intensity = SingleFlightCache(fetch_current, afetch_current)
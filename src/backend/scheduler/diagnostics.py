@@ -0,0 +1,98 @@
+"""
+Why an appliance was (or wasn't) scheduled.
+
+Validation and placement report a Status per appliance instead of printing
+warnings: the schedulers hand the reasons back to the caller (see the
+`reasons` arguments in scheduler_utils and fleet) and every non-OK outcome
+is counted in the process-wide `metrics` Counter, keyed by Status.
+"""
+
+import threading
+from collections import Counter
+from enum import IntEnum
+
+import numpy as np
+
+
+class Status(IntEnum):
+    OK = 0
+    # Scheduled, but the earliest start was before the forecast and was moved to its first slot.
+    CLAMPED = 1
+    MISSING_FIELD = 2
+    INVALID_TIME = 3
+    OFF_SLOT_BOUNDARY = 4
+    INVALID_RUNTIME = 5
+    BEFORE_FORECAST = 6
+    WINDOW_TOO_SHORT = 7
+    BEYOND_HORIZON = 8
+    OVER_POWER_CAP = 9
+
+    @property
+    def code(self) -> str:
+        return self.name.lower()
+
+    @property
+    def scheduled(self) -> bool:
+        return self <= Status.CLAMPED
+
+
+REASONS = {
+    Status.OK: "Scheduled.",
+    Status.CLAMPED: "Earliest start is before the forecast; scheduled from the forecast start.",
+    Status.MISSING_FIELD: "earliest_start, latest_end and runtime_min are required.",
+    Status.INVALID_TIME: "earliest_start or latest_end is not an ISO 8601 time.",
+    Status.OFF_SLOT_BOUNDARY: "earliest_start or latest_end is not on a forecast slot boundary.",
+    Status.INVALID_RUNTIME: "runtime_min is not a valid number of minutes.",
+    Status.BEFORE_FORECAST: "latest_end is before the forecast starts.",
+    Status.WINDOW_TOO_SHORT: "The window between earliest_start and latest_end is shorter than the runtime.",
+    Status.BEYOND_HORIZON: "latest_end is past the end of the forecast.",
+    Status.OVER_POWER_CAP: "Could not be fitted under the household power cap.",
+}
+
+
+def describe(status: Status) -> dict:
+    """JSON-friendly form of a status for API responses."""
+    status = Status(status)
+    return {"code": status.code, "reason": REASONS[status]}
+
+
+class JobResult:
+    """
+    Outcome of scheduling one appliance.
+
+    start_slot is the first slot of the run (-1 if it was not scheduled),
+    slots the sorted slot array of a split interruptible run (None
+    otherwise), and cost the sum of the forecast over the slots used.
+    """
+    __slots__ = ("start_slot", "slots", "cost", "status")
+
+    def __init__(self, start_slot: int, cost: float, status: Status, slots: np.ndarray = None):
+        self.start_slot = start_slot
+        self.cost = cost
+        self.status = status
+        self.slots = slots
+
+    def __repr__(self):
+        return f"JobResult(start_slot={self.start_slot}, cost={self.cost}, status={self.status.name})"
+
+
+# Non-OK outcomes seen by this process, by Status.
+metrics = Counter()
+_metrics_lock = threading.Lock()
+
+
+def record(statuses):
+    """Adds a batch of non-OK statuses to `metrics`."""
+    with _metrics_lock:
+        metrics.update(statuses)
+
+
+def metrics_snapshot() -> dict:
+    """Returns {status code: count} for every outcome counted so far."""
+    with _metrics_lock:
+        return {Status(status).code: count for status, count in metrics.items()}
+
+
+def reset_metrics():
+    with _metrics_lock:
+        metrics.clear()
@@ -0,0 +1,169 @@
+"""
+Reading a user's events in (start_time, id) order.
+
+Pages are keyset-paginated: the cursor is the (start_time, id) of the last
+event returned, so every page is one range scan of the
+(user, start_time, id) index, however far into the history it is.
+
+The exports (ndjson_chunks, ical_chunks) stream the whole history instead,
+archived events (EventInstanceArchive) first: rows come from the database
+EXPORT_CHUNK_SIZE at a time through QuerySet.iterator() and are written out
+a chunk at a time, so memory does not grow with the number of events.
+"""
+
+import base64
+import hashlib
+from datetime import datetime, timedelta, timezone
+from itertools import chain
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+
+from .models import EventInstance, EventInstanceArchive
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 2000
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = ("id", "start_time", "runtime_min", "window_start", "window_end", "carbon_cost_g")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(start_time: datetime, event_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{start_time.isoformat()}|{event_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        start_iso, event_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(start_iso), int(event_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Invalid cursor {cursor!r}.") from e
+
+
+def user_events(user_id: int, start: datetime = None, end: datetime = None, model=EventInstance):
+    """The user's events starting in [start, end), ordered by (start_time, id)."""
+    events = model.objects.filter(user_id=user_id)
+    if start is not None:
+        events = events.filter(start_time__gte=start)
+    if end is not None:
+        events = events.filter(start_time__lt=end)
+    return events.order_by("start_time", "id")
+
+
+def event_page(user_id: int, start: datetime = None, end: datetime = None, cursor: str = None,
+               limit: int = DEFAULT_PAGE_SIZE) -> tuple[list[dict], str]:
+    """
+    Returns (rows, next_cursor): up to `limit` events after `cursor` as
+    {'id', 'appliance_name', 'start_time'} dicts, and the cursor of the
+    next page (None on the last one). Archived events are not listed.
+    """
+    events = user_events(user_id, start, end)
+    if cursor:
+        after_start, after_id = decode_cursor(cursor)
+        events = events.filter(Q(start_time__gt=after_start) | Q(start_time=after_start, id__gt=after_id))
+    rows = list(events.values("id", "start_time", appliance_name=F("appliance__name"))[:limit + 1])
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        return rows[:limit], encode_cursor(last["start_time"], last["id"])
+    return rows, None
+
+
+def page_etag(rows: list[dict], next_cursor: str = None) -> str:
+    """A strong ETag for a page, from its rows alone, so a 304 needs no serialization."""
+    digest = hashlib.blake2b(digest_size=12)
+    for row in rows:
+        digest.update(f"{row['id']}|{row['appliance_name']}|{row['start_time'].isoformat()}\n".encode())
+    digest.update((next_cursor or "").encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def export_rows(user_id: int, start: datetime = None, end: datetime = None):
+    """
+    Iterates over the user's archived and live events, in time order, as
+    EXPORT_FIELDS dicts plus 'appliance_name', reading EXPORT_CHUNK_SIZE
+    rows at a time. Only events older than every live one are archived, so
+    the archive comes first.
+    """
+    return chain.from_iterable(
+        user_events(user_id, start, end, model).values(*EXPORT_FIELDS, appliance_name=F("appliance__name"))
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        for model in (EventInstanceArchive, EventInstance)
+    )
+
+
+def _chunked(lines, size: int = EXPORT_CHUNK_SIZE):
+    # Joins lines into one string per `size`, so the response isn't written a line at a time.
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= size:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def ndjson_chunks(rows):
+    """One JSON object per event and line."""
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    return _chunked(encoder.encode(row) + "\n" for row in rows)
+
+
+def _ical_time(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _ical_text(value: str) -> str:
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _ical_line(line: str) -> str:
+    # Content lines are folded at 75 octets; continuation lines start with a space.
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts, start, width = [], 0, 75
+    while start < len(encoded):
+        end = min(start + width, len(encoded))
+        # Never split a UTF-8 sequence.
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode())
+        start, width = end, 74
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _ical_event(row: dict, stamp: str, domain: str) -> str:
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:event-{row['id']}@{domain}",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART:{_ical_time(row['start_time'])}",
+    ]
+    if row["runtime_min"]:
+        lines.append(f"DTEND:{_ical_time(row['start_time'] + timedelta(minutes=row['runtime_min']))}")
+    lines += [f"SUMMARY:{_ical_text(row['appliance_name'])}", "END:VEVENT"]
+    return "".join(_ical_line(line) for line in lines)
+
+
+def ical_chunks(rows, name: str, domain: str = "greenhome"):
+    """An iCalendar (RFC 5545) feed with one VEVENT per event."""
+    stamp = _ical_time(datetime.now(timezone.utc))
+
+    def lines():
+        yield "".join(_ical_line(line) for line in (
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            f"PRODID:-//{domain}//Scheduled appliances//EN",
+            "CALSCALE:GREGORIAN",
+            f"X-WR-CALNAME:{_ical_text(name)}",
+        ))
+        for row in rows:
+            yield _ical_event(row, stamp, domain)
+        yield _ical_line("END:VCALENDAR")
+
+    return _chunked(lines(), size=500)
@@ -0,0 +1,235 @@
+"""
+Fleet-level scheduling that avoids herding.
+
+Scheduled independently against the same forecast, every home puts its
+dishwasher in the same cheapest half hour, which makes a new peak there.
+Here the whole population is scheduled together against a congestion price
+
+    price[t] = forecast[t] + penalty * load[t]
+
+where load[t] is the fleet's aggregate draw in kW. Starting from the
+independent (herding) placement, every pass recomputes the load curve,
+finds each job's best response to the current price with the kernel, and
+moves a shrinking random share of the jobs that would gain from moving
+(damped best response). Moving one job at a time never increases the
+potential sum(forecast * load + penalty / 2 * load**2); the damping keeps
+simultaneous moves from oscillating, and passes stop once the potential
+stops improving (typically 5-10 passes).
+
+`penalty` is given as `peak_weight`: at peak_weight=1 a slot carrying the
+fleet's average load costs one forecast spread (max - min) more than an
+empty one.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+from .kernel import best_start_slots, cheapest_slot_sets, _prefix_sums
+from .scheduler_utils import (DEFAULT_SLOT_MINUTES, MALFORMED_APPLIANCE_LIST, _collect_jobs, _format_schedule,
+                              appliance_power_kw)
+
+DEFAULT_PEAK_WEIGHT = 0.25
+DEFAULT_MAX_PASSES = 12
+# Stop once a pass improves the potential by less than this share.
+DEFAULT_TOLERANCE = 0.002
+# Share of the would-be movers that move on the first pass; shrinks each pass.
+_FIRST_STEP = 0.5
+_STEP_DECAY = 0.7
+# A job only counts as gaining if moving saves more than this share of its cost;
+# at equilibrium the used slots are priced within noise of each other.
+DEFAULT_MIN_GAIN = 0.01
+
+
+def _contiguous_load(total_slots: int, starts: np.ndarray, runtime: np.ndarray, power: np.ndarray) -> np.ndarray:
+    # Each run adds +power at its start and -power at its end; a cumulative sum gives the load curve.
+    diff = np.bincount(starts, weights=power, minlength=total_slots + 1)
+    diff -= np.bincount(starts + runtime, weights=power, minlength=total_slots + 1)
+    return np.cumsum(diff[:total_slots])
+
+
+def _split_load(total_slots: int, slot_sets: list, power: np.ndarray) -> np.ndarray:
+    if not slot_sets:
+        return np.zeros(total_slots)
+    slots = np.concatenate(slot_sets)
+    weights = np.repeat(power, [len(s) for s in slot_sets])
+    return np.bincount(slots, weights=weights, minlength=total_slots)
+
+
+def fleet_schedule(carbon_forecast, earliest_slots, latest_start_slots, runtime_slots, power_kw,
+                   interruptible=None, peak_weight: float = DEFAULT_PEAK_WEIGHT,
+                   max_passes: int = DEFAULT_MAX_PASSES, tolerance: float = DEFAULT_TOLERANCE,
+                   min_gain: float = DEFAULT_MIN_GAIN, seed: int = 0) -> dict:
+    """
+    Places every job of a fleet against the shared forecast plus a penalty
+    on aggregate load.
+
+    The slot arrays must describe feasible jobs, as for
+    kernel.best_start_slots; interruptible jobs may use any `runtime` slots
+    of [earliest, latest_start + runtime).
+
+    Returns:
+        dict with
+        - 'results': start slot per contiguous job, sorted slot array per
+          interruptible one, in job order
+        - 'load_kw': aggregate load per slot after the last pass
+        - 'independent_load_kw': the load curve of the independent placement
+        - 'passes': number of best-response passes run
+        - 'movers': share of jobs that would still gain from moving
+        - 'potential': final value of the potential above
+    """
+    forecast = np.asarray(carbon_forecast, dtype=np.float64)
+    total_slots = len(forecast)
+    earliest = np.asarray(earliest_slots, dtype=np.int64)
+    latest_start = np.asarray(latest_start_slots, dtype=np.int64)
+    runtime = np.asarray(runtime_slots, dtype=np.int64)
+    power = np.asarray(power_kw, dtype=np.float64)
+    if interruptible is None:
+        interruptible = np.zeros(earliest.size, dtype=bool)
+    interruptible = np.asarray(interruptible, dtype=bool)
+
+    contiguous = np.flatnonzero(~interruptible)
+    split = np.flatnonzero(interruptible)
+    c_earliest, c_latest, c_runtime, c_power = (
+        earliest[contiguous], latest_start[contiguous], runtime[contiguous], power[contiguous]
+    )
+    s_earliest, s_end, s_runtime, s_power = (
+        earliest[split], latest_start[split] + runtime[split], runtime[split], power[split]
+    )
+
+    # Pass 0: every job on its own, i.e. the herd.
+    starts, _ = best_start_slots(forecast, c_earliest, c_latest, c_runtime)
+    slot_sets, _ = cheapest_slot_sets(forecast, s_earliest, s_end, s_runtime)
+
+    def aggregate_load():
+        return _contiguous_load(total_slots, starts, c_runtime, c_power) + _split_load(total_slots, slot_sets, s_power)
+
+    load = aggregate_load()
+    independent_load = load.copy()
+
+    average_load = float((power * runtime).sum()) / total_slots if total_slots else 0.0
+    spread = float(np.ptp(forecast)) if total_slots else 0.0
+    penalty = peak_weight * spread / average_load if average_load > 0 and spread > 0 else 0.0
+
+    def potential(load):
+        return float(np.dot(forecast, load) + penalty / 2 * np.dot(load, load))
+
+    rng = np.random.default_rng(seed)
+    step = _FIRST_STEP
+    passes = 0
+    movers = 0.0
+    n_jobs = earliest.size
+    current = potential(load)
+
+    while penalty > 0 and passes < max_passes and n_jobs:
+        price = forecast + penalty * load
+        prefix = _prefix_sums(price)
+
+        # Contiguous jobs: staying is valued without the job's own share of the load.
+        best, best_cost = best_start_slots(price, c_earliest, c_latest, c_runtime)
+        stay_cost = prefix[starts + c_runtime] - prefix[starts] - penalty * c_power * c_runtime
+        c_gain = (best != starts) & (best_cost < stay_cost * (1 - min_gain))
+
+        # Interruptible jobs: the same test on their cheapest slot sets.
+        s_gain = np.zeros(split.size, dtype=bool)
+        if split.size:
+            new_sets, new_cost = cheapest_slot_sets(price, s_earliest, s_end, s_runtime)
+            stay = np.array([price[slots].sum() for slots in slot_sets]) - penalty * s_power * s_runtime
+            s_gain = new_cost < stay * (1 - min_gain)
+
+        movers = (int(c_gain.sum()) + int(s_gain.sum())) / n_jobs
+        if not movers:
+            break
+
+        c_move = c_gain & (rng.random(contiguous.size) < step)
+        starts = np.where(c_move, best, starts)
+        if split.size:
+            for i in np.flatnonzero(s_gain & (rng.random(split.size) < step)).tolist():
+                slot_sets[i] = new_sets[i]
+
+        load = aggregate_load()
+        step *= _STEP_DECAY
+        passes += 1
+
+        previous, current = current, potential(load)
+        if previous - current <= tolerance * abs(previous):
+            break
+
+    results = [None] * n_jobs
+    for i, slot in zip(contiguous.tolist(), starts.tolist()):
+        results[i] = slot
+    for i, slots in zip(split.tolist(), slot_sets):
+        results[i] = slots
+
+    return {
+        "results": results,
+        "load_kw": load,
+        "independent_load_kw": independent_load,
+        "passes": passes,
+        "movers": movers,
+        "potential": current,
+    }
+
+
+def fleet_scheduler(households: dict, carbon_forecast: list[float], forecast_start_time: datetime,
+                    slot_minutes: int = DEFAULT_SLOT_MINUTES, peak_weight: float = DEFAULT_PEAK_WEIGHT,
+                    max_passes: int = DEFAULT_MAX_PASSES, reasons: dict = None) -> tuple[dict, dict, dict]:
+    """
+    Fleet counterpart of scheduler_utils.schedule_households.
+
+    Appliance dicts take an optional 'power_kw' (DEFAULT_POWER_KW if missing);
+    a household with an invalid one goes to `errors`. `reasons` is filled as for schedule_households.
+
+    Returns:
+        (schedules, errors, stats): schedules and errors as for
+        schedule_households; stats holds the aggregate 'load_curve' in kW per
+        slot, its 'peak_kw', the 'independent_peak_kw' the same fleet would
+        reach scheduled home by home, 'carbon_cost' in gCO2 and 'passes'.
+    """
+    total_slots = len(carbon_forecast)
+    if total_slots == 0:
+        raise ValueError("Carbon forecast is empty.")
+
+    batch = ([], [], [], [])
+    power_kw = []
+    cache = {}
+    entries_by_household = {}
+    errors = {}
+
+    for key, appliances in households.items():
+        # Draws are checked before the household's jobs join the batch, so a
+        # bad one only fails its own household.
+        try:
+            household_power = [appliance_power_kw(appliance) for appliance in appliances]
+            entries = _collect_jobs(appliances, forecast_start_time, total_slots, cache, batch, slot_minutes)
+        except MALFORMED_APPLIANCE_LIST + (ValueError,) as e:
+            errors[key] = f"Invalid appliance list: {e!r}"
+            continue
+        entries_by_household[key] = entries
+        power_kw.extend(power for power, (_, index, _) in zip(household_power, entries) if index >= 0)
+
+    earliest, latest_start, runtime, interruptible = batch
+    solution = fleet_schedule(
+        carbon_forecast, earliest, latest_start, runtime, power_kw, interruptible,
+        peak_weight=peak_weight, max_passes=max_passes,
+    )
+
+    slot_iso = {}
+    schedules = {}
+    for key, entries in entries_by_household.items():
+        household_reasons = {} if reasons is not None else None
+        schedules[key] = _format_schedule(
+            entries, solution["results"], forecast_start_time, slot_iso, slot_minutes, household_reasons
+        )
+        if household_reasons:
+            reasons[key] = household_reasons
+
+    load = solution["load_kw"]
+    slot_hours = slot_minutes / 60
+    return schedules, errors, {
+        "load_curve": [round(v, 3) for v in load.tolist()],
+        "peak_kw": float(load.max()),
+        "independent_peak_kw": float(solution["independent_load_kw"].max()),
+        "carbon_cost": float(np.dot(load, carbon_forecast)) * slot_hours,
+        "passes": solution["passes"],
+    }
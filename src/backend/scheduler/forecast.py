@@ -0,0 +1,221 @@
+"""
+The current carbon forecast: how runs are published, and an in-process
+snapshot of the current one.
+
+Each run_inference writes a new ForecastRun, its intensities packed into
+one float32 column, and in the same transaction points CurrentForecastRun
+at it (publish_forecast). Readers go through that pointer, so they see the
+previous run or the complete new one, never a half-written or empty
+forecast. Old runs are kept for backtesting until prune_runs drops them.
+
+Every scheduling request needs the same few dozen floats. Rather than read
+the forecast per request, each worker keeps one ForecastSnapshot (a
+read-only NumPy array, its start time, slot width and a content version)
+and shares it between views and threads.
+
+The snapshot is refreshed when it may be stale:
+  - the `forecast_updated` signal (sent by run_inference) drops it in the
+    process that wrote the forecast;
+  - other processes notice a new run through a version check, one primary
+    key lookup of the pointer at most every settings.FORECAST_CHECK_INTERVAL_S.
+
+The version is forecast_version() of the content, so it doubles as the
+window_cache key for the snapshot.
+
+Each snapshot also encodes itself once for the forecast endpoint
+(ForecastSnapshot.encoded): a compact binary body and a JSON fallback.
+The binary layout is little-endian:
+
+    offset  size  field
+    0       4     magic b"GHF1"
+    4       8     start, int64 Unix seconds (UTC)
+    12      2     slot width in minutes, uint16
+    14      2     number of slots n, uint16
+    16      4n    intensity per slot, float32 (gCO2/kWh)
+"""
+
+import json
+import struct
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from django.conf import settings
+from django.db import transaction
+from django.dispatch import Signal, receiver
+
+from .models import CurrentForecastRun, ForecastRun
+from .kernel import _prefix_sums
+from .scheduler_utils import forecast_slot_minutes
+from .window_cache import forecast_version
+
+DEFAULT_CHECK_INTERVAL_S = 5.0
+DEFAULT_RETENTION_DAYS = 30
+
+# Primary key of the single CurrentForecastRun row.
+CURRENT_RUN_PK = 1
+
+BINARY_MAGIC = b"GHF1"
+BINARY_HEADER = struct.Struct("<4sqHH")
+
+# Sent after a new forecast has been written.
+forecast_updated = Signal()
+
+
+class EncodedForecast:
+    """A snapshot's response bodies, encoded once and shared by every request."""
+    __slots__ = ("binary", "json", "etag")
+
+    def __init__(self, binary: bytes, json: bytes, etag: str):
+        self.binary = binary
+        self.json = json
+        self.etag = etag
+
+
+class ForecastSnapshot:
+    """One forecast: `values` per slot from `start`, each `slot_minutes` wide."""
+    __slots__ = ("values", "start", "slot_minutes", "version", "_encoded", "_prefix")
+
+    def __init__(self, values: np.ndarray, start: datetime, slot_minutes: int):
+        values = np.array(values, dtype=np.float64)
+        values.flags.writeable = False
+        self.values = values
+        self.start = start
+        self.slot_minutes = slot_minutes
+        self.version = forecast_version(start, values, slot_minutes)
+        self._encoded = None
+        self._prefix = _prefix_sums(values)
+
+    @classmethod
+    def from_rows(cls, rows: list[tuple]):
+        """Builds a snapshot from (timestamp, intensity) rows in time order, or returns None if there are none."""
+        if not rows:
+            return None
+        timestamps = [timestamp for timestamp, _ in rows]
+        return cls([intensity for _, intensity in rows], timestamps[0], forecast_slot_minutes(timestamps))
+
+    @classmethod
+    def from_packed(cls, start: datetime, slot_minutes: int, packed):
+        """Builds a snapshot from a run's packed intensities, or returns None if there are none."""
+        values = ForecastRun.unpack(packed)
+        return cls(values, start, slot_minutes) if len(values) else None
+
+    def __len__(self):
+        return len(self.values)
+
+    def carbon_g(self, start_time: datetime, runtime_min: float, power_kw: float):
+        """
+        gCO2 of running at `power_kw` for `runtime_min` from `start_time`
+        (a slot boundary) under this forecast, with a final partial slot
+        counted pro rata. None if the run isn't inside the forecast.
+        """
+        slot = (start_time - self.start) / timedelta(minutes=self.slot_minutes)
+        full, partial = divmod(runtime_min / self.slot_minutes, 1)
+        first, last = int(slot), int(slot) + int(full)
+        if slot != first or first < 0 or last + (partial > 0) > len(self.values):
+            return None
+        intensity_slots = self._prefix[last] - self._prefix[first]
+        if partial:
+            intensity_slots += partial * self.values[last]
+        return float(intensity_slots * power_kw * self.slot_minutes / 60)
+
+    def encoded(self) -> EncodedForecast:
+        """The binary and JSON bodies of this snapshot (see the module docstring), built on first use."""
+        if self._encoded is None:
+            # Two threads may both encode on first use; the results are identical.
+            start = self.start.astimezone(timezone.utc)
+            binary = BINARY_HEADER.pack(
+                BINARY_MAGIC, int(start.timestamp()), self.slot_minutes, len(self.values)
+            ) + self.values.astype("<f4").tobytes()
+            body = json.dumps({
+                "start": start.isoformat().replace("+00:00", "Z"),
+                "slot_minutes": self.slot_minutes,
+                "values": [round(float(v), 2) for v in self.values],
+                "version": self.version,
+            }, separators=(",", ":")).encode()
+            self._encoded = EncodedForecast(binary, body, self.version)
+        return self._encoded
+
+
+class ForecastStore:
+    """Holds the current snapshot for this process; see the module docstring."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._db_key = None
+        self._checked_at = float("-inf")
+
+    @staticmethod
+    def _current_db_key():
+        # Runs are never edited, so the current run's id identifies its content.
+        return CurrentForecastRun.objects.filter(pk=CURRENT_RUN_PK).values_list("run_id", flat=True).first()
+
+    def get(self):
+        """Returns the current ForecastSnapshot, or None if no forecast is stored."""
+        interval = getattr(settings, "FORECAST_CHECK_INTERVAL_S", DEFAULT_CHECK_INTERVAL_S)
+        if time.monotonic() - self._checked_at < interval:
+            return self._snapshot
+
+        with self._lock:
+            # Another thread may have refreshed it while this one waited.
+            if time.monotonic() - self._checked_at < interval:
+                return self._snapshot
+            db_key = self._current_db_key()
+            if db_key != self._db_key:
+                # Through the pointer again: a run replaced since the check is still complete.
+                run = ForecastRun.objects.filter(current_pointer__pk=CURRENT_RUN_PK).values_list(
+                    "start", "slot_minutes", "intensities"
+                ).first()
+                self._snapshot = ForecastSnapshot.from_packed(*run) if run else None
+                self._db_key = db_key
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self):
+        """Makes the next get() reload from the database."""
+        with self._lock:
+            self._db_key = None
+            self._checked_at = float("-inf")
+
+
+forecast_store = ForecastStore()
+
+
+def publish_forecast(start: datetime, values, slot_minutes: int, model_version: str, issued_at: datetime = None):
+    """
+    Writes a new run of `values` per slot from `start` and makes it the
+    current run, in one transaction. Returns the ForecastRun.
+    """
+    with transaction.atomic():
+        run = ForecastRun.objects.create(
+            issued_at=issued_at or datetime.now(timezone.utc), model_version=model_version,
+            slot_minutes=slot_minutes, start=start, intensities=ForecastRun.pack(values),
+        )
+        CurrentForecastRun.objects.update_or_create(pk=CURRENT_RUN_PK, defaults={"run": run})
+    return run
+
+
+def prune_runs(keep_days: float = None, now: datetime = None) -> int:
+    """
+    Deletes runs issued more than `keep_days` ago,
+    settings.FORECAST_RUN_RETENTION_DAYS by default. The current run is
+    always kept. Returns the number of runs deleted.
+    """
+    if keep_days is None:
+        keep_days = getattr(settings, "FORECAST_RUN_RETENTION_DAYS", DEFAULT_RETENTION_DAYS)
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=keep_days)
+    _, deleted = ForecastRun.objects.filter(issued_at__lt=cutoff, current_pointer__isnull=True).delete()
+    return deleted.get(ForecastRun._meta.label, 0)
+
+
+def current_forecast():
+    """The current ForecastSnapshot of this process, or None if no forecast is stored."""
+    return forecast_store.get()
+
+
+@receiver(forecast_updated)
+def _drop_snapshot(sender, **kwargs):
+    forecast_store.invalidate()
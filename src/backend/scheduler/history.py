@@ -0,0 +1,127 @@
+"""
+Local store of historic carbon intensity (CarbonIntensityRecord).
+
+sync_history fills the table from the upstream API, asking only for the
+half hours that are missing or still lack an actual value, so a periodic
+run costs a request or two. Reads (history_page) only ever touch the
+database.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min
+from django.db.models.functions import TruncDay, TruncHour
+
+from .carbon_intensity import DEFAULT_TIMEOUT_S, fetch_range
+from .models import CarbonIntensityRecord
+
+SLOT = timedelta(minutes=30)
+
+# resolution -> (bucket width, truncation); None keeps the raw half hours.
+RESOLUTIONS = {
+    "30min": (SLOT, None),
+    "hour": (timedelta(hours=1), TruncHour),
+    "day": (timedelta(days=1), TruncDay),
+}
+
+MAX_PAGE_SIZE = 5000
+DEFAULT_PAGE_SIZE = 500
+UPSERT_BATCH_SIZE = 2000
+
+
+def floor_to_slot(dt: datetime) -> datetime:
+    dt = dt.astimezone(timezone.utc)
+    return dt.replace(minute=dt.minute - dt.minute % 30, second=0, microsecond=0)
+
+
+def missing_ranges(start: datetime, end: datetime, present) -> list[tuple[datetime, datetime]]:
+    """
+    Returns the [from, to) ranges of half hours in [start, end) that are not
+    in `present`, merging consecutive missing half hours into one range.
+    `start` must be on a half-hour boundary.
+    """
+    present = set(present)
+    ranges = []
+    slot = start
+    while slot < end:
+        if slot in present:
+            slot += SLOT
+            continue
+        gap_start = slot
+        while slot < end and slot not in present:
+            slot += SLOT
+        ranges.append((gap_start, slot))
+    return ranges
+
+
+def sync_history(start: datetime, end: datetime, fetch=fetch_range, timeout: float = DEFAULT_TIMEOUT_S) -> dict:
+    """
+    Fetches the half hours of [start, end) that are missing locally, or have
+    no actual value yet, and upserts them.
+
+    Returns:
+        dict with the 'ranges' fetched and the number of 'records' written.
+    """
+    start, end = floor_to_slot(start), floor_to_slot(end)
+    complete = CarbonIntensityRecord.objects.filter(
+        timestamp__gte=start, timestamp__lt=end, actual__isnull=False
+    ).values_list("timestamp", flat=True)
+    ranges = missing_ranges(start, end, complete)
+
+    written = 0
+    for gap_start, gap_end in ranges:
+        records = [r for r in fetch(gap_start, gap_end, timeout) if gap_start <= r["timestamp"] < gap_end]
+        # One transaction per range, so a failure later on keeps what was already fetched.
+        with transaction.atomic():
+            CarbonIntensityRecord.objects.bulk_create(
+                [CarbonIntensityRecord(**record) for record in records],
+                batch_size=UPSERT_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=["timestamp"],
+                update_fields=["forecast", "actual", "index"],
+            )
+        written += len(records)
+    return {"ranges": ranges, "records": written}
+
+
+def history_page(start: datetime, end: datetime, resolution: str = "30min", after: datetime = None,
+                 limit: int = DEFAULT_PAGE_SIZE) -> tuple[list[dict], datetime]:
+    """
+    Reads stored intensity for [start, end), oldest first, at the given
+    resolution (see RESOLUTIONS). Aggregated rows hold the mean forecast
+    and actual of each hour or day, plus its min and max actual and sample
+    count.
+
+    Pages are keyed on time: `after` is the 'from' of the last row of the
+    previous page.
+
+    Returns:
+        (rows, next_after): next_after is the value to pass as `after` for
+        the next page, or None on the last page.
+    """
+    width, trunc = RESOLUTIONS[resolution]
+    records = CarbonIntensityRecord.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    if after is not None:
+        # Buckets are aligned, so everything after `after`'s bucket starts one width later.
+        records = records.filter(timestamp__gte=after + width)
+
+    if trunc is None:
+        rows = list(
+            records.order_by("timestamp").values("timestamp", "forecast", "actual", "index")[:limit + 1]
+        )
+        rows = [{"from": r.pop("timestamp"), **r} for r in rows]
+    else:
+        rows = list(
+            records.annotate(bucket=trunc("timestamp", tzinfo=timezone.utc))
+            .values("bucket")
+            # Min/max first: once "actual" names the mean, it can't be aggregated again.
+            .annotate(actual_min=Min("actual"), actual_max=Max("actual"), samples=Count("id"))
+            .annotate(forecast=Avg("forecast"), actual=Avg("actual"))
+            .order_by("bucket")[:limit + 1]
+        )
+        rows = [{"from": r.pop("bucket"), **r} for r in rows]
+
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1]["from"]
+    return rows, None
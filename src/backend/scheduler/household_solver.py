@@ -0,0 +1,290 @@
+"""
+Joint scheduling of one household's appliances under a peak power cap.
+
+The per-appliance schedulers place every job in its own cheapest window, so
+appliances with overlapping windows all land on the same low-carbon slots.
+Here the household is solved as a whole: minimise the power-weighted carbon
+cost of all jobs while the total draw in every slot stays under the cap.
+
+The search is a depth-first branch-and-bound over each job's start slots,
+tried cheapest first and pruned with the sum of the remaining jobs'
+unconstrained minimum costs. It starts from a greedy placement, so if the
+time budget runs out the best solution found so far (at worst the greedy one)
+is returned.
+
+anytime_scheduler wraps this for request handlers with a hard deadline: the
+per-appliance answer first, then joint improvement for whatever time is left.
+"""
+
+import math
+import time
+from datetime import datetime
+
+import numpy as np
+
+from .kernel import _prefix_sums, window_sums, solve_slots
+from .scheduler_utils import DEFAULT_POWER_KW, DEFAULT_SLOT_MINUTES, _collect_jobs, _format_schedule, appliance_power_kw
+
+# Leaves headroom for parsing and formatting inside a 10 ms per-household target.
+DEFAULT_TIME_BUDGET_S = 0.008
+
+# Kept back from an anytime deadline for formatting the result.
+_FORMAT_HEADROOM_S = 0.0005
+
+# How many search nodes to expand between deadline checks.
+_CHECK_EVERY = 128
+_EPS = 1e-9
+
+
+def _fits(load: list[float], start: int, runtime: int, power: float, max_power_kw: float) -> bool:
+    for t in range(start, start + runtime):
+        if load[t] + power > max_power_kw + _EPS:
+            return False
+    return True
+
+
+def _add_load(load: list[float], start: int, runtime: int, power: float):
+    for t in range(start, start + runtime):
+        load[t] += power
+
+
+def _check_power_cap(max_power_kw):
+    if not (math.isfinite(max_power_kw) and max_power_kw > 0):
+        raise ValueError(f"max_power_kw must be a positive number, got {max_power_kw!r}.")
+
+
+def solve_household(carbon_forecast, earliest_slots, latest_start_slots, runtime_slots, power_kw,
+                    max_power_kw: float, time_budget_s: float = DEFAULT_TIME_BUDGET_S) -> dict:
+    """
+    Places a household's jobs to minimise sum(power * window cost) while
+    keeping the summed power in every slot at or below `max_power_kw`.
+
+    The slot arrays must describe feasible jobs, as for
+    kernel.best_start_slots.
+
+    Returns:
+        dict with
+        - 'start_slots': start slot per job, -1 if it could not be placed
+        - 'cost': objective value of the returned placement
+        - 'feasible': True if every job was placed under the cap
+        - 'optimal': True if the search finished, i.e. no cheaper placement exists
+        - 'nodes': number of search nodes expanded
+    """
+    deadline = time.perf_counter() + time_budget_s
+    prefix = _prefix_sums(carbon_forecast)
+    total_slots = len(prefix) - 1
+    n_jobs = len(earliest_slots)
+
+    # Candidate starts for every job, cheapest first (ties to the earliest slot,
+    # matching the per-appliance schedulers).
+    candidates = []
+    for i in range(n_jobs):
+        lo, hi = int(earliest_slots[i]), int(latest_start_slots[i])
+        costs = window_sums(prefix, int(runtime_slots[i]))[lo:hi + 1] * float(power_kw[i])
+        order = np.argsort(costs, kind='stable')
+        candidates.append(((order + lo).tolist(), costs[order].tolist()))
+
+    runtime = [int(r) for r in runtime_slots]
+    power = [float(p) for p in power_kw]
+
+    # Jobs drawing more than the cap can never be placed; the rest are searched
+    # biggest energy first, since those constrain the others the most.
+    placeable = [i for i in range(n_jobs) if power[i] <= max_power_kw + _EPS]
+    order = sorted(placeable, key=lambda i: -power[i] * runtime[i])
+
+    # Greedy incumbent: each job in turn takes its cheapest start that still fits.
+    load = [0.0] * total_slots
+    best_starts = [-1] * n_jobs
+    greedy_cost = 0.0
+    for i in order:
+        for start, cost in zip(*candidates[i]):
+            if _fits(load, start, runtime[i], power[i], max_power_kw):
+                _add_load(load, start, runtime[i], power[i])
+                best_starts[i] = start
+                greedy_cost += cost
+                break
+
+    feasible = len(placeable) == n_jobs and all(s >= 0 for s in best_starts)
+    best_cost = greedy_cost if feasible else float('inf')
+
+    # remaining_bound[d] is the cheapest the jobs order[d:] could possibly cost.
+    remaining_bound = [0.0] * (len(order) + 1)
+    for depth in range(len(order) - 1, -1, -1):
+        remaining_bound[depth] = remaining_bound[depth + 1] + candidates[order[depth]][1][0]
+
+    # Depth-first search with an explicit stack rather than recursion, so a
+    # household of any size can't hit the interpreter's recursion limit.
+    # position[d] is the next candidate to try for job order[d], cost[d] the
+    # cost of the jobs placed above it.
+    load = [0.0] * total_slots
+    current = [-1] * n_jobs
+    nodes = 0
+    timed_out = False
+    position = [0] * (len(order) + 1)
+    cost = [0.0] * (len(order) + 1)
+    depth = 0 if len(placeable) == n_jobs else -1
+
+    while depth >= 0:
+        if depth == len(order):
+            if cost[depth] < best_cost - _EPS:
+                best_cost = cost[depth]
+                best_starts = current.copy()
+        else:
+            i = order[depth]
+            starts, job_costs = candidates[i]
+            placed = False
+            while position[depth] < len(starts):
+                start, job_cost = starts[position[depth]], job_costs[position[depth]]
+                # Candidates are sorted, so once the bound fails it fails for the rest.
+                if cost[depth] + job_cost + remaining_bound[depth + 1] >= best_cost - _EPS:
+                    break
+
+                nodes += 1
+                if nodes % _CHECK_EVERY == 0 and time.perf_counter() > deadline:
+                    timed_out = True
+                    break
+
+                position[depth] += 1
+                if not _fits(load, start, runtime[i], power[i], max_power_kw):
+                    continue
+
+                _add_load(load, start, runtime[i], power[i])
+                current[i] = start
+                cost[depth + 1] = cost[depth] + job_cost
+                position[depth + 1] = 0
+                placed = True
+                break
+
+            if timed_out:
+                break
+            if placed:
+                depth += 1
+                continue
+
+        # Every candidate at this depth is done: take back the job placed above it.
+        depth -= 1
+        if depth >= 0:
+            j = order[depth]
+            _add_load(load, current[j], runtime[j], -power[j])
+            current[j] = -1
+
+    feasible = best_cost < float('inf')
+    if not feasible:
+        best_cost = greedy_cost
+
+    return {
+        "start_slots": best_starts,
+        "cost": best_cost,
+        "feasible": feasible,
+        "optimal": feasible and not timed_out,
+        "nodes": nodes,
+    }
+
+
+def joint_scheduler(appliances: list[dict], carbon_forecast: list[float], forecast_start_time: datetime,
+                    max_power_kw: float, time_budget_s: float = DEFAULT_TIME_BUDGET_S,
+                    slot_minutes: int = DEFAULT_SLOT_MINUTES) -> tuple[dict, dict]:
+    """
+    Household-level counterpart of scheduler_utils.scheduler.
+
+    Appliance dicts take an optional 'power_kw' (DEFAULT_POWER_KW if missing;
+    0 is a valid draw); an invalid one raises ValueError, as does a
+    `max_power_kw` that is not a finite number above 0.
+    Interruptible appliances are placed as one contiguous run here.
+    Appliances the per-appliance scheduler would reject are still returned
+    as None, as are any that could not be fitted under the cap.
+
+    Returns:
+        (schedule, stats): schedule maps appliance names to ISO start times
+        (or None); stats holds 'carbon_cost' in gCO2, 'feasible', 'optimal'
+        and 'unscheduled', a name -> diagnostics.Status map of the Nones.
+    """
+    total_slots = len(carbon_forecast)
+    if total_slots == 0:
+        raise ValueError("Carbon forecast is empty.")
+    _check_power_cap(max_power_kw)
+
+    batch = ([], [], [], [])
+    entries = _collect_jobs(appliances, forecast_start_time, total_slots, {}, batch, slot_minutes)
+    power_kw = [
+        appliance_power_kw(appliance) for appliance, (_, index, _) in zip(appliances, entries) if index >= 0
+    ]
+
+    solution = solve_household(carbon_forecast, *batch[:3], power_kw, max_power_kw, time_budget_s)
+    unscheduled = {}
+    schedule = _format_schedule(entries, solution["start_slots"], forecast_start_time, {}, slot_minutes, unscheduled)
+
+    return schedule, {
+        # Objective is kW x gCO2/kWh summed over slots; scale by slot hours for gCO2.
+        "carbon_cost": solution["cost"] * slot_minutes / 60,
+        "feasible": solution["feasible"],
+        "optimal": solution["optimal"],
+        "unscheduled": unscheduled,
+    }
+
+
+def anytime_scheduler(appliances: list[dict], carbon_forecast: list[float], forecast_start_time: datetime,
+                      deadline_s: float, max_power_kw: float = None,
+                      slot_minutes: int = DEFAULT_SLOT_MINUTES) -> tuple[dict, dict]:
+    """
+    Schedules one household within `deadline_s` seconds.
+
+    The per-appliance answer (every appliance in its own cheapest window)
+    comes first. Without a power cap, or if it already fits under the cap,
+    it is optimal and returned straight away. Otherwise the joint solver
+    improves on a greedy placement for whatever is left of the deadline and
+    returns the best placement found by then.
+
+    Appliance dicts take an optional 'power_kw' and `max_power_kw` is checked
+    as for joint_scheduler; invalid values raise ValueError (request handlers
+    validate them first, see ScheduleEventsView).
+
+    Returns:
+        (schedule, stats): schedule as for joint_scheduler; stats holds
+        'carbon_cost' in gCO2, 'optimal', 'feasible', 'unscheduled' (as for
+        joint_scheduler) and 'elapsed_ms'.
+    """
+    started = time.perf_counter()
+    total_slots = len(carbon_forecast)
+    if total_slots == 0:
+        raise ValueError("Carbon forecast is empty.")
+    if max_power_kw is not None:
+        _check_power_cap(max_power_kw)
+
+    batch = ([], [], [], [])
+    entries = _collect_jobs(appliances, forecast_start_time, total_slots, {}, batch, slot_minutes)
+    power_kw = [
+        appliance_power_kw(appliance) for appliance, (_, index, _) in zip(appliances, entries) if index >= 0
+    ]
+    slot_hours = slot_minutes / 60
+
+    results = solve_slots(carbon_forecast, *batch)
+    forecast = np.asarray(carbon_forecast, dtype=np.float64)
+    load = np.zeros(total_slots)
+    cost = 0.0
+    for result, runtime, power in zip(results, batch[2], power_kw):
+        slots = result if not isinstance(result, int) else slice(result, result + runtime)
+        load[slots] += power
+        cost += power * float(forecast[slots].sum())
+
+    unscheduled = {}
+    if max_power_kw is None or load.max() <= max_power_kw + _EPS:
+        schedule = _format_schedule(entries, results, forecast_start_time, {}, slot_minutes, unscheduled)
+        return schedule, {
+            "carbon_cost": cost * slot_hours,
+            "optimal": True,
+            "feasible": True,
+            "unscheduled": unscheduled,
+            "elapsed_ms": (time.perf_counter() - started) * 1000,
+        }
+
+    remaining_s = max(0.0, deadline_s - (time.perf_counter() - started) - _FORMAT_HEADROOM_S)
+    solution = solve_household(carbon_forecast, *batch[:3], power_kw, max_power_kw, remaining_s)
+    schedule = _format_schedule(entries, solution["start_slots"], forecast_start_time, {}, slot_minutes, unscheduled)
+    return schedule, {
+        "carbon_cost": solution["cost"] * slot_hours,
+        "optimal": solution["optimal"],
+        "feasible": solution["feasible"],
+        "unscheduled": unscheduled,
+        "elapsed_ms": (time.perf_counter() - started) * 1000,
+    }
@@ -0,0 +1,172 @@
+"""
+The scheduling kernel: every scheduler in this app ends up here.
+
+Everything in this module works on integer slot indices into a forecast
+array; turning ISO times and runtimes into slots (and deciding what counts as
+valid input) is done by the callers, see scheduler_utils._job_slots.
+
+The forecast is turned into a prefix sum once, every job with the same
+runtime shares one window-sum array, and the best start of each job is a
+range-minimum lookup over that array. Interruptible jobs take the cheapest
+slots of their window instead.
+
+Results are pinned down by the brute-force comparisons in tests.py, and
+per-job cost is tracked by benchmarks.run_kernel.
+"""
+
+import numpy as np
+
+from .window_cache import WindowSumIndex, window_cache
+
+# Number of distinct queries masked against the forecast at a time in
+# cheapest_slot_sets. Keeps the (queries x slots) scratch matrix to a few MB.
+_BATCH_CHUNK = 4096
+
+
+def _prefix_sums(carbon_forecast) -> np.ndarray:
+    # prefix[i] is the total cost of slots [0, i), so a window is one subtraction.
+    forecast = np.asarray(carbon_forecast, dtype=np.float64)
+    return np.concatenate(([0.0], np.cumsum(forecast)))
+
+
+def window_sums(prefix: np.ndarray, runtime_slots: int) -> np.ndarray:
+    """
+    Returns the cost of running for `runtime_slots` slots from every possible
+    start slot, indexed by start slot.
+    """
+    return prefix[runtime_slots:] - prefix[:-runtime_slots]
+
+
+def best_start_slots(carbon_forecast, earliest_slots, latest_start_slots, runtime_slots,
+                     forecast_version: str = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the cheapest start slot for every job in one pass.
+
+    The three slot arrays must describe feasible jobs, i.e.
+    0 <= earliest <= latest_start and latest_start + runtime <= len(forecast).
+    Ties go to the earliest slot.
+
+    Each distinct runtime gets one window-sum array with a range-minimum index
+    (window_cache.WindowSumIndex), after which every job is an O(1) lookup.
+    Passing `forecast_version` reuses those indexes across calls through the
+    process-level window_cache.
+
+    Returns:
+        (start_slots, costs) as arrays aligned with the input jobs.
+    """
+    prefix = _prefix_sums(carbon_forecast)
+
+    earliest = np.asarray(earliest_slots, dtype=np.int64)
+    latest_start = np.asarray(latest_start_slots, dtype=np.int64)
+    runtime = np.asarray(runtime_slots, dtype=np.int64)
+
+    start_slots = np.empty(earliest.size, dtype=np.int64)
+    costs = np.empty(earliest.size, dtype=np.float64)
+
+    for r in np.unique(runtime).tolist():
+        rows = np.flatnonzero(runtime == r)
+        if forecast_version is None:
+            index = WindowSumIndex(window_sums(prefix, r))
+        else:
+            index = window_cache.get(forecast_version, prefix, r)
+        start_slots[rows], costs[rows] = index.best_start(earliest[rows], latest_start[rows])
+
+    return start_slots, costs
+
+
+def cheapest_slot_sets(carbon_forecast, earliest_slots, end_slots, slot_counts) -> tuple[list[np.ndarray], np.ndarray]:
+    """
+    Picks the `slot_count` cheapest slots in [earliest, end) for every
+    interruptible job, which is the optimum when a run can be split freely.
+
+    Uses a partial selection (argpartition) per job rather than a full sort,
+    and like best_start_slots solves each distinct (count, earliest, end)
+    query once. Jobs must be feasible: end - earliest >= count and
+    end <= len(forecast).
+
+    Returns:
+        (slot_sets, costs): a sorted array of chosen slots per job, and the
+        total cost of each job's slots.
+    """
+    forecast = np.asarray(carbon_forecast, dtype=np.float64)
+    total_slots = len(forecast)
+
+    earliest = np.asarray(earliest_slots, dtype=np.int64)
+    end = np.asarray(end_slots, dtype=np.int64)
+    count = np.asarray(slot_counts, dtype=np.int64)
+
+    if earliest.size == 0:
+        return [], np.empty(0, dtype=np.float64)
+
+    width = total_slots + 1
+    keys = (count * width + earliest) * width + end
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    u_end = unique_keys % width
+    u_earliest = (unique_keys // width) % width
+    u_count = unique_keys // (width * width)
+
+    u_sets = [None] * len(unique_keys)
+    u_cost = np.empty(len(unique_keys), dtype=np.float64)
+    slots = np.arange(total_slots)
+
+    for k in np.unique(u_count):
+        k = int(k)
+        rows = np.flatnonzero(u_count == k)
+
+        for offset in range(0, len(rows), _BATCH_CHUNK):
+            chunk = rows[offset:offset + _BATCH_CHUNK]
+            lo = u_earliest[chunk, None]
+            hi = u_end[chunk, None]
+            masked = np.where((slots >= lo) & (slots < hi), forecast, np.inf)
+            picked = np.argpartition(masked, k - 1, axis=1)[:, :k]
+            u_cost[chunk] = np.take_along_axis(masked, picked, axis=1).sum(axis=1)
+            picked.sort(axis=1)
+            for row, chosen in zip(chunk.tolist(), picked):
+                u_sets[row] = chosen
+
+    inverse = inverse.reshape(-1)
+    return [u_sets[i] for i in inverse], u_cost[inverse]
+
+
+def _slots_to_intervals(slots) -> list[list[int]]:
+    # Collapses sorted slot indices into [start, stop) runs of consecutive slots.
+    intervals = []
+    for slot in np.asarray(slots).tolist():
+        if intervals and intervals[-1][1] == slot:
+            intervals[-1][1] = slot + 1
+        else:
+            intervals.append([slot, slot + 1])
+    return intervals
+
+
+def solve_slots(carbon_forecast, earliest_slots, latest_start_slots, runtime_slots, interruptible=None,
+                forecast_version: str = None) -> list:
+    """
+    Solves a batch of feasible jobs given as slot arrays.
+
+    Returns, in job order, the start slot (int) of each contiguous job and
+    the sorted slot array of each interruptible one.
+    """
+    earliest = np.asarray(earliest_slots, dtype=np.int64)
+    latest_start = np.asarray(latest_start_slots, dtype=np.int64)
+    runtime = np.asarray(runtime_slots, dtype=np.int64)
+    if interruptible is None:
+        interruptible = np.zeros(earliest.size, dtype=bool)
+    interruptible = np.asarray(interruptible, dtype=bool)
+    results = [None] * len(earliest)
+
+    contiguous = np.flatnonzero(~interruptible)
+    start_slots, _ = best_start_slots(
+        carbon_forecast, earliest[contiguous], latest_start[contiguous], runtime[contiguous], forecast_version
+    )
+    for i, slot in zip(contiguous.tolist(), start_slots.tolist()):
+        results[i] = slot
+
+    split = np.flatnonzero(interruptible)
+    if split.size:
+        end = latest_start[split] + runtime[split]
+        slot_sets, _ = cheapest_slot_sets(carbon_forecast, earliest[split], end, runtime[split])
+        for i, slots in zip(split.tolist(), slot_sets):
+            results[i] = slots
+
+    return results
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from scheduler.models import EventInstance, EventInstanceArchive
+
+DEFAULT_ARCHIVE_AFTER_DAYS = 365
+BATCH_SIZE = 5000
+
+ARCHIVED_FIELDS = ("id", "user_id", "appliance_id", "start_time", "runtime_min", "window_start", "window_end",
+                   "carbon_cost_g", "baseline_cost_g")
+
+
+class Command(BaseCommand):
+    help = ('Move events that started more than EVENT_ARCHIVE_AFTER_DAYS ago from EventInstance to '
+            'EventInstanceArchive, in batches, keeping their ids. Run periodically, e.g. nightly.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=getattr(settings, "EVENT_ARCHIVE_AFTER_DAYS", DEFAULT_ARCHIVE_AFTER_DAYS),
+                            help='Archive events that started more than this many days ago.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError("--days and --batch-size must be positive.")
+        cutoff = datetime.now(timezone.utc) - timedelta(days=options['days'])
+
+        moved = 0
+        while True:
+            # One transaction per batch: each batch is either in the archive or still live.
+            with transaction.atomic():
+                rows = list(
+                    EventInstance.objects.filter(start_time__lt=cutoff).order_by("id")
+                    .values(*ARCHIVED_FIELDS)[:options['batch_size']]
+                )
+                if not rows:
+                    break
+                EventInstanceArchive.objects.bulk_create([EventInstanceArchive(**row) for row in rows])
+                EventInstance.objects.filter(id__in=[row["id"] for row in rows]).delete()
+            moved += len(rows)
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} events that started before {cutoff.isoformat()}."))
@@ -0,0 +1,67 @@
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from scheduler.forecast import ForecastSnapshot
+from scheduler.models import CarbonPredictions, ForecastRun
+from scheduler.synthetic import make_forecast
+
+
+def _median_us(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = ('Compare forecast read latency of the per-slot CarbonPredictions rows with the packed '
+            'ForecastRun column. Writes a synthetic run and rolls it back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slots', type=int, nargs='+', default=[48, 96, 576], help='Forecast lengths to time.')
+        parser.add_argument('--repeats', type=int, default=200, help='Timed reads per measurement (median is kept).')
+
+    def handle(self, *args, **options):
+        start = datetime(2025, 11, 1, tzinfo=timezone.utc)
+        header = f"{'slots':>6} {'rows, objects':>14} {'rows, values':>13} {'packed':>8}  (median µs per read)"
+        self.stdout.write(header)
+
+        with transaction.atomic():
+            for slots in options['slots']:
+                values = make_forecast("diurnal", slots, 30)
+                run = ForecastRun.objects.create(
+                    issued_at=start, model_version="benchmark", slot_minutes=30, start=start,
+                    intensities=ForecastRun.pack(values),
+                )
+                CarbonPredictions.legacy.bulk_create([
+                    CarbonPredictions(run=run, timestamp=start + timedelta(minutes=30 * i), carbon_intensity=v)
+                    for i, v in enumerate(values)
+                ])
+
+                def rows_as_objects():
+                    predictions = list(CarbonPredictions.legacy.filter(run=run).order_by("timestamp"))
+                    return ForecastSnapshot.from_rows([(p.timestamp, p.carbon_intensity) for p in predictions])
+
+                def rows_as_values():
+                    return ForecastSnapshot.from_rows(list(
+                        CarbonPredictions.legacy.filter(run=run).order_by("timestamp")
+                        .values_list("timestamp", "carbon_intensity")
+                    ))
+
+                def packed():
+                    return ForecastSnapshot.from_packed(*ForecastRun.objects.filter(pk=run.pk).values_list(
+                        "start", "slot_minutes", "intensities"
+                    ).get())
+
+                repeats = options['repeats']
+                self.stdout.write(
+                    f"{slots:>6} {_median_us(rows_as_objects, repeats):>14.0f} "
+                    f"{_median_us(rows_as_values, repeats):>13.0f} {_median_us(packed, repeats):>8.0f}"
+                )
+            transaction.set_rollback(True)
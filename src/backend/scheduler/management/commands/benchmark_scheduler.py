@@ -0,0 +1,70 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scheduler.benchmarks import (
+    DEFAULT_REGRESSION_THRESHOLD, ENGINES, SUITE_HOUSEHOLDS, SUITE_TOTAL_SLOTS, compare_to_baseline, run_suite,
+)
+from scheduler.synthetic import FORECAST_KINDS
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the scheduling engines on synthetic forecasts and households. '
+            'Runs offline; writes a JSON baseline and/or compares against one.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--households', type=int, nargs='+', default=list(SUITE_HOUSEHOLDS),
+                            help='Household counts to run at.')
+        parser.add_argument('--forecasts', nargs='+', choices=FORECAST_KINDS, default=list(FORECAST_KINDS))
+        parser.add_argument('--engines', nargs='+', choices=sorted(ENGINES), default=sorted(ENGINES))
+        parser.add_argument('--slots', type=int, default=SUITE_TOTAL_SLOTS, help='Forecast length in slots.')
+        parser.add_argument('--slot-minutes', type=int, default=30)
+        parser.add_argument('--repeats', type=int, default=3, help='Timed runs per measurement (best is kept).')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--compare', help='Baseline JSON file to compare against.')
+        parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                            help='Allowed slowdown / memory growth over the baseline, as a fraction.')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline {options['compare']}: {e}")
+
+        report = run_suite(
+            household_counts=options['households'],
+            forecast_kinds=options['forecasts'],
+            engines=options['engines'],
+            total_slots=options['slots'],
+            slot_minutes=options['slot_minutes'],
+            repeats=options['repeats'],
+            seed=options['seed'],
+        )
+
+        self.stdout.write(f"{'engine':<26} {'forecast':<12} {'homes':>7} {'appliances':>10} "
+                          f"{'seconds':>9} {'appl/s':>10} {'peak MB':>8}")
+        for row in report['results']:
+            self.stdout.write(
+                f"{row['engine']:<26} {row['forecast']:<12} {row['households']:>7} {row['appliances']:>10} "
+                f"{row['seconds']:>9.4f} {row['appliances_per_s']:>10.0f} {row['peak_memory_bytes'] / 1e6:>8.1f}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+
+        if baseline is not None:
+            regressions = compare_to_baseline(report, baseline, options['threshold'])
+            for r in regressions:
+                self.stderr.write(
+                    f"{r['engine']} / {r['forecast']} / {r['households']} homes: {r['metric']} "
+                    f"{r['current']:.4g} vs {r['baseline']:.4g} ({r['ratio']:.2f}x)"
+                )
+            if regressions:
+                raise CommandError(f"{len(regressions)} regression(s) against {options['compare']}.")
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from scheduler.forecast import current_forecast
+from scheduler.models import Appliance, ApplianceProperty, EventInstance
+from scheduler.planner import plan_week
+from scheduler.savings import record_events
+
+
+class Command(BaseCommand):
+    help = ('Plan recurring appliance runs from ApplianceProperty over the current forecast. '
+            'Run periodically, e.g. after each run_inference.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Plan but don't write events.")
+
+    def handle(self, *args, **options):
+        forecast = current_forecast()
+        if forecast is None:
+            self.stderr.write(self.style.ERROR("No carbon forecast available. Aborting."))
+            return
+        forecast_start, carbon_forecast, slot_minutes = forecast.start, forecast.values.tolist(), forecast.slot_minutes
+
+        # Appliances are keyed by id throughout; the planner only compares them.
+        power_kw = dict(Appliance.objects.values_list("id", "average_power_Kwh"))
+        properties = [
+            {
+                "user_id": user_id,
+                "appliance": appliance,
+                "runtime_min": duration.total_seconds() / 60,
+                "frequency_per_week": frequency,
+                "earliest_start_time": earliest,
+                "latest_end_time": latest,
+                "preferred_days": preferred_days,
+                "preferred_start_time": preferred_start,
+                "interruptible": interruptible,
+            }
+            for (user_id, appliance, duration, frequency, earliest, latest,
+                 preferred_days, preferred_start, interruptible) in ApplianceProperty.objects.values_list(
+                "user_id", "appliance_id", "appliance__average_duration", "frequency_per_week",
+                "earliest_start_time", "latest_end_time", "preferred_days", "preferred_start_time",
+                "interruptible",
+            )
+        ]
+        self.stdout.write(f"Planning {len(properties)} appliance properties...")
+
+        # Everything from the Monday of the forecast's first week counts towards the quota.
+        week_start = (forecast_start - timedelta(days=forecast_start.weekday())).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        existing = list(
+            EventInstance.objects.filter(start_time__gte=week_start).values_list("user_id", "appliance_id", "start_time")
+        )
+
+        plan = plan_week(properties, carbon_forecast, forecast_start, existing, slot_minutes)
+
+        if options['dry_run']:
+            self.stdout.write(f"Would create {len(plan)} events.")
+            return
+
+        with transaction.atomic():
+            created = EventInstance.objects.bulk_create([
+                EventInstance(
+                    appliance_id=run["appliance"],
+                    carbon_cost_g=forecast.carbon_g(run["start_time"], run["runtime_min"], power_kw[run["appliance"]]),
+                    # Split runs have no window, so no baseline to compare against.
+                    baseline_cost_g=forecast.carbon_g(
+                        run["window_start"], run["runtime_min"], power_kw[run["appliance"]]
+                    ) if "window_start" in run else None,
+                    **{field: value for field, value in run.items() if field != "appliance"},
+                )
+                for run in plan
+            ], batch_size=2000)
+            record_events(created)
+
+        self.stdout.write(self.style.SUCCESS(f"Planned {len(plan)} events."))
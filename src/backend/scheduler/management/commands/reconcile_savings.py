@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from scheduler.savings import reconcile_rollups
+
+DEFAULT_RECONCILE_DAYS = 2
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the carbon savings rollups of the last SAVINGS_RECONCILE_DAYS days (today included) '
+            'from the events, fixing any drift in the incremental updates. Run nightly.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=getattr(settings, "SAVINGS_RECONCILE_DAYS", DEFAULT_RECONCILE_DAYS),
+                            help='Reconcile this many days, ending today.')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError("--days must be positive.")
+        last_day = timezone.localdate()
+        first_day = last_day - timedelta(days=options['days'] - 1)
+
+        report = reconcile_rollups(first_day, last_day)
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {report['days']} days ({first_day} to {last_day}): {report['rows']} daily rollups, "
+            f"drift {report['drift_g']:+.1f} gCO2."
+        ))
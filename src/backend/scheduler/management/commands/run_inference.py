@@ -1,21 +1,37 @@
 from django.core.management.base import BaseCommand
 from django.conf import settings
 import os
+import time
 import requests
 import json
 import pandas as pd
 import numpy as np
 import openmeteo_requests
 import requests_cache
-from retry_requests import retry
 from datetime import datetime, timedelta, timezone
 import joblib  
 
-from scheduler.models import CarbonPredictions
+from scheduler.rescheduler import reschedule_future_events
+from scheduler.window_cache import window_cache, forecast_version
+from scheduler.forecast import forecast_updated, prune_runs, publish_forecast
+from scheduler.sources import Source, SourceFailed, fetch_sources
+
+# The model predicts 48 half-hourly values.
+MODEL_SLOT_MINUTES = 30
+MODEL_HORIZON_SLOTS = 48
+
+# (per-request timeout in seconds, retries) of each upstream; overridable
+# per source with settings.INFERENCE_SOURCE_BUDGETS.
+DEFAULT_SOURCE_BUDGETS = {
+    "intensity_lags": (10.0, 2),
+    "weather_lags": (15.0, 2),
+    "generation_mix": (10.0, 2),
+    "weather_forecast": (15.0, 2),
+}
 
 # helper funcs
 
-def get_intensity_lags():
+def get_intensity_lags(timeout=None):
     """
     Get the CO2 intensity data and format
     """
@@ -23,7 +39,7 @@ def get_intensity_lags():
     now = datetime.now(timezone.utc).isoformat()
 
     url = f"https://api.carbonintensity.org.uk/intensity/{week_ago}/{now}"
-    response = requests.get(url)
+    response = requests.get(url, timeout=timeout)
     response.raise_for_status()
     api_data = response.json()
 
@@ -49,11 +65,10 @@ def get_intensity_lags():
     df['avg_intensity_last_6_hours'] = df['intensity_actual'].shift(1).rolling(window=12).mean()
     return df.iloc[-1:].reset_index(drop=True)
 
-def get_weather_lags():
-    #Boilerplate api stuff
+def get_weather_lags(timeout=None):
+    # Retries are left to fetch_sources, which budgets them per source.
     cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
-    retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
-    openmeteo = openmeteo_requests.Client(session=retry_session)
+    openmeteo = openmeteo_requests.Client(session=cache_session)
 
     url = "https://api.open-meteo.com/v1/forecast"  # Use forecast to get 'past_days'
     params = {
@@ -65,7 +80,7 @@ def get_weather_lags():
         "timezone": "auto"
     }
 
-    responses = openmeteo.weather_api(url, params=params)
+    responses = openmeteo.weather_api(url, params=params, timeout=timeout)
     response = responses[0]
 
     hourly = response.Hourly()
@@ -101,7 +116,7 @@ def get_weather_lags():
 
     return weather_lags_df.iloc[-1:].reset_index(drop=True)
 
-def get_live_generation_mix_elexon():
+def get_live_generation_mix_elexon(timeout=None):
     """
     Fetches the latest instantaneous generation mix (in MW) from the
     Elexon data portal and maps it to the model's feature names.
@@ -116,56 +131,50 @@ def get_live_generation_mix_elexon():
         'format': 'json'
     }
 
-    try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        data = response.json().get('data', [])
-
-        if not data:
-            print("No generation data found in the window.")
-            return None
-
-        latest_publish_time = max(item['publishTime'] for item in data)
-        latest_records = [item for item in data if item['publishTime'] == latest_publish_time]
-
-        raw_mix_mw = {}
-        for item in latest_records:
-            fuel_type = item.get('fuelType', 'unknown').upper()
-            current_mw = item.get('generation')
-            raw_mix_mw[fuel_type] = current_mw
-
-        # Define your model's columns (SOLAR is removed)
-        model_columns = ['WIND', 'GAS', 'NUCLEAR', 'COAL', 'HYDRO',
-                         'IMPORTS', 'BIOMASS', 'STORAGE']
-
-        mapped_mix = {col: 0.0 for col in model_columns}
-
-        mapped_mix['WIND'] = raw_mix_mw.get('WIND', 0.0)
-        mapped_mix['NUCLEAR'] = raw_mix_mw.get('NUCLEAR', 0.0)
-        mapped_mix['COAL'] = raw_mix_mw.get('COAL', 0.0)
-        mapped_mix['BIOMASS'] = raw_mix_mw.get('BIOMASS', 0.0)
-        mapped_mix['GAS'] = raw_mix_mw.get('GAS', 0.0) + raw_mix_mw.get('OCGT', 0.0)
-        mapped_mix['HYDRO'] = raw_mix_mw.get('NPSHYD', 0.0)
-        mapped_mix['STORAGE'] = raw_mix_mw.get('PS', 0.0)
-
-        interconnector_keys = ['INTELEC', 'INTEW', 'INTFR', 'INTGRNL', 'INTIFA2',
-                               'INTIRL', 'INTNED', 'INTNEM', 'INTNSL', 'INTVKL']
-        total_imports = 0.0
-        for key in interconnector_keys:
-            total_imports += raw_mix_mw.get(key, 0.0)
-        mapped_mix['IMPORTS'] = total_imports
-
-        df_live_gen = pd.DataFrame([mapped_mix], columns=model_columns)
-        return df_live_gen
-
-    except requests.RequestException as e:
-        print(f"Error fetching Elexon generation data: {e}")
+    response = requests.get(base_url, params=params, timeout=timeout)
+    response.raise_for_status()
+    data = response.json().get('data', [])
+
+    if not data:
+        print("No generation data found in the window.")
         return None
 
-def get_live_weather_forecast():
+    latest_publish_time = max(item['publishTime'] for item in data)
+    latest_records = [item for item in data if item['publishTime'] == latest_publish_time]
+
+    raw_mix_mw = {}
+    for item in latest_records:
+        fuel_type = item.get('fuelType', 'unknown').upper()
+        current_mw = item.get('generation')
+        raw_mix_mw[fuel_type] = current_mw
+
+    # Define your model's columns (SOLAR is removed)
+    model_columns = ['WIND', 'GAS', 'NUCLEAR', 'COAL', 'HYDRO',
+                     'IMPORTS', 'BIOMASS', 'STORAGE']
+
+    mapped_mix = {col: 0.0 for col in model_columns}
+
+    mapped_mix['WIND'] = raw_mix_mw.get('WIND', 0.0)
+    mapped_mix['NUCLEAR'] = raw_mix_mw.get('NUCLEAR', 0.0)
+    mapped_mix['COAL'] = raw_mix_mw.get('COAL', 0.0)
+    mapped_mix['BIOMASS'] = raw_mix_mw.get('BIOMASS', 0.0)
+    mapped_mix['GAS'] = raw_mix_mw.get('GAS', 0.0) + raw_mix_mw.get('OCGT', 0.0)
+    mapped_mix['HYDRO'] = raw_mix_mw.get('NPSHYD', 0.0)
+    mapped_mix['STORAGE'] = raw_mix_mw.get('PS', 0.0)
+
+    interconnector_keys = ['INTELEC', 'INTEW', 'INTFR', 'INTGRNL', 'INTIFA2',
+                           'INTIRL', 'INTNED', 'INTNEM', 'INTNSL', 'INTVKL']
+    total_imports = 0.0
+    for key in interconnector_keys:
+        total_imports += raw_mix_mw.get(key, 0.0)
+    mapped_mix['IMPORTS'] = total_imports
+
+    df_live_gen = pd.DataFrame([mapped_mix], columns=model_columns)
+    return df_live_gen
+
+def get_live_weather_forecast(timeout=None):
     cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
-    retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
-    openmeteo = openmeteo_requests.Client(session=retry_session)
+    openmeteo = openmeteo_requests.Client(session=cache_session)
 
     url = "https://api.open-meteo.com/v1/forecast"
     params = {
@@ -173,7 +182,7 @@ def get_live_weather_forecast():
         "hourly": "temperature_2m,wind_speed_100m,direct_normal_irradiance_instant",
         "forecast_days": 2, "timezone": "auto"
     }
-    responses = openmeteo.weather_api(url, params=params)
+    responses = openmeteo.weather_api(url, params=params, timeout=timeout)
     response = responses[0]
 
     hourly = response.Hourly()
@@ -207,30 +216,43 @@ def get_live_weather_forecast():
 
     return pd.DataFrame([live_forecast_data])
 
-def build_live_inference_row():
-    """
-    Runs all API calls and stitches data together into the final
-    1-row DataFrame for the model.
-    """
+def inference_sources():
+    """The upstreams of a run, in feature order. All are critical: the model needs every column."""
+    budgets = {**DEFAULT_SOURCE_BUDGETS, **getattr(settings, "INFERENCE_SOURCE_BUDGETS", {})}
+    fetchers = {
+        "intensity_lags": get_intensity_lags,
+        "weather_lags": get_weather_lags,
+        "generation_mix": get_live_generation_mix_elexon,
+        "weather_forecast": get_live_weather_forecast,
+    }
+    return [Source(name, fetch, *budgets[name]) for name, fetch in fetchers.items()]
 
-    latest_co2_lags = get_intensity_lags()
-    latest_weather_lags = get_weather_lags()
 
-    live_gen_mix = get_live_generation_mix_elexon()
+def _log_timings(timings, total_s, log):
+    for name, timing in timings.items():
+        outcome = "ok" if timing.ok else "failed"
+        log(f"  {name:<17} {timing.seconds:6.2f}s  {timing.attempts} attempt(s)  {outcome}")
+    log(f"  {'total (wall)':<17} {total_s:6.2f}s")
 
-    live_forecast_pivoted = get_live_weather_forecast()
 
-    if (latest_co2_lags is None or latest_weather_lags is None or
-            live_gen_mix is None or live_forecast_pivoted is None):
-        print("A critical API call failed. Aborting inference.")
+def build_live_inference_row(log=print):
+    """
+    Runs all API calls concurrently and stitches data together into the
+    final 1-row DataFrame for the model. Returns None, without waiting for
+    the other calls, as soon as one of them fails.
+    """
+    sources = inference_sources()
+    started = time.perf_counter()
+    try:
+        values, timings = fetch_sources(sources)
+    except SourceFailed as e:
+        log(f"Upstream fetch failed ({e}). Aborting inference.")
+        _log_timings(e.timings, time.perf_counter() - started, log)
         return None
+    log("Upstream fetch times:")
+    _log_timings(timings, time.perf_counter() - started, log)
 
-    inference_row = pd.concat([
-        latest_co2_lags,
-        latest_weather_lags,
-        live_gen_mix,
-        live_forecast_pivoted
-    ], axis=1)
+    inference_row = pd.concat([values[source.name] for source in sources], axis=1)
 
     all_feature_cols = [
         'temp_actual', 'wind_actual', 'precip_actual', 'cloud_cover_actual', 'irradiance_actual',
@@ -284,10 +306,47 @@ def build_live_inference_row():
     return final_inference_row
 
 
+def model_version(model_path):
+    """Identifies the model file a run was produced with: its name and modification time."""
+    modified = datetime.fromtimestamp(os.path.getmtime(model_path), timezone.utc)
+    return f"{os.path.basename(model_path)}@{modified:%Y-%m-%dT%H:%MZ}"
+
+
+def resample_forecast(start, prediction_values, slot_minutes=MODEL_SLOT_MINUTES):
+    """
+    Turns the model's 48 half-hourly predictions into a forecast of
+    `slot_minutes`-wide slots over the same 24 hours. Finer slots are
+    linearly interpolated between the half-hour values.
+
+    Returns (timestamps, values).
+    """
+    model_values = np.asarray(prediction_values[:MODEL_HORIZON_SLOTS], dtype=np.float64)
+    periods = MODEL_HORIZON_SLOTS * MODEL_SLOT_MINUTES // slot_minutes
+    timestamps = pd.date_range(start=start, periods=periods, freq=f'{slot_minutes}min')
+    if slot_minutes == MODEL_SLOT_MINUTES:
+        return timestamps, model_values
+
+    offsets = np.arange(periods) * slot_minutes
+    values = np.interp(offsets, np.arange(MODEL_HORIZON_SLOTS) * MODEL_SLOT_MINUTES, model_values)
+    return timestamps, values
+
+
 class Command(BaseCommand):
     help = 'Fetch real time data, run inference with trained model, and save predictions to DB.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--slot-minutes', type=int, default=MODEL_SLOT_MINUTES,
+                            help="Width of the stored forecast slots; must divide 30. "
+                                 "Finer slots are interpolated from the model's half-hourly output.")
+        parser.add_argument('--skip-reschedule', action='store_true',
+                            help="Don't move future events to the new forecast's best slots.")
+
     def handle(self, *args, **options):
+        slot_minutes = options['slot_minutes']
+        if slot_minutes <= 0 or MODEL_SLOT_MINUTES % slot_minutes:
+            self.stderr.write(self.style.ERROR(f"--slot-minutes must divide {MODEL_SLOT_MINUTES}."))
+            return
+
         self.stdout.write("Starting new forecast run...")
         
         model_path = os.path.join(settings.BASE_DIR, 'models', 'CarbonIntensityPredictor.joblib')
@@ -301,7 +360,7 @@ class Command(BaseCommand):
         self.stdout.write("Model loaded successfully.")
 
 
-        X_live = build_live_inference_row()
+        X_live = build_live_inference_row(log=self.stdout.write)
         if X_live is None:
             self.stderr.write(self.style.ERROR("Failed to build live inference row. Aborting."))
             return
@@ -318,23 +377,39 @@ class Command(BaseCommand):
         else:
             next_half_hour = next_half_hour.replace(minute=0) + timedelta(hours=1)
             
-        forecast_timestamps = pd.date_range(start=next_half_hour, periods=48, freq='30T')
-
-        CarbonPredictions.objects.all().delete()
-        self.stdout.write("Old predictions cleared.")
-
-        predictions_to_create = []
-        for i in range(48):
-            predictions_to_create.append(
-                CarbonPredictions(
-                    timestamp=forecast_timestamps[i],
-                    # This line will now work
-                    carbon_intensity=prediction_values[i] 
-                )
-            )
+        forecast_timestamps, forecast_values = resample_forecast(next_half_hour, prediction_values, slot_minutes)
+
+        # The new run replaces the current one atomically; earlier runs are
+        # kept for backtesting until they age out.
+        run = publish_forecast(
+            forecast_timestamps[0].to_pydatetime(), forecast_values, slot_minutes,
+            model_version=model_version(model_path), issued_at=now,
+        )
+        self.stdout.write(f"Published forecast run {run.pk}; pruned {prune_runs()} old run(s).")
+
+        # Cached window sums are keyed by forecast content, so other processes
+        # stop hitting the old forecast on their own; drop this process's now.
+        # Forecast snapshots in other processes pick up the new run on their
+        # next version check.
+        window_cache.invalidate()
+        forecast_updated.send(sender=self.__class__)
+
         
+        self.stdout.write(self.style.SUCCESS("Successfully saved new forecast."))
 
-        CarbonPredictions.objects.bulk_create(predictions_to_create)
+        if options['skip_reschedule']:
+            return
 
-        
-        self.stdout.write(self.style.SUCCESS("Successfully saved new forecast."))
\ No newline at end of file
+        # What readers see: the float32 values as stored.
+        carbon_forecast = run.array.tolist()
+        forecast_start = forecast_timestamps[0].to_pydatetime()
+        started = time.perf_counter()
+        report = reschedule_future_events(
+            carbon_forecast, forecast_start, slot_minutes=slot_minutes,
+            forecast_version=forecast_version(forecast_start, carbon_forecast, slot_minutes),
+        )
+        self.stdout.write(
+            f"Rescheduled {report['moved']} of {report['checked']} future events "
+            f"(carbon delta {report['carbon_delta_g']:.1f} gCO2) "
+            f"in {time.perf_counter() - started:.2f}s."
+        )
\ No newline at end of file
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from scheduler.carbon_intensity import DEFAULT_TIMEOUT_S, UpstreamError
+from scheduler.history import sync_history
+
+
+def _parse_time(value: str) -> datetime:
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+class Command(BaseCommand):
+    help = ('Fill the local historic carbon intensity table from the Carbon Intensity API, '
+            'fetching only half hours that are missing or have no actual value yet. '
+            'Run periodically, e.g. hourly.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', type=_parse_time,
+                            help='Start of the range (ISO 8601, UTC if no offset). Default: --days ago.')
+        parser.add_argument('--to', dest='end', type=_parse_time, help='End of the range. Default: now.')
+        parser.add_argument('--days', type=int, default=30, help='Days back to sync when --from is not given.')
+
+    def handle(self, *args, **options):
+        end = options['end'] or datetime.now(timezone.utc)
+        start = options['start'] or end - timedelta(days=options['days'])
+        if start >= end:
+            raise CommandError("--from must be before --to.")
+
+        timeout = getattr(settings, "CARBON_INTENSITY_TIMEOUT_S", DEFAULT_TIMEOUT_S)
+        try:
+            report = sync_history(start, end, timeout=timeout)
+        except UpstreamError as e:
+            raise CommandError(f"Sync stopped: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Synced {report['records']} half hours in {len(report['ranges'])} missing range(s) "
+            f"between {start.isoformat()} and {end.isoformat()}."
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0004_alter_eventinstance_appliance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='applianceproperty',
+            name='interruptible',
+            field=models.BooleanField(default=False),
+        ),
+    ]
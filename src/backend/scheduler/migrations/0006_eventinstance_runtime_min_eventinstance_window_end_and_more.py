@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0005_applianceproperty_interruptible'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventinstance',
+            name='runtime_min',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventinstance',
+            name='window_end',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventinstance',
+            name='window_start',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
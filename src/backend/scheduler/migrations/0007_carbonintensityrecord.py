@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0006_eventinstance_runtime_min_eventinstance_window_end_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarbonIntensityRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(unique=True)),
+                ('forecast', models.FloatField(blank=True, null=True)),
+                ('actual', models.FloatField(blank=True, null=True)),
+                ('index', models.CharField(blank=True, max_length=20)),
+            ],
+            options={
+                'verbose_name_plural': 'Carbon Intensity Records',
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0008_eventinstance_user_start_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForecastRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('issued_at', models.DateTimeField(db_index=True)),
+                ('model_version', models.CharField(max_length=100)),
+                ('slot_minutes', models.PositiveSmallIntegerField(default=30)),
+            ],
+            options={
+                'verbose_name_plural': 'Forecast Runs',
+            },
+        ),
+        migrations.CreateModel(
+            name='CurrentForecastRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, related_name='current_pointer', to='scheduler.forecastrun')),
+            ],
+            options={
+                'verbose_name_plural': 'Current Forecast Run',
+            },
+        ),
+        migrations.AddField(
+            model_name='carbonpredictions',
+            name='run',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='predictions', to='scheduler.forecastrun'),
+        ),
+    ]
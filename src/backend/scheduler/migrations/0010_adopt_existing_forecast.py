@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:58
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def adopt_existing_forecast(apps, schema_editor):
+    # Rows written before runs existed become one run, made current.
+    ForecastRun = apps.get_model('scheduler', 'ForecastRun')
+    CurrentForecastRun = apps.get_model('scheduler', 'CurrentForecastRun')
+    CarbonPredictions = apps.get_model('scheduler', 'CarbonPredictions')
+
+    timestamps = list(CarbonPredictions.objects.order_by('timestamp').values_list('timestamp', flat=True)[:2])
+    if not timestamps:
+        return
+    slot_minutes = int((timestamps[1] - timestamps[0]).total_seconds() // 60) if len(timestamps) > 1 else 30
+    run = ForecastRun.objects.create(issued_at=timezone.now(), model_version='legacy', slot_minutes=slot_minutes)
+    CarbonPredictions.objects.update(run=run)
+    CurrentForecastRun.objects.create(pk=1, run=run)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0009_forecastrun'),
+    ]
+
+    operations = [
+        migrations.RunPython(adopt_existing_forecast, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0010_adopt_existing_forecast'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='carbonpredictions',
+            name='run',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='predictions', to='scheduler.forecastrun'),
+        ),
+        migrations.AddIndex(
+            model_name='carbonpredictions',
+            index=models.Index(fields=['run', 'timestamp'], name='prediction_run_time_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0011_alter_carbonpredictions_run'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forecastrun',
+            name='intensities',
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.AddField(
+            model_name='forecastrun',
+            name='start',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:00
+
+import numpy as np
+from django.db import migrations
+
+
+def pack_runs(apps, schema_editor):
+    # Copies each run's per-slot rows into its packed intensities.
+    ForecastRun = apps.get_model('scheduler', 'ForecastRun')
+    CarbonPredictions = apps.get_model('scheduler', 'CarbonPredictions')
+
+    for run in ForecastRun.objects.filter(start__isnull=True):
+        rows = list(
+            CarbonPredictions.objects.filter(run=run).order_by('timestamp').values_list('timestamp', 'carbon_intensity')
+        )
+        run.start = rows[0][0] if rows else run.issued_at
+        run.intensities = np.asarray([intensity for _, intensity in rows], dtype='<f4').tobytes()
+        run.save(update_fields=['start', 'intensities'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0012_forecastrun_packed_intensities'),
+    ]
+
+    operations = [
+        migrations.RunPython(pack_runs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0013_pack_forecast_runs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='forecastrun',
+            name='start',
+            field=models.DateTimeField(),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0014_alter_forecastrun_start'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventinstance',
+            name='appliance_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='scheduler.appliance'),
+        ),
+        migrations.AddField(
+            model_name='eventinstance',
+            name='carbon_cost_g',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='EventInstanceArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('start_time', models.DateTimeField()),
+                ('runtime_min', models.PositiveIntegerField(blank=True, null=True)),
+                ('window_start', models.DateTimeField(blank=True, null=True)),
+                ('window_end', models.DateTimeField(blank=True, null=True)),
+                ('carbon_cost_g', models.FloatField(blank=True, null=True)),
+                ('appliance', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='scheduler.appliance')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Archived Event Instances',
+                'indexes': [models.Index(fields=['user', 'start_time', 'id'], name='archive_user_start_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:10
+
+from datetime import timedelta
+
+from django.db import migrations
+
+# Power draw given to appliances created here, as in household_solver.DEFAULT_POWER_KW.
+DEFAULT_POWER_KW = 1.0
+DEFAULT_RUNTIME_MIN = 60
+
+
+def link_events(apps, schema_editor):
+    # Points every event at the Appliance of its name (the oldest row for
+    # duplicate names, as the views do), creating one for names that have
+    # none, and fills in missing runtimes from the appliance's average.
+    Appliance = apps.get_model('scheduler', 'Appliance')
+    EventInstance = apps.get_model('scheduler', 'EventInstance')
+
+    names = set(EventInstance.objects.values_list('appliance', flat=True).distinct())
+    catalogue = {}
+    for appliance in Appliance.objects.filter(name__in=names).order_by('id'):
+        catalogue.setdefault(appliance.name, appliance)
+    for name in names - set(catalogue):
+        runtime = EventInstance.objects.filter(appliance=name, runtime_min__isnull=False).values_list(
+            'runtime_min', flat=True).first()
+        catalogue[name] = Appliance.objects.create(
+            name=name, average_power_Kwh=DEFAULT_POWER_KW,
+            average_duration=timedelta(minutes=runtime or DEFAULT_RUNTIME_MIN),
+        )
+
+    for name, appliance in catalogue.items():
+        EventInstance.objects.filter(appliance=name).update(appliance_ref=appliance)
+        EventInstance.objects.filter(appliance=name, runtime_min__isnull=True).update(
+            runtime_min=max(1, round(appliance.average_duration.total_seconds() / 60))
+        )
+
+
+def unlink_events(apps, schema_editor):
+    EventInstance = apps.get_model('scheduler', 'EventInstance')
+    Appliance = apps.get_model('scheduler', 'Appliance')
+    for appliance_id, name in Appliance.objects.values_list('id', 'name'):
+        EventInstance.objects.filter(appliance_ref_id=appliance_id).update(appliance=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0015_eventinstance_appliance_ref_carbon_cost'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_events, unlink_events),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0016_link_events_to_appliances'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='eventinstance',
+            name='appliance',
+        ),
+        migrations.RenameField(
+            model_name='eventinstance',
+            old_name='appliance_ref',
+            new_name='appliance',
+        ),
+        migrations.AlterField(
+            model_name='eventinstance',
+            name='appliance',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='scheduler.appliance'),
+        ),
+    ]
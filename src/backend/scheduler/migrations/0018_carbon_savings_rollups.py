@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0017_eventinstance_appliance_fk'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventinstance',
+            name='baseline_cost_g',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventinstancearchive',
+            name='baseline_cost_g',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='CarbonSavingsDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('events', models.IntegerField(default=0)),
+                ('carbon_g', models.FloatField(default=0.0)),
+                ('baseline_g', models.FloatField(default=0.0)),
+                ('day', models.DateField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily Carbon Savings',
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='savings_daily_user_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CarbonSavingsMonthly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('events', models.IntegerField(default=0)),
+                ('carbon_g', models.FloatField(default=0.0)),
+                ('baseline_g', models.FloatField(default=0.0)),
+                ('month', models.DateField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Monthly Carbon Savings',
+                'constraints': [models.UniqueConstraint(fields=('user', 'month'), name='savings_monthly_user_month')],
+            },
+        ),
+    ]
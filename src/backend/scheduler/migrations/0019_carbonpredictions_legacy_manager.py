@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:24
+
+import django.db.models.manager
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0018_carbon_savings_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='carbonpredictions',
+            managers=[
+                ('legacy', django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
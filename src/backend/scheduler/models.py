@@ -1,6 +1,14 @@
+import operator
+from datetime import timedelta
+
+import numpy as np
+from django.core.exceptions import FieldError
 from django.db import models
 from django.contrib.auth.models import User
 
+# Forecast intensities are stored packed, as little-endian float32.
+PACKED_DTYPE = np.dtype("<f4")
+
 class Appliance(models.Model):
     name = models.CharField(max_length=200)
     average_power_Kwh = models.FloatField()
@@ -20,6 +28,8 @@ class ApplianceProperty(models.Model):
     latest_end_time = models.TimeField()
     preferred_days = models.CharField(max_length=100)
     preferred_start_time = models.TimeField()
+    # Runs that may be split across non-contiguous slots (EV charging, batteries).
+    interruptible = models.BooleanField(default=False)
 
 
     def __str__(self):
@@ -28,27 +38,335 @@ class ApplianceProperty(models.Model):
     class Meta:
         verbose_name_plural = "Appliance Properties"
 
-class EventInstance(models.Model):
+class EventFields(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    appliance = models.CharField(max_length=100)
+    # PROTECT: removing an appliance type must not erase users' history.
+    appliance = models.ForeignKey(Appliance, on_delete=models.PROTECT)
     start_time = models.DateTimeField()
+    # Length of this run; split (interruptible) runs store each interval as its own event.
+    runtime_min = models.PositiveIntegerField(null=True, blank=True)
+    # The window the event was scheduled in, so it can be moved when a new
+    # forecast lands. Left empty for events that can't be moved (split runs).
+    window_start = models.DateTimeField(null=True, blank=True)
+    window_end = models.DateTimeField(null=True, blank=True)
+    # gCO2 of the run under the forecast it was (last) scheduled against;
+    # empty if the run fell outside that forecast.
+    carbon_cost_g = models.FloatField(null=True, blank=True)
+    # gCO2 the run would have cost starting as early as it was allowed to,
+    # under the forecast it was first scheduled against. What the schedule
+    # saved is baseline_cost_g - carbon_cost_g (see savings.py).
+    baseline_cost_g = models.FloatField(null=True, blank=True)
 
+    @property
+    def appliance_name(self) -> str:
+        return self.appliance.name
 
     def __str__(self):
         return f"Event for {self.appliance.name} by {self.user.username} at {self.start_time}"
 
+    class Meta:
+        abstract = True
+
+
+class EventInstance(EventFields):
+
     class Meta:
         verbose_name_plural = "Event Instances"
+        indexes = [
+            # Backs the per-user (start_time, id) keyset pages in events.py.
+            models.Index(fields=["user", "start_time", "id"], name="event_user_start_idx"),
+        ]
+
+
+class EventInstanceArchive(EventFields):
+    # Events moved out of EventInstance by the archive_events command once
+    # they are old, so the live table only grows with recent activity. Ids
+    # are kept, so an event is the same event in either table.
+    id = models.BigIntegerField(primary_key=True)
+
+    class Meta:
+        verbose_name_plural = "Archived Event Instances"
+        indexes = [
+            models.Index(fields=["user", "start_time", "id"], name="archive_user_start_idx"),
+        ]
+
+
+class SavingsRollup(models.Model):
+    # Sums over a user's events starting in one period, kept by savings.py.
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    events = models.IntegerField(default=0)
+    carbon_g = models.FloatField(default=0.0)
+    baseline_g = models.FloatField(default=0.0)
+
+    @property
+    def saved_g(self) -> float:
+        return self.baseline_g - self.carbon_g
+
+    class Meta:
+        abstract = True
+
+
+class CarbonSavingsDaily(SavingsRollup):
+    day = models.DateField()
+
+    def __str__(self):
+        return f"{self.user_id} saved {self.saved_g:.0f} gCO2 on {self.day}"
+
+    class Meta:
+        verbose_name_plural = "Daily Carbon Savings"
+        constraints = [models.UniqueConstraint(fields=["user", "day"], name="savings_daily_user_day")]
+
+
+class CarbonSavingsMonthly(SavingsRollup):
+    month = models.DateField()  # first day of the month
+
+    def __str__(self):
+        return f"{self.user_id} saved {self.saved_g:.0f} gCO2 in {self.month:%Y-%m}"
+
+    class Meta:
+        verbose_name_plural = "Monthly Carbon Savings"
+        constraints = [models.UniqueConstraint(fields=["user", "month"], name="savings_monthly_user_month")]
+
+
+class ForecastRunManager(models.Manager):
+    def current(self):
+        """The run CurrentForecastRun points at, or None before the first run."""
+        return self.filter(current_pointer__isnull=False).first()
+
+
+class ForecastRun(models.Model):
+    # One run of run_inference. Runs are never edited once written; readers
+    # find the current one through CurrentForecastRun.
+    issued_at = models.DateTimeField(db_index=True)
+    model_version = models.CharField(max_length=100)
+    slot_minutes = models.PositiveSmallIntegerField(default=30)
+    # The forecast itself: one packed float32 per slot from `start`.
+    start = models.DateTimeField()
+    intensities = models.BinaryField(default=bytes, editable=False)
+
+    objects = ForecastRunManager()
+
+    @staticmethod
+    def pack(values) -> bytes:
+        return np.asarray(values, dtype=PACKED_DTYPE).tobytes()
+
+    @staticmethod
+    def unpack(packed) -> np.ndarray:
+        """The packed intensities as a read-only float32 array over the same buffer (no copy)."""
+        return np.frombuffer(packed, dtype=PACKED_DTYPE)
+
+    @property
+    def array(self) -> np.ndarray:
+        return self.unpack(self.intensities)
+
+    def as_rows(self) -> list[tuple]:
+        """(timestamp, intensity) per slot, the shape of the old per-slot CarbonPredictions rows."""
+        step = timedelta(minutes=self.slot_minutes)
+        return [(self.start + i * step, float(value)) for i, value in enumerate(self.array)]
+
+    def __str__(self):
+        return f"Forecast run {self.pk} issued at {self.issued_at} ({self.model_version})"
+
+    class Meta:
+        verbose_name_plural = "Forecast Runs"
+
+
+class CurrentForecastRun(models.Model):
+    # Single row (pk=1) pointing at the forecast run readers should use.
+    # run_inference swaps it in the same transaction that writes the new
+    # run, so readers see either the old run or the complete new one.
+    run = models.OneToOneField(ForecastRun, on_delete=models.PROTECT, related_name="current_pointer")
+
+    def __str__(self):
+        return f"Current forecast: run {self.run_id}"
+
+    class Meta:
+        verbose_name_plural = "Current Forecast Run"
+
+
+_PREDICTION_FIELDS = ("timestamp", "carbon_intensity")
+_PREDICTION_LOOKUPS = {
+    "exact": operator.eq,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "in": lambda value, choices: value in choices,
+    "range": lambda value, bounds: bounds[0] <= value <= bounds[1],
+}
+
+
+class CurrentPredictionsQuerySet:
+    """
+    Read-only CarbonPredictions rows of the current forecast run, for code
+    written against the old per-slot table.
+
+    Supports filter/exclude on timestamp and carbon_intensity (exact, gt,
+    gte, lt, lte, in, range), order_by, all, count, exists, first, last,
+    get, values, values_list, slicing and iteration. Rows come from
+    ForecastRun.as_rows() as unsaved CarbonPredictions, read once when the
+    set is first evaluated. values() and values_list() return lists.
+    """
+
+    def __init__(self, model, conditions=(), ordering=("timestamp",)):
+        self.model = model
+        self._conditions = conditions
+        self._ordering = ordering
+        self._result_cache = None
+
+    def _clone(self, conditions=None, ordering=None):
+        return type(self)(self.model, self._conditions if conditions is None else conditions,
+                          self._ordering if ordering is None else ordering)
+
+    def _check_field(self, name: str, what: str):
+        if name not in _PREDICTION_FIELDS:
+            raise FieldError(f"Cannot {what} '{name}' on the current forecast; "
+                             f"use CarbonPredictions.legacy for the old per-slot rows.")
+
+    def _parse(self, kwargs: dict) -> list:
+        parsed = []
+        for key, value in kwargs.items():
+            name, _, lookup = key.partition("__")
+            self._check_field(name, "filter on")
+            if (lookup or "exact") not in _PREDICTION_LOOKUPS:
+                raise FieldError(f"Unsupported lookup '{lookup}' for '{name}' on the current forecast.")
+            field = self.model._meta.get_field(name)
+            if lookup in ("in", "range"):
+                value = [field.to_python(v) for v in value]
+            else:
+                value = field.to_python(value)
+            parsed.append((_PREDICTION_FIELDS.index(name), _PREDICTION_LOOKUPS[lookup or "exact"], value))
+        return parsed
+
+    def all(self):
+        return self._clone()
+
+    def filter(self, **kwargs):
+        return self._clone(conditions=self._conditions + ((False, self._parse(kwargs)),))
+
+    def exclude(self, **kwargs):
+        return self._clone(conditions=self._conditions + ((True, self._parse(kwargs)),))
+
+    def order_by(self, *fields):
+        for field in fields:
+            self._check_field(field.lstrip("-"), "order by")
+        return self._clone(ordering=fields)
+
+    def _fetch(self) -> list:
+        if self._result_cache is None:
+            run = ForecastRun.objects.current()
+            rows = [
+                row for row in (run.as_rows() if run else [])
+                if all(negate != all(op(row[index], value) for index, op, value in parsed)
+                       for negate, parsed in self._conditions)
+            ]
+            # Stable sorts, last key first, give the combined ordering.
+            for field in reversed(self._ordering):
+                index = _PREDICTION_FIELDS.index(field.lstrip("-"))
+                rows.sort(key=lambda row: row[index], reverse=field.startswith("-"))
+            self._result_cache = [
+                self.model(run=run, timestamp=timestamp, carbon_intensity=value) for timestamp, value in rows
+            ]
+        return self._result_cache
+
+    def __iter__(self):
+        return iter(self._fetch())
+
+    def __len__(self):
+        return len(self._fetch())
+
+    def __bool__(self):
+        return bool(self._fetch())
+
+    def __getitem__(self, key):
+        return self._fetch()[key]
+
+    def count(self) -> int:
+        return len(self._fetch())
+
+    def exists(self) -> bool:
+        return bool(self._fetch())
+
+    def first(self):
+        rows = self._fetch()
+        return rows[0] if rows else None
+
+    def last(self):
+        rows = self._fetch()
+        return rows[-1] if rows else None
+
+    def get(self, **kwargs):
+        rows = self.filter(**kwargs)._fetch()
+        if not rows:
+            raise self.model.DoesNotExist("No prediction matches the given query in the current forecast.")
+        if len(rows) > 1:
+            raise self.model.MultipleObjectsReturned(f"get() returned {len(rows)} predictions.")
+        return rows[0]
+
+    def values(self, *fields) -> list[dict]:
+        fields = fields or _PREDICTION_FIELDS
+        for field in fields:
+            self._check_field(field, "select")
+        return [{field: getattr(row, field) for field in fields} for row in self._fetch()]
+
+    def values_list(self, *fields, flat: bool = False) -> list:
+        if flat and len(fields) != 1:
+            raise TypeError("'flat' is not valid when values_list is called with more than one field.")
+        fields = fields or _PREDICTION_FIELDS
+        for field in fields:
+            self._check_field(field, "select")
+        if flat:
+            return [getattr(row, fields[0]) for row in self._fetch()]
+        return [tuple(getattr(row, field) for field in fields) for row in self._fetch()]
+
+
+class CurrentPredictionsDescriptor:
+    # CarbonPredictions.objects: a fresh CurrentPredictionsQuerySet per access.
+    def __get__(self, instance, owner):
+        if instance is not None:
+            raise AttributeError("CarbonPredictions.objects isn't accessible via instances.")
+        return CurrentPredictionsQuerySet(owner)
+
 
 class CarbonPredictions(models.Model):
+    # One row per slot: how forecasts were stored before runs held them
+    # packed (ForecastRun.intensities). No longer written by run_inference;
+    # kept for the rows of older runs and as the baseline of
+    # benchmark_forecast_storage.
+    run = models.ForeignKey(ForecastRun, on_delete=models.CASCADE, related_name="predictions")
     timestamp = models.DateTimeField()
     carbon_intensity = models.FloatField()  # e.g., grams of CO2 per kWh
 
+    # `legacy` (the default manager) reads the old rows. `objects` keeps
+    # per-timestamp readers working by serving the current run's slots
+    # instead of rows nothing writes any more; it is read-only.
+    legacy = models.Manager()
+    objects = CurrentPredictionsDescriptor()
+
     def __str__(self):
         return f"Carbon Intensity at {self.timestamp}: {self.carbon_intensity} gCO2/kWh"
 
     class Meta:
         verbose_name_plural = "Carbon Predictions"
+        indexes = [
+            models.Index(fields=["run", "timestamp"], name="prediction_run_time_idx"),
+        ]
+
+
+
+class CarbonIntensityRecord(models.Model):
+    # Observed national carbon intensity per half hour, synced from the
+    # Carbon Intensity API by the sync_carbon_intensity command.
+    timestamp = models.DateTimeField(unique=True)  # start of the half hour
+    forecast = models.FloatField(null=True, blank=True)
+    actual = models.FloatField(null=True, blank=True)
+    index = models.CharField(max_length=20, blank=True)
+
+    def __str__(self):
+        return f"Carbon Intensity at {self.timestamp}: {self.actual} gCO2/kWh"
+
+    class Meta:
+        verbose_name_plural = "Carbon Intensity Records"
 
 
 
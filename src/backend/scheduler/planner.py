@@ -0,0 +1,247 @@
+"""
+Recurring weekly planner driven by ApplianceProperty.
+
+Each ApplianceProperty says how often a user runs an appliance per week, on
+which days and inside which daily time window. The planner turns all of them
+into concrete events over the current forecast horizon in one pass:
+
+  1. every (property, day in horizon) pair on a preferred day becomes a
+     candidate window, built with array ops across all properties at once;
+  2. the best start of every candidate is found with the scheduling kernel;
+  3. per property and week, the cheapest candidate days are kept, as many as
+     the remaining weekly quota needs on the days the forecast covers.
+
+`plan_recurring_events` (management command) runs it as a periodic job.
+"""
+
+import math
+from datetime import datetime, timedelta, time as dt_time
+from functools import lru_cache
+
+import numpy as np
+
+from .kernel import best_start_slots, cheapest_slot_sets, _prefix_sums, _slots_to_intervals
+
+ALL_DAYS = 0b1111111
+# Set bits per 7-bit day mask.
+_POPCOUNT = np.array([bin(m).count("1") for m in range(ALL_DAYS + 1)], dtype=np.int64)
+
+_DAY_NAMES = {
+    "mon": 0, "monday": 0,
+    "tue": 1, "tues": 1, "tuesday": 1,
+    "wed": 2, "wednesday": 2,
+    "thu": 3, "thur": 3, "thurs": 3, "thursday": 3,
+    "fri": 4, "friday": 4,
+    "sat": 5, "saturday": 5,
+    "sun": 6, "sunday": 6,
+}
+_DAY_GROUPS = {
+    "weekdays": 0b0011111,
+    "weekends": 0b1100000,
+    "weekend": 0b1100000,
+    "daily": ALL_DAYS,
+    "everyday": ALL_DAYS,
+    "all": ALL_DAYS,
+}
+
+
+@lru_cache(maxsize=1024)
+def parse_preferred_days(preferred_days: str) -> int:
+    """
+    Parses ApplianceProperty.preferred_days into a weekday bitmask
+    (bit 0 = Monday, as datetime.weekday()).
+
+    Accepts day names or abbreviations separated by commas or spaces, plus
+    'weekdays', 'weekends' and 'daily'. An empty or unrecognised value means
+    any day.
+    """
+    mask = 0
+    for token in preferred_days.replace(",", " ").replace(";", " ").lower().split():
+        if token in _DAY_NAMES:
+            mask |= 1 << _DAY_NAMES[token]
+        else:
+            mask |= _DAY_GROUPS.get(token, 0)
+    return mask or ALL_DAYS
+
+
+def _minutes_of_day(t: dt_time) -> int:
+    return t.hour * 60 + t.minute
+
+
+def _group_rank(group: np.ndarray, cost: np.ndarray) -> np.ndarray:
+    # Rank of each candidate by cost within its group (0 = cheapest).
+    order = np.lexsort((cost, group))
+    sorted_group = group[order]
+    first = np.r_[0, np.flatnonzero(sorted_group[1:] != sorted_group[:-1]) + 1]
+    group_start = np.repeat(first, np.diff(np.r_[first, len(order)]))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - group_start
+    return rank
+
+
+def plan_week(properties: list[dict], carbon_forecast, forecast_start_time: datetime,
+              existing_events: list[tuple], slot_minutes: int = 30) -> list[dict]:
+    """
+    Plans concrete runs for every property over the forecast horizon.
+
+    Takes in:
+        properties: dicts with 'user_id', 'appliance', 'runtime_min',
+            'frequency_per_week', 'earliest_start_time', 'latest_end_time',
+            'preferred_days', 'preferred_start_time' and 'interruptible'.
+        existing_events: (user_id, appliance, start_time) tuples already
+            scheduled this week, used for the weekly quota and to never plan
+            the same appliance twice on one day.
+
+    Returns:
+        A list of {'user_id', 'appliance', 'start_time', 'runtime_min'}
+        dicts, one per run to create (an interruptible run split over
+        several intervals gives one dict per interval). Contiguous runs also
+        carry 'window_start' and 'window_end'.
+    """
+    total_slots = len(carbon_forecast)
+    if total_slots == 0 or not properties:
+        return []
+
+    forecast_end = forecast_start_time + timedelta(minutes=slot_minutes * total_slots)
+    tz = forecast_start_time.tzinfo
+    first_day = forecast_start_time.date()
+    horizon_days = [first_day + timedelta(days=d) for d in range((forecast_end.date() - first_day).days + 1)]
+
+    n_props = len(properties)
+    mask = np.array([parse_preferred_days(p["preferred_days"] or "") for p in properties], dtype=np.int64)
+    frequency = np.array([p["frequency_per_week"] for p in properties], dtype=np.int64)
+    earliest_min = np.array([_minutes_of_day(p["earliest_start_time"]) for p in properties], dtype=np.int64)
+    latest_min = np.array([_minutes_of_day(p["latest_end_time"]) for p in properties], dtype=np.int64)
+    preferred_min = np.array([_minutes_of_day(p["preferred_start_time"]) for p in properties], dtype=np.int64)
+    runtime = np.array([max(1, math.ceil(p["runtime_min"] / slot_minutes)) for p in properties], dtype=np.int64)
+    interruptible = np.array([bool(p["interruptible"]) for p in properties])
+    # Windows ending at or before they start run past midnight.
+    overnight = latest_min <= earliest_min
+    latest_min = np.where(overnight, latest_min + 24 * 60, latest_min)
+
+    # The horizon spans at most two ISO weeks.
+    week_of_day = [day.isocalendar()[:2] for day in horizon_days]
+    weeks = list(dict.fromkeys(week_of_day))
+    week_ids = {week: w for w, week in enumerate(weeks)}
+    day_ids = {day: d for d, day in enumerate(horizon_days)}
+
+    # Runs already scheduled per (property, week), and (property, day) pairs taken.
+    prop_index = {(p["user_id"], p["appliance"]): i for i, p in enumerate(properties)}
+    done = np.zeros((n_props, len(weeks)), dtype=np.int64)
+    taken = np.zeros((n_props, len(horizon_days)), dtype=bool)
+    seen = set()
+    for event_user, event_appliance, start_time in existing_events:
+        i = prop_index.get((event_user, event_appliance))
+        if i is None:
+            continue
+        local = start_time.astimezone(tz) if tz else start_time
+        day = local.date()
+        # A run in the early hours of an overnight window belongs to the day before.
+        if overnight[i] and local.hour * 60 + local.minute < latest_min[i] - 24 * 60:
+            day -= timedelta(days=1)
+        week = week_ids.get(day.isocalendar()[:2])
+        if week is None or (i, day) in seen:
+            continue
+        seen.add((i, day))
+        done[i, week] += 1
+        if day in day_ids:
+            taken[i, day_ids[day]] = True
+
+    # 1. Candidate windows: one per (property, horizon day) on a preferred day.
+    cand_prop, cand_day, cand_earliest, cand_latest_start, cand_preferred = [], [], [], [], []
+    all_props = np.arange(n_props)
+    for d, day in enumerate(horizon_days):
+        day_offset = (datetime.combine(day, dt_time(0), tzinfo=tz) - forecast_start_time).total_seconds() / 60
+        on_day = (mask >> day.weekday()) & 1 == 1
+        earliest = np.ceil((day_offset + earliest_min) / slot_minutes).astype(np.int64)
+        end = np.floor((day_offset + latest_min) / slot_minutes).astype(np.int64)
+        earliest = np.clip(earliest, 0, total_slots)
+        end = np.clip(end, 0, total_slots)
+        latest_start = end - runtime
+        preferred = np.round((day_offset + preferred_min) / slot_minutes).astype(np.int64)
+
+        keep = on_day & (latest_start >= earliest) & ~taken[:, d]
+        cand_prop.append(all_props[keep])
+        cand_day.append(np.full(keep.sum(), d))
+        cand_earliest.append(earliest[keep])
+        cand_latest_start.append(latest_start[keep])
+        cand_preferred.append(preferred[keep])
+
+    cand_prop = np.concatenate(cand_prop)
+    if cand_prop.size == 0:
+        return []
+    cand_day = np.concatenate(cand_day)
+    cand_earliest = np.concatenate(cand_earliest)
+    cand_latest_start = np.concatenate(cand_latest_start)
+    cand_preferred = np.concatenate(cand_preferred)
+    cand_runtime = runtime[cand_prop]
+    cand_split = interruptible[cand_prop]
+
+    # 2. Best start (or slot set) for every candidate.
+    cand_start = np.full(cand_prop.size, -1, dtype=np.int64)
+    cand_cost = np.empty(cand_prop.size, dtype=np.float64)
+    cand_slots = [None] * cand_prop.size
+
+    contiguous = np.flatnonzero(~cand_split)
+    starts, costs = best_start_slots(
+        carbon_forecast, cand_earliest[contiguous], cand_latest_start[contiguous], cand_runtime[contiguous]
+    )
+    # On a tie with the cheapest window, honour the user's preferred start time.
+    prefix = _prefix_sums(carbon_forecast)
+    pref = cand_preferred[contiguous]
+    pref_ok = (pref >= cand_earliest[contiguous]) & (pref <= cand_latest_start[contiguous])
+    pref_clipped = np.clip(pref, 0, total_slots - cand_runtime[contiguous])
+    pref_cost = prefix[pref_clipped + cand_runtime[contiguous]] - prefix[pref_clipped]
+    use_pref = pref_ok & (pref_cost <= costs + 1e-9)
+    cand_start[contiguous] = np.where(use_pref, pref_clipped, starts)
+    cand_cost[contiguous] = np.where(use_pref, pref_cost, costs)
+
+    split = np.flatnonzero(cand_split)
+    if split.size:
+        slot_sets, costs = cheapest_slot_sets(
+            carbon_forecast, cand_earliest[split], cand_latest_start[split] + cand_runtime[split], cand_runtime[split]
+        )
+        cand_cost[split] = costs
+        for i, slots in zip(split.tolist(), slot_sets):
+            cand_slots[i] = slots
+
+    # 3. Per (property, ISO week), keep the cheapest days the quota calls for.
+    # The quota left this week is spread evenly over the preferred days left
+    # in it, and the horizon gets its share of those days.
+    cand_week = np.array([week_ids[week] for week in week_of_day], dtype=np.int64)[cand_day]
+    group = cand_prop * len(weeks) + cand_week
+    rank = _group_rank(group, cand_cost)
+
+    group_ids, group_inverse, in_horizon = np.unique(group, return_inverse=True, return_counts=True)
+    g_prop, g_week = np.divmod(group_ids, len(weeks))
+    remaining = frequency[g_prop] - done[g_prop, g_week]
+    first_weekday = np.array([horizon_days[week_of_day.index(week)].weekday() for week in weeks], dtype=np.int64)
+    days_left = _POPCOUNT[mask[g_prop] >> first_weekday[g_week]]
+    quota = np.ceil(np.maximum(remaining, 0) * in_horizon / np.maximum(days_left, in_horizon)).astype(np.int64)
+    quota = np.minimum(quota, in_horizon)
+
+    chosen = rank < quota[group_inverse.reshape(-1)]
+
+    plan = []
+    slot_delta = timedelta(minutes=slot_minutes)
+    for c in np.flatnonzero(chosen).tolist():
+        prop = properties[cand_prop[c]]
+        if cand_slots[c] is None:
+            # Contiguous runs keep their window so they can be rescheduled.
+            plan.append({
+                "user_id": prop["user_id"],
+                "appliance": prop["appliance"],
+                "start_time": forecast_start_time + int(cand_start[c]) * slot_delta,
+                "runtime_min": int(prop["runtime_min"]),
+                "window_start": forecast_start_time + int(cand_earliest[c]) * slot_delta,
+                "window_end": forecast_start_time + int(cand_latest_start[c] + cand_runtime[c]) * slot_delta,
+            })
+            continue
+        for start, stop in _slots_to_intervals(cand_slots[c]):
+            plan.append({
+                "user_id": prop["user_id"],
+                "appliance": prop["appliance"],
+                "start_time": forecast_start_time + start * slot_delta,
+                "runtime_min": (stop - start) * slot_minutes,
+            })
+    return plan
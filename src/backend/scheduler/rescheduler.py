@@ -0,0 +1,173 @@
+"""
+Incremental rescheduling of future events when a new forecast lands.
+
+Events are scheduled against whatever forecast was current at the time.
+After run_inference writes a new one, this stage re-checks every future,
+not-yet-started event that still has its scheduling window, finds its best
+start under the new forecast with the batch kernel, and moves only the events
+whose new best start is strictly cheaper than where they currently sit.
+"""
+
+import itertools
+import math
+from datetime import datetime, timezone
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F
+
+from .models import EventInstance
+from .kernel import _prefix_sums, best_start_slots
+from .savings import add_to_rollups
+
+READ_CHUNK_SIZE = 20_000
+UPDATE_BATCH_SIZE = 1_000
+
+# Moves that save less than this (summed gCO2/kWh over the run) aren't worth the churn.
+MIN_IMPROVEMENT = 1e-6
+
+
+def _epoch_seconds(values) -> np.ndarray:
+    return np.fromiter((v.timestamp() for v in values), dtype=np.float64, count=len(values))
+
+
+def _read_future_events(queryset):
+    """
+    The rescheduler's columns as arrays: id, user_id, start, window start and
+    end (epoch seconds), runtime_min, carbon_cost_g and baseline_cost_g (NaN
+    if unset). Rows are converted one READ_CHUNK_SIZE chunk at a time, so a
+    million events never sit in memory as Python tuples. None if no rows.
+    """
+    chunks = []
+    rows = queryset.values_list(
+        "id", "user_id", "start_time", "window_start", "window_end", "runtime_min", "carbon_cost_g", "baseline_cost_g"
+    ).iterator(chunk_size=READ_CHUNK_SIZE)
+    while chunk := list(itertools.islice(rows, READ_CHUNK_SIZE)):
+        ids, user_ids, start_times, window_starts, window_ends, runtime_min, carbon_cost_g, baseline_cost_g = zip(*chunk)
+        n = len(ids)
+        chunks.append((
+            np.fromiter(ids, dtype=np.int64, count=n),
+            np.fromiter(user_ids, dtype=np.int64, count=n),
+            _epoch_seconds(start_times),
+            _epoch_seconds(window_starts),
+            _epoch_seconds(window_ends),
+            np.fromiter(runtime_min, dtype=np.float64, count=n),
+            np.array([np.nan if cost is None else cost for cost in carbon_cost_g], dtype=np.float64),
+            np.array([np.nan if cost is None else cost for cost in baseline_cost_g], dtype=np.float64),
+        ))
+    if not chunks:
+        return None
+    return [np.concatenate(column) for column in zip(*chunks)]
+
+
+def reschedule_future_events(carbon_forecast, forecast_start_time: datetime, now: datetime = None,
+                             slot_minutes: int = 30, forecast_version: str = None, dry_run: bool = False) -> dict:
+    """
+    Moves future events to their best start under a new forecast.
+
+    Only events that start after `now`, have a stored window and whose
+    current run lies inside the forecast are considered.
+
+    Returns:
+        dict with 'checked' (events considered), 'moved' (events updated) and
+        'carbon_delta_g' (change in gCO2 of the moved events that have a
+        carbon_cost_g; negative is a saving).
+    """
+    now = now or datetime.now(timezone.utc)
+    total_slots = len(carbon_forecast)
+    report = {"checked": 0, "moved": 0, "carbon_delta_g": 0.0}
+    if total_slots == 0:
+        return report
+
+    slot_s = slot_minutes * 60
+    forecast_start_s = forecast_start_time.timestamp()
+    forecast_end = forecast_start_s + total_slots * slot_s
+
+    columns = _read_future_events(EventInstance.objects.filter(
+        start_time__gt=now,
+        start_time__gte=forecast_start_time,
+        # A run starting past the forecast can't be priced under it.
+        start_time__lt=datetime.fromtimestamp(forecast_end, tz=timezone.utc),
+        window_start__isnull=False,
+        window_end__isnull=False,
+        runtime_min__isnull=False,
+    ))
+    if columns is None:
+        return report
+    ids, user_ids, start_s, window_start_s, window_end_s, runtime, carbon_cost_g, baseline_cost_g = columns
+    runtime = np.maximum(np.ceil(runtime / slot_minutes).astype(np.int64), 1)
+
+    # Slot arithmetic relative to the new forecast, all at once.
+    not_before = max(0, math.ceil((now.timestamp() - forecast_start_s) / slot_s))
+    current = np.round((start_s - forecast_start_s) / slot_s).astype(np.int64)
+    earliest = np.maximum(np.ceil((window_start_s - forecast_start_s) / slot_s).astype(np.int64), not_before)
+    end = np.minimum(np.floor((np.minimum(window_end_s, forecast_end) - forecast_start_s) / slot_s).astype(np.int64),
+                     total_slots)
+    latest_start = end - runtime
+
+    candidate = (latest_start >= earliest) & (current >= 0) & (current + runtime <= total_slots)
+    report["checked"] = int(candidate.sum())
+    if not report["checked"]:
+        return report
+
+    ids = ids[candidate]
+    current = current[candidate]
+    runtime = runtime[candidate]
+    carbon_cost_g = carbon_cost_g[candidate]
+    baseline_cost_g = baseline_cost_g[candidate]
+    user_ids = user_ids[candidate]
+    start_s = start_s[candidate]
+    best, best_cost = best_start_slots(
+        carbon_forecast, earliest[candidate], latest_start[candidate], runtime, forecast_version
+    )
+
+    prefix = _prefix_sums(carbon_forecast)
+    current_cost = prefix[current + runtime] - prefix[current]
+    moved = (best != current) & (best_cost < current_cost - MIN_IMPROVEMENT)
+
+    report["moved"] = int(moved.sum())
+    with np.errstate(divide="ignore", invalid="ignore"):
+        new_cost_g = carbon_cost_g[moved] * best_cost[moved] / current_cost[moved]
+    costed = np.isfinite(new_cost_g)
+    report["carbon_delta_g"] = float((new_cost_g[costed] - carbon_cost_g[moved][costed]).sum())
+    if dry_run or not report["moved"]:
+        return report
+
+    moved_ids = ids[moved]
+    moved_best = best[moved]
+
+    # Each move with both costs leaves the savings rollup of its old day and joins its new one.
+    in_rollups = costed & ~np.isnan(baseline_cost_g[moved])
+    rollup_moves = []
+    for user_id, old_s, new_slot, old_cost, new_cost, baseline in zip(
+            user_ids[moved][in_rollups].tolist(), start_s[moved][in_rollups].tolist(),
+            moved_best[in_rollups].tolist(), carbon_cost_g[moved][in_rollups].tolist(),
+            new_cost_g[in_rollups].tolist(), baseline_cost_g[moved][in_rollups].tolist()):
+        new_start = datetime.fromtimestamp(forecast_start_s + new_slot * slot_s, tz=timezone.utc)
+        rollup_moves.append((user_id, datetime.fromtimestamp(old_s, tz=timezone.utc), old_cost, baseline, -1))
+        rollup_moves.append((user_id, new_start, new_cost, baseline, 1))
+
+    # Moves from the same slot to the same slot with the same runtime share
+    # one cost ratio, so each such group is one
+    # UPDATE ... SET start_time = %s, carbon_cost_g = carbon_cost_g * %s WHERE id IN (...)
+    # instead of a CASE per row; new starts are forecast slots, so there are
+    # at most a few thousand groups however many events move.
+    keys = np.stack([moved_best, current[moved], runtime[moved]])
+    groups, group_of = np.unique(keys, axis=1, return_inverse=True)
+    group_of = group_of.ravel()
+    order = np.argsort(group_of, kind="stable")
+    bounds = np.searchsorted(group_of[order], np.arange(1, groups.shape[1]))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = best_cost[moved][order][np.r_[0, bounds]] / current_cost[moved][order][np.r_[0, bounds]]
+    with transaction.atomic():
+        for (slot, _, _), ratio, group in zip(groups.T.tolist(), ratios.tolist(), np.split(moved_ids[order], bounds)):
+            fields = {"start_time": datetime.fromtimestamp(forecast_start_s + slot * slot_s, tz=timezone.utc)}
+            if math.isfinite(ratio):
+                # Same appliance and runtime, so the stored gCO2 scales with the summed intensity.
+                fields["carbon_cost_g"] = F("carbon_cost_g") * ratio
+            group = group.tolist()
+            for i in range(0, len(group), UPDATE_BATCH_SIZE):
+                EventInstance.objects.filter(id__in=group[i:i + UPDATE_BATCH_SIZE]).update(**fields)
+        add_to_rollups(rollup_moves)
+
+    return report
@@ -0,0 +1,172 @@
+"""
+Per-user carbon savings rollups (CarbonSavingsDaily, CarbonSavingsMonthly).
+
+An event saves baseline_cost_g - carbon_cost_g: what its run would have cost
+starting as early as it was allowed to, minus what it costs where it was
+scheduled. The rollups hold the sums of both per user per day and per month,
+so a dashboard reads a handful of rows however many events there are:
+  - record_events adds newly scheduled events with one upsert per table, in
+    the transaction that saves them; the rescheduler records a move as the
+    event leaving its old day and joining its new one (add_to_rollups);
+  - reconcile_rollups rebuilds days from the events themselves, fixing any
+    drift (the reconcile_savings command, nightly).
+
+Only events with both costs count. Days are in settings.TIME_ZONE.
+"""
+
+import math
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import CarbonSavingsDaily, CarbonSavingsMonthly, EventInstance, EventInstanceArchive
+
+ROLLUPS = ((CarbonSavingsDaily, "day"), (CarbonSavingsMonthly, "month"))
+
+
+def baseline_cost_g(forecast, earliest_start: datetime, runtime_min: float, power_kw: float):
+    """
+    gCO2 of running from the first slot at or after `earliest_start` (the
+    forecast start if earlier), as the schedulers do. None if that run
+    doesn't fit in the forecast.
+    """
+    slot = math.ceil((earliest_start - forecast.start) / timedelta(minutes=forecast.slot_minutes))
+    start = forecast.start + max(slot, 0) * timedelta(minutes=forecast.slot_minutes)
+    return forecast.carbon_g(start, runtime_min, power_kw)
+
+
+def _month(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _upsert_sql(model, period: str) -> str:
+    table = connection.ops.quote_name(model._meta.db_table)
+    # ON CONFLICT ... DO UPDATE is understood by both PostgreSQL and SQLite.
+    return (
+        f"INSERT INTO {table} (user_id, {period}, events, carbon_g, baseline_g) VALUES (%s, %s, %s, %s, %s) "
+        f"ON CONFLICT (user_id, {period}) DO UPDATE SET "
+        f"events = {table}.events + excluded.events, "
+        f"carbon_g = {table}.carbon_g + excluded.carbon_g, "
+        f"baseline_g = {table}.baseline_g + excluded.baseline_g"
+    )
+
+
+def add_to_rollups(rows):
+    """
+    Adds (user_id, start_time, carbon_g, baseline_g, count) rows to the
+    rollups of their day and month; a negative count with the same costs
+    takes an event back out. Rows missing either cost are skipped.
+    """
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    days = {}  # starts are mostly forecast slots, so only a handful are distinct
+    for user_id, start_time, carbon_g, baseline_g, count in rows:
+        if carbon_g is None or baseline_g is None:
+            continue
+        day = days.get(start_time)
+        if day is None:
+            day = days[start_time] = timezone.localdate(start_time)
+        total = totals[user_id, day]
+        total[0] += count
+        total[1] += count * carbon_g
+        total[2] += count * baseline_g
+    if not totals:
+        return
+
+    months = defaultdict(lambda: [0, 0.0, 0.0])
+    for (user_id, day), total in totals.items():
+        month = months[user_id, _month(day)]
+        for i, value in enumerate(total):
+            month[i] += value
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for (model, period), by_period in zip(ROLLUPS, (totals, months)):
+            cursor.executemany(_upsert_sql(model, period), [
+                (user_id, when, *total) for (user_id, when), total in by_period.items()
+            ])
+
+
+def record_events(events):
+    """Adds saved EventInstances to the rollups."""
+    add_to_rollups((e.user_id, e.start_time, e.carbon_cost_g, e.baseline_cost_g, 1) for e in events)
+
+
+def reconcile_rollups(first_day: date, last_day: date) -> dict:
+    """
+    Rebuilds the daily rollups of [first_day, last_day] from the events
+    (live and archived), and the monthly rollups of the months those days
+    fall in from the daily ones.
+
+    Returns:
+        dict with the 'days' rebuilt, the daily 'rows' written and 'drift_g',
+        how far the stored savings over those days were off.
+    """
+    tz = timezone.get_current_timezone()
+    start = datetime.combine(first_day, datetime.min.time(), tzinfo=tz)
+    end = datetime.combine(last_day + timedelta(days=1), datetime.min.time(), tzinfo=tz)
+    costed = Q(start_time__gte=start, start_time__lt=end, carbon_cost_g__isnull=False, baseline_cost_g__isnull=False)
+
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    for model in (EventInstanceArchive, EventInstance):
+        for row in (model.objects.filter(costed).annotate(day=TruncDate("start_time", tzinfo=tz))
+                    .values("user_id", "day")
+                    .annotate(events=Count("id"), carbon_g=Sum("carbon_cost_g"), baseline_g=Sum("baseline_cost_g"))):
+            total = totals[row["user_id"], row["day"]]
+            total[0] += row["events"]
+            total[1] += row["carbon_g"]
+            total[2] += row["baseline_g"]
+
+    with transaction.atomic():
+        days = CarbonSavingsDaily.objects.filter(day__gte=first_day, day__lte=last_day)
+        stored = days.aggregate(carbon_g=Sum("carbon_g"), baseline_g=Sum("baseline_g"))
+        days.delete()
+        CarbonSavingsDaily.objects.bulk_create([
+            CarbonSavingsDaily(user_id=user_id, day=day, events=events, carbon_g=carbon_g, baseline_g=baseline_g)
+            for (user_id, day), (events, carbon_g, baseline_g) in totals.items()
+        ], batch_size=2000)
+
+        first_month, last_month = _month(first_day), _month(last_day)
+        CarbonSavingsMonthly.objects.filter(month__gte=first_month, month__lte=last_month).delete()
+        month_end = (last_month + timedelta(days=31)).replace(day=1)
+        CarbonSavingsMonthly.objects.bulk_create([
+            CarbonSavingsMonthly(month=row.pop("month"), **row)
+            for row in CarbonSavingsDaily.objects.filter(day__gte=first_month, day__lt=month_end)
+            .values("user_id", month=TruncMonth("day"))
+            .annotate(events=Sum("events"), carbon_g=Sum("carbon_g"), baseline_g=Sum("baseline_g"))
+        ], batch_size=2000)
+
+    stored_saved = (stored["baseline_g"] or 0.0) - (stored["carbon_g"] or 0.0)
+    saved = sum(baseline_g - carbon_g for _, carbon_g, baseline_g in totals.values())
+    return {"days": (last_day - first_day).days + 1, "rows": len(totals), "drift_g": stored_saved - saved}
+
+
+def summary(user_id: int, first_day: date, last_day: date, monthly: bool = False) -> dict:
+    """
+    Savings of [first_day, last_day] from the rollups alone, with one entry
+    per day (or per month with `monthly`, where first_day should be the
+    first of a month).
+    """
+    model, period = ROLLUPS[1] if monthly else ROLLUPS[0]
+    rows = list(
+        model.objects.filter(user_id=user_id, **{f"{period}__gte": first_day, f"{period}__lte": last_day})
+        .order_by(period).values(period, "events", "carbon_g", "baseline_g")
+    )
+    entries = [
+        {period: row[period], "events": row["events"], "carbon_g": row["carbon_g"],
+         "saved_g": row["baseline_g"] - row["carbon_g"]}
+        for row in rows
+    ]
+    carbon_g = sum((row["carbon_g"] for row in rows), 0.0)
+    baseline_g = sum((row["baseline_g"] for row in rows), 0.0)
+    return {
+        "from": first_day,
+        "to": last_day,
+        "events": sum(row["events"] for row in rows),
+        "carbon_g": carbon_g,
+        "baseline_g": baseline_g,
+        "saved_g": baseline_g - carbon_g,
+        "months" if monthly else "days": entries,
+    }
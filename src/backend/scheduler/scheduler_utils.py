@@ -4,107 +4,411 @@ import json
 from datetime import datetime, timedelta
 import numpy as np  # <-- Added this import
 
-def _datetime_to_slot_index(dt: datetime, forecast_start: datetime) -> int:
+from .diagnostics import Status, JobResult, record
+from .kernel import solve_slots, _prefix_sums, _slots_to_intervals
+
+# Width of one forecast slot unless the forecast says otherwise.
+DEFAULT_SLOT_MINUTES = 30
+# Power draw of an appliance sent without one and not in the catalogue.
+DEFAULT_POWER_KW = 1.0
+
+
+def parse_power_kw(value):
     """
-    Converts an absolute datetime into a relative 30-minute slot index.
+    A client-supplied power draw as float kW: None stays None (unknown),
+    0 is a valid draw. Raises ValueError for anything that isn't a finite,
+    non-negative number (booleans included).
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"power_kw must be a number, not {value!r}.")
+    try:
+        power = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"power_kw must be a number, not {value!r}.") from None
+    if not np.isfinite(power) or power < 0:
+        raise ValueError(f"power_kw must be a non-negative number, not {value!r}.")
+    return power
+
+
+def appliance_power_kw(appliance: dict) -> float:
+    """An appliance's draw in kW; DEFAULT_POWER_KW if it has none. Raises ValueError if invalid."""
+    power = parse_power_kw(appliance.get('power_kw'))
+    return DEFAULT_POWER_KW if power is None else power
+
+
+def forecast_slot_minutes(timestamps) -> int:
+    """
+    Returns the slot width in minutes of a forecast from the spacing of its
+    first two timestamps (DEFAULT_SLOT_MINUTES for shorter forecasts).
+    """
+    if len(timestamps) < 2:
+        return DEFAULT_SLOT_MINUTES
+    minutes = int(round((timestamps[1] - timestamps[0]).total_seconds() / 60))
+    if minutes <= 0:
+        raise ValueError("Forecast timestamps must be increasing.")
+    return minutes
+
+def _datetime_to_slot_index(dt: datetime, forecast_start: datetime, slot_minutes: int = DEFAULT_SLOT_MINUTES) -> int:
+    """
+    Converts an absolute datetime into a relative slot index.
     Rounds to the nearest slot to handle user input that isn't exact.
+    Times before the forecast start are clamped to slot 0 (reported as
+    Status.CLAMPED by _validate_job).
     """
     delta = dt - forecast_start
     total_minutes = delta.total_seconds() / 60
 
     # --- CHANGED: Round to nearest slot instead of raising an error ---
-    slot_index = int(round(total_minutes / 30.0))
-    
-    if slot_index < 0:
-         print(f"Warning: Time {dt} is before forecast start {forecast_start}. Clamping to slot 0.")
-         return 0
-         
-    return slot_index
+    slot_index = int(round(total_minutes / slot_minutes))
+    return max(slot_index, 0)
 
-def _slot_index_to_datetime(slot_index: int, forecast_start: datetime) -> datetime:
-    # Converts a 30-minute slot index back to an absolute datetime.
+def _slot_index_to_datetime(slot_index: int, forecast_start: datetime,
+                            slot_minutes: int = DEFAULT_SLOT_MINUTES) -> datetime:
+    # Converts a slot index back to an absolute datetime.
     if slot_index < 0:
         raise ValueError("Slot index cannot be negative.")
         
-    minutes_from_start = slot_index * 30
+    minutes_from_start = slot_index * slot_minutes
     return forecast_start + timedelta(minutes=minutes_from_start)
 
-def _minutes_to_slots(minutes: int) -> int:
+def _minutes_to_slots(minutes: int, slot_minutes: int = DEFAULT_SLOT_MINUTES) -> int:
     """
-    Converts a runtime in minutes to the number of 30-minute slots.
+    Converts a runtime in minutes to a number of slots.
     Rounds UP to the nearest slot.
     """
     if minutes <= 0:
         raise ValueError("Runtime must be a positive number of minutes.")
     
     # --- CHANGED: Round up to ensure the full runtime is met ---
-    slots = int(np.ceil(minutes / 30.0))
+    slots = int(np.ceil(minutes / slot_minutes))
     if slots == 0:
         slots = 1 # Minimum 1 slot
     return slots
 
-def scheduler(appliances: list[dict], carbon_forecast: list[float], forecast_start_time: datetime) -> dict:
+# --- Validation on top of the kernel ---
+#
+# The search itself lives in kernel.py and works on slot indices. The
+# functions below turn appliance dicts into slot arrays, in one of two modes:
+#   ROUND  - times are rounded to the nearest slot, runtimes up to whole slots;
+#   STRICT - times must sit on slot boundaries and runtimes be whole slots,
+#            anything else makes the appliance unschedulable.
+# Either way an appliance that can't be scheduled comes back as None, with a
+# diagnostics.Status saying why.
+
+def _strict_datetime_to_slot_index(dt: datetime, forecast_start: datetime,
+                                   slot_minutes: int = DEFAULT_SLOT_MINUTES) -> int:
+    # Like _datetime_to_slot_index, but the time must be on a slot boundary.
+    total_minutes = (dt - forecast_start).total_seconds() / 60
+    if total_minutes % slot_minutes != 0:
+        raise ValueError(f"Time {dt} is not on a {slot_minutes}-minute boundary relative to start {forecast_start}.")
+    return _datetime_to_slot_index(dt, forecast_start, slot_minutes)
+
+def _strict_minutes_to_slots(minutes: int, slot_minutes: int = DEFAULT_SLOT_MINUTES) -> int:
+    # Like _minutes_to_slots, but the runtime must be a whole number of slots.
+    if minutes <= 0 or minutes % slot_minutes != 0:
+        raise ValueError(f"Runtime must be a positive multiple of {slot_minutes} minutes.")
+    return minutes // slot_minutes
+
+ROUND = "round"
+STRICT = "strict"
+VALIDATION_MODES = (ROUND, STRICT)
+
+_CONVERTERS = {
+    ROUND: (_datetime_to_slot_index, _minutes_to_slots),
+    STRICT: (_strict_datetime_to_slot_index, _strict_minutes_to_slots),
+}
+
+def scheduler(appliances: list[dict], carbon_forecast: list[float], forecast_start_time: datetime,
+              slot_minutes: int = DEFAULT_SLOT_MINUTES) -> dict:
     """
     Schedules appliances over a forecast window.
-    (This is your function, pasted directly)
+
+    Times are rounded to the nearest slot and runtimes up to whole slots.
+    `slot_minutes` is the width of each forecast value. Same as
+    batch_scheduler in ROUND mode.
+    """
+    return batch_scheduler(appliances, carbon_forecast, forecast_start_time, slot_minutes=slot_minutes)
+
+
+def _format_intervals(slots, forecast_start_time: datetime, slot_iso: dict,
+                      slot_minutes: int = DEFAULT_SLOT_MINUTES) -> list[list[str]]:
+    # Interruptible results are a list of [start, stop] ISO pairs.
+    formatted = []
+    for start, stop in _slots_to_intervals(slots):
+        for slot in (start, stop):
+            if slot not in slot_iso:
+                slot_iso[slot] = _slot_index_to_datetime(slot, forecast_start_time, slot_minutes).isoformat()
+        formatted.append([slot_iso[start], slot_iso[stop]])
+    return formatted
+
+
+def _time_slot(iso: str, forecast_start_time: datetime, cache: dict, to_slot, slot_minutes: int):
+    # Returns (slot, before_start) for an ISO time, or the Status it fails with.
+    try:
+        hit = cache.get(iso)
+    except TypeError:
+        return Status.INVALID_TIME
+    if hit is not None:
+        return hit
+    try:
+        dt = datetime.fromisoformat(iso)
+        before_start = dt < forecast_start_time
+    except (TypeError, ValueError):
+        return Status.INVALID_TIME
+    try:
+        slot = to_slot(dt, forecast_start_time, slot_minutes)
+    except ValueError:
+        return Status.OFF_SLOT_BOUNDARY
+    cache[iso] = hit = (slot, before_start)
+    return hit
+
+
+def _validate_job(appliance: dict, forecast_start_time: datetime, total_slots: int, cache: dict,
+                  slot_minutes: int = DEFAULT_SLOT_MINUTES, mode: str = ROUND):
+    """
+    Validates one appliance under the given validation mode.
+    Returns (status, slots): slots is (earliest_start_slot, latest_start_slot,
+    runtime_slots), or None if the appliance cannot be scheduled, in which
+    case status says why.
+
+    `cache` memoises slot conversions across a batch, since large batches reuse
+    the same handful of ISO times and runtimes. It must only be shared
+    between calls with the same forecast start, `slot_minutes` and mode.
+    """
+    to_slot, to_runtime = _CONVERTERS[mode]
+    earliest_iso = appliance.get('earliest_start')
+    latest_iso = appliance.get('latest_end')
+    runtime_min = appliance.get('runtime_min')
+    if earliest_iso is None or latest_iso is None or runtime_min is None:
+        return Status.MISSING_FIELD, None
+
+    earliest = _time_slot(earliest_iso, forecast_start_time, cache, to_slot, slot_minutes)
+    if isinstance(earliest, Status):
+        return earliest, None
+    latest_end = _time_slot(latest_iso, forecast_start_time, cache, to_slot, slot_minutes)
+    if isinstance(latest_end, Status):
+        return latest_end, None
+
+    key = ('runtime', runtime_min)
+    try:
+        runtime_slots = cache.get(key)
+        if runtime_slots is None:
+            runtime_slots = cache[key] = to_runtime(runtime_min, slot_minutes)
+    except (TypeError, ValueError):
+        return Status.INVALID_RUNTIME, None
+
+    (earliest_start_slot, clamped), (latest_end_slot_index, ends_before_start) = earliest, latest_end
+    if ends_before_start:
+        return Status.BEFORE_FORECAST, None
+    latest_start_slot = latest_end_slot_index - runtime_slots
+    if latest_start_slot < earliest_start_slot:
+        return Status.WINDOW_TOO_SHORT, None
+    if latest_start_slot + runtime_slots > total_slots:
+        return Status.BEYOND_HORIZON, None
+
+    return (Status.CLAMPED if clamped else Status.OK), (earliest_start_slot, latest_start_slot, runtime_slots)
+
+
+def _job_slots(appliance: dict, forecast_start_time: datetime, total_slots: int, cache: dict,
+               slot_minutes: int = DEFAULT_SLOT_MINUTES, mode: str = ROUND):
+    # _validate_job without the status: the slot triple, or None.
+    return _validate_job(appliance, forecast_start_time, total_slots, cache, slot_minutes, mode)[1]
+
+
+def _collect_jobs(appliances: list[dict], forecast_start_time: datetime, total_slots: int,
+                  cache: dict, batch: tuple[list, list, list],
+                  slot_minutes: int = DEFAULT_SLOT_MINUTES, mode: str = ROUND) -> list[tuple[str, int, Status]]:
+    """
+    Validates a list of appliances and appends the feasible ones to `batch`
+    (earliest, latest_start, runtime and interruptible columns).
+
+    Returns (name, position in batch, status) per appliance, with position -1
+    for unschedulable ones. Nothing is appended if the list itself is
+    malformed (not a list of dicts with a 'name'); that raises KeyError,
+    TypeError or AttributeError.
     """
+    entries = []
+    columns = ([], [], [], [])
+    offset = len(batch[0])
 
-    # We get the total number of slots from the forecast itself
+    for appliance in appliances:
+        name = appliance['name']
+        status, slots = _validate_job(appliance, forecast_start_time, total_slots, cache, slot_minutes, mode)
+        if slots is None:
+            entries.append((name, -1, status))
+            continue
+        entries.append((name, offset + len(columns[0]), status))
+        for column, value in zip(columns, (*slots, bool(appliance.get('interruptible')))):
+            column.append(value)
+
+    for column, values in zip(batch, columns):
+        column.extend(values)
+    return entries
+
+
+# Household lists that _collect_jobs rejects as a whole.
+MALFORMED_APPLIANCE_LIST = (KeyError, TypeError, AttributeError)
+
+
+def _solve_batch(carbon_forecast, batch: tuple[list, list, list, list], forecast_version: str = None) -> list:
+    """
+    Runs the kernel over a job batch built by `_collect_jobs`.
+    Returns the start slot of each contiguous job and the sorted slot set of
+    each interruptible one, in batch order.
+    """
+    return solve_slots(carbon_forecast, *batch, forecast_version=forecast_version)
+
+
+def _format_schedule(entries: list[tuple[str, int, Status]], results: list, forecast_start_time: datetime,
+                     slot_iso: dict, slot_minutes: int = DEFAULT_SLOT_MINUTES, reasons: dict = None) -> dict:
+    # Every start is a forecast slot, so each slot is formatted at most once.
+    # A negative slot means the job was not placed; a slot set means it was split.
+    # Identical interruptible queries share one slot-set array, so their
+    # intervals are formatted once too (keyed by the array's identity).
+    # Unplaced jobs get their Status in `reasons` (if given); every non-OK
+    # status is counted in diagnostics.metrics.
+    optimal_schedule = {}
+    diagnosed = []
+    for name, index, status in entries:
+        slot = results[index] if index >= 0 else -1
+        if not isinstance(slot, int):
+            key = ('intervals', id(slot))
+            if key not in slot_iso:
+                slot_iso[key] = _format_intervals(slot, forecast_start_time, slot_iso, slot_minutes)
+            optimal_schedule[name] = slot_iso[key]
+        elif slot < 0:
+            # Valid jobs only go unplaced when the household solver can't fit them.
+            if status.scheduled:
+                status = Status.OVER_POWER_CAP
+            optimal_schedule[name] = None
+            if reasons is not None:
+                reasons[name] = status
+        else:
+            if slot not in slot_iso:
+                slot_iso[slot] = _slot_index_to_datetime(slot, forecast_start_time, slot_minutes).isoformat()
+            optimal_schedule[name] = slot_iso[slot]
+        if status:
+            diagnosed.append(status)
+    if diagnosed:
+        record(diagnosed)
+    return optimal_schedule
+
+
+def _check_inputs(carbon_forecast, mode: str = ROUND) -> int:
     total_slots = len(carbon_forecast)
     if total_slots == 0:
         raise ValueError("Carbon forecast is empty.")
-        
-    optimal_schedule = {}
+    if mode not in VALIDATION_MODES:
+        raise ValueError(f"Unknown validation mode {mode!r}.")
+    return total_slots
 
-    for appliance in appliances:
-        appliance_name = appliance['name']
-        
+
+def batch_scheduler(appliances: list[dict], carbon_forecast: list[float], forecast_start_time: datetime,
+                    forecast_version: str = None, slot_minutes: int = DEFAULT_SLOT_MINUTES,
+                    mode: str = ROUND, reasons: dict = None) -> dict:
+    """
+    Schedules a list of appliances in one pass of the kernel.
+
+    Returns a name -> ISO start mapping; interruptible appliances get a list
+    of [start, stop] ISO pairs, and appliances that can't be scheduled under
+    `mode` (ROUND or STRICT) get None. If `reasons` is given it is filled
+    with name -> diagnostics.Status for each of those.
+    """
+    total_slots = _check_inputs(carbon_forecast, mode)
+
+    batch = ([], [], [], [])
+    entries = _collect_jobs(appliances, forecast_start_time, total_slots, {}, batch, slot_minutes, mode)
+
+    results = _solve_batch(carbon_forecast, batch, forecast_version)
+    return _format_schedule(entries, results, forecast_start_time, {}, slot_minutes, reasons)
+
+
+def schedule_results(appliances: list[dict], carbon_forecast: list[float], forecast_start_time: datetime,
+                     forecast_version: str = None, slot_minutes: int = DEFAULT_SLOT_MINUTES,
+                     mode: str = ROUND) -> dict:
+    """
+    Same search as batch_scheduler, returned as slot-level records.
+
+    Returns:
+        name -> diagnostics.JobResult with the start slot (-1 if not
+        scheduled), the forecast cost of the slots used, the slot array of
+        split interruptible runs, and the Status.
+    """
+    total_slots = _check_inputs(carbon_forecast, mode)
+
+    batch = ([], [], [], [])
+    entries = _collect_jobs(appliances, forecast_start_time, total_slots, {}, batch, slot_minutes, mode)
+    results = _solve_batch(carbon_forecast, batch, forecast_version)
+
+    forecast = np.asarray(carbon_forecast, dtype=np.float64)
+    prefix = _prefix_sums(forecast)
+    records = {}
+    diagnosed = []
+    for name, index, status in entries:
+        if status:
+            diagnosed.append(status)
+        if index < 0:
+            records[name] = JobResult(-1, 0.0, status)
+            continue
+        slot = results[index]
+        if isinstance(slot, int):
+            runtime = batch[2][index]
+            records[name] = JobResult(slot, float(prefix[slot + runtime] - prefix[slot]), status)
+        else:
+            cost = float(forecast[slot].sum())
+            records[name] = JobResult(int(slot[0]), cost, status, slot)
+    if diagnosed:
+        record(diagnosed)
+    return records
+
+
+def schedule_households(households: dict, carbon_forecast: list[float], forecast_start_time: datetime,
+                        forecast_version: str = None, slot_minutes: int = DEFAULT_SLOT_MINUTES,
+                        reasons: dict = None) -> tuple[dict, dict]:
+    """
+    Schedules many households against the same forecast in one vectorized pass.
+
+    Takes in:
+        households: Mapping of household key (e.g. username) to a list of
+            appliance dicts in the same format `scheduler` accepts.
+        forecast_version: Optional window_cache key for this forecast.
+        slot_minutes: Width of each forecast value.
+        reasons: Optional dict, filled with household key ->
+            {appliance name: diagnostics.Status} for households with
+            unscheduled appliances.
+
+    Returns:
+        (schedules, errors): schedules maps each household key to its
+        name -> ISO start (or None) mapping. A household whose appliance list
+        is malformed is left out of schedules and its error message is put in
+        errors instead, without affecting the other households.
+    """
+    total_slots = _check_inputs(carbon_forecast)
+
+    batch = ([], [], [], [])
+    cache = {}
+    entries_by_household = {}
+    errors = {}
+
+    for key, appliances in households.items():
         try:
-            earliest_start_dt = datetime.fromisoformat(appliance['earliest_start'])
-            latest_end_dt = datetime.fromisoformat(appliance['latest_end'])
-
-            earliest_start_slot = _datetime_to_slot_index(earliest_start_dt, forecast_start_time)
-            latest_end_slot_index = _datetime_to_slot_index(latest_end_dt, forecast_start_time)
-            runtime_slots = _minutes_to_slots(appliance['runtime_min'])
-            
-            latest_start_slot = latest_end_slot_index - runtime_slots
-
-            if latest_start_slot < earliest_start_slot:
-                print(f"Warning: Appliance '{appliance_name}' is impossible to schedule.")
-                optimal_schedule[appliance_name] = None
-                continue
-            
-            # Ensure the latest possible run is within the forecast data
-            if latest_start_slot + runtime_slots > total_slots:
-                 print(f"Warning: Appliance '{appliance_name}' cannot be scheduled. "
-                       f"Latest end time {latest_end_dt} is beyond the forecast window.")
-                 optimal_schedule[appliance_name] = None
-                 continue
-
-            best_start_slot = -1
-            min_total_cost = float('inf')
-
-            # Efficiently find the best slot
-            current_window_cost = sum(carbon_forecast[earliest_start_slot : earliest_start_slot + runtime_slots])
-            min_total_cost = current_window_cost
-            best_start_slot = earliest_start_slot
-
-            for start_slot in range(earliest_start_slot + 1, latest_start_slot + 1):
-                cost_to_drop = carbon_forecast[start_slot - 1]
-                new_slot_index = start_slot + runtime_slots - 1
-                cost_to_add = carbon_forecast[new_slot_index]
-
-                current_window_cost = current_window_cost - cost_to_drop + cost_to_add
-
-                if current_window_cost < min_total_cost:
-                    min_total_cost = current_window_cost
-                    best_start_slot = start_slot
-
-            best_start_time_dt = _slot_index_to_datetime(best_start_slot, forecast_start_time)
-            optimal_schedule[appliance_name] = best_start_time_dt.isoformat()
-
-        except Exception as e:
-            print(f"Error processing appliance '{appliance_name}': {e}")
-            optimal_schedule[appliance_name] = None
-
-    return optimal_schedule
\ No newline at end of file
+            entries_by_household[key] = _collect_jobs(
+                appliances, forecast_start_time, total_slots, cache, batch, slot_minutes
+            )
+        except MALFORMED_APPLIANCE_LIST as e:
+            errors[key] = f"Invalid appliance list: {e!r}"
+
+    results = _solve_batch(carbon_forecast, batch, forecast_version)
+
+    slot_iso = {}
+    schedules = {}
+    for key, entries in entries_by_household.items():
+        household_reasons = {} if reasons is not None else None
+        schedules[key] = _format_schedule(
+            entries, results, forecast_start_time, slot_iso, slot_minutes, household_reasons
+        )
+        if household_reasons:
+            reasons[key] = household_reasons
+    return schedules, errors
@@ -47,7 +47,7 @@ class LoginSerializer(serializers.Serializer):
         return data
     
 class EventInstanceSerializer(serializers.ModelSerializer):
-    appliance_name = serializers.CharField(source='appliance.name', read_only=True)
+    appliance_name = serializers.CharField(read_only=True)
 
     class Meta:
         model = EventInstance
@@ -0,0 +1,130 @@
+"""
+Concurrent fetching of the upstream inputs of a forecast run.
+
+run_inference needs several independent upstreams (carbon intensity,
+weather history and forecast, generation mix). fetch_sources runs them in
+a thread pool, so a run waits for the slowest upstream rather than the sum
+of all of them:
+  - each Source has its own per-request timeout and retry budget; only
+    requests errors (connection failures, timeouts, HTTP errors) are
+    retried, with exponential backoff;
+  - a source also has a wall-clock deadline covering all its attempts, in
+    case an upstream client ignores the timeout;
+  - as soon as a critical source fails, fetch_sources raises SourceFailed
+    without waiting for the others; a non-critical source that fails
+    yields its `fallback` instead.
+
+Timings come back per source so the caller can log where the time went.
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, NamedTuple
+
+import requests
+
+DEFAULT_BACKOFF_S = 0.5
+
+RETRYABLE_ERRORS = (requests.RequestException,)
+
+
+class Source(NamedTuple):
+    name: str
+    # Called as fetch(timeout=...); returns the value or None if there was nothing usable.
+    fetch: Callable[..., Any]
+    timeout_s: float = 10.0
+    retries: int = 2
+    critical: bool = True
+    fallback: Any = None
+
+    @property
+    def budget_s(self) -> float:
+        """Longest the source may take: every attempt timing out, plus the backoff between them."""
+        backoff = sum(DEFAULT_BACKOFF_S * 2 ** attempt for attempt in range(self.retries))
+        return (self.retries + 1) * self.timeout_s + backoff
+
+
+class SourceTiming(NamedTuple):
+    seconds: float
+    attempts: int
+    ok: bool
+
+
+class SourceFailed(Exception):
+    """A critical source failed or ran past its budget."""
+
+    def __init__(self, name: str, reason: str, timings: dict):
+        super().__init__(f"{name}: {reason}")
+        self.name = name
+        self.timings = timings
+
+
+class _FetchError(Exception):
+    def __init__(self, reason: str, timing: SourceTiming):
+        super().__init__(reason)
+        self.timing = timing
+
+
+def _fetch_with_retries(source: Source, sleep=time.sleep):
+    """(value, SourceTiming); raises _FetchError once the retries are spent."""
+    started = time.perf_counter()
+    for attempt in range(1, source.retries + 2):
+        try:
+            value = source.fetch(timeout=source.timeout_s)
+        except RETRYABLE_ERRORS as e:
+            if attempt > source.retries:
+                timing = SourceTiming(time.perf_counter() - started, attempt, False)
+                raise _FetchError(f"{e!r} after {attempt} attempt(s)", timing) from e
+            sleep(DEFAULT_BACKOFF_S * 2 ** (attempt - 1))
+            continue
+        except Exception as e:
+            raise _FetchError(repr(e), SourceTiming(time.perf_counter() - started, attempt, False)) from e
+        if value is None:
+            raise _FetchError("no data", SourceTiming(time.perf_counter() - started, attempt, False))
+        return value, SourceTiming(time.perf_counter() - started, attempt, True)
+
+
+def fetch_sources(sources) -> tuple[dict, dict]:
+    """
+    Fetches all `sources` concurrently.
+
+    Returns:
+        (values, timings): dicts keyed by source name; timings holds a
+        SourceTiming for every source that finished.
+
+    Raises:
+        SourceFailed as soon as a critical source fails or passes its
+        budget_s. Sources still running are abandoned; their own timeouts
+        bound how long their threads linger.
+    """
+    values, timings = {}, {}
+    started = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="fetch-source")
+    futures = {executor.submit(_fetch_with_retries, source): source for source in sources}
+    deadlines = {future: started + source.budget_s for future, source in futures.items()}
+    pending = set(futures)
+    try:
+        while pending:
+            timeout = max(0.0, min(deadlines[future] for future in pending) - time.perf_counter())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            now = time.perf_counter()
+            for future in done:
+                source = futures[future]
+                try:
+                    value, timings[source.name] = future.result()
+                except _FetchError as e:
+                    timings[source.name] = e.timing
+                    if source.critical:
+                        raise SourceFailed(source.name, str(e), timings) from e
+                    value = source.fallback
+                values[source.name] = value
+
+            for future in [future for future in pending if now >= deadlines[future]]:
+                source = futures[future]
+                pending.discard(future)
+                if source.critical:
+                    raise SourceFailed(source.name, f"no result within {source.budget_s:.1f}s", timings)
+                values[source.name] = source.fallback
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return values, timings
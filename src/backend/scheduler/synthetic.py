@@ -0,0 +1,102 @@
+"""
+Synthetic forecasts and households for benchmarks and tests.
+
+Everything is generated from a seed, with no database or network access, so
+the same inputs can be rebuilt on any machine.
+
+Forecast kinds:
+    flat         every slot the same; every window ties everywhere
+    diurnal      the overnight / morning peak / solar dip / evening peak day
+    noisy        diurnal plus gaussian noise
+    adversarial  two-hour steps falling towards the end of every day, so
+                 best starts sit at the far end of their windows and every
+                 step is a run of exact ties
+"""
+
+import random
+from datetime import datetime, timedelta
+
+FORECAST_KINDS = ("flat", "diurnal", "noisy", "adversarial")
+
+# Half-hourly day shape (gCO2/kWh): overnight low, morning peak, daytime,
+# solar dip, evening peak, late evening.
+DAY_PATTERN = [20] * 12 + [100] * 6 + [50] * 8 + [20] * 8 + [100] * 10 + [50] * 4
+
+# name: (runtime range in minutes, power kW, earliest hour range, window hours range, interruptible)
+APPLIANCE_TYPES = {
+    "washing machine": ((60, 150), 2.0, (6, 18), (4, 12), False),
+    "dishwasher": ((60, 180), 1.2, (18, 23), (6, 12), False),
+    "tumble dryer": ((45, 120), 2.5, (8, 20), (3, 8), False),
+    "ev charger": ((120, 360), 7.0, (17, 22), (8, 14), True),
+    "heat pump boost": ((15, 60), 3.0, (0, 23), (2, 6), False),
+    "kettle": ((5, 15), 3.0, (6, 22), (1, 2), False),
+}
+
+# Share of households owning each appliance type.
+DEFAULT_MIX = {
+    "washing machine": 0.9,
+    "dishwasher": 0.7,
+    "tumble dryer": 0.4,
+    "ev charger": 0.25,
+    "heat pump boost": 0.3,
+    "kettle": 0.5,
+}
+
+
+def make_forecast(kind: str, total_slots: int, slot_minutes: int = 30, seed: int = 0) -> list[float]:
+    """Returns `total_slots` forecast values of the given kind (see FORECAST_KINDS)."""
+    if kind not in FORECAST_KINDS:
+        raise ValueError(f"Unknown forecast kind {kind!r}.")
+    rng = random.Random(seed)
+    half_hour = [(i * slot_minutes) // 30 for i in range(total_slots)]
+
+    if kind == "flat":
+        return [150.0] * total_slots
+    if kind == "diurnal":
+        return [float(DAY_PATTERN[h % 48]) for h in half_hour]
+    if kind == "noisy":
+        return [max(0.0, DAY_PATTERN[h % 48] + rng.gauss(0, 15)) for h in half_hour]
+    return [float(300 - 20 * ((h % 48) // 4)) for h in half_hour]
+
+
+def _round_to_slot(minutes: float, slot_minutes: int) -> int:
+    return int(round(minutes / slot_minutes)) * slot_minutes
+
+
+def make_household(rng: random.Random, forecast_start: datetime, total_slots: int, slot_minutes: int = 30,
+                   mix: dict = None) -> list[dict]:
+    """
+    Returns one household's appliance dicts in the scheduler's input format.
+    Times and runtimes are whole slots, so strict validation accepts them.
+    """
+    mix = DEFAULT_MIX if mix is None else mix
+    horizon_minutes = total_slots * slot_minutes
+    appliances = []
+    for name, share in mix.items():
+        if rng.random() >= share:
+            continue
+        (runtime_lo, runtime_hi), power_kw, (hour_lo, hour_hi), (window_lo, window_hi), interruptible = \
+            APPLIANCE_TYPES[name]
+        runtime = max(slot_minutes, _round_to_slot(rng.uniform(runtime_lo, runtime_hi), slot_minutes))
+        earliest = _round_to_slot(rng.uniform(hour_lo, hour_hi) * 60, slot_minutes)
+        window = max(runtime, _round_to_slot(rng.uniform(window_lo, window_hi) * 60, slot_minutes))
+        latest_end = min(horizon_minutes, earliest + window)
+        appliances.append({
+            "name": name,
+            "runtime_min": runtime,
+            "earliest_start": (forecast_start + timedelta(minutes=earliest)).isoformat(),
+            "latest_end": (forecast_start + timedelta(minutes=latest_end)).isoformat(),
+            "power_kw": power_kw,
+            "interruptible": interruptible,
+        })
+    return appliances
+
+
+def make_households(n_households: int, forecast_start: datetime, total_slots: int, slot_minutes: int = 30,
+                    mix: dict = None, seed: int = 0) -> dict:
+    """Returns {household key: appliance list} for `n_households` homes."""
+    rng = random.Random(seed)
+    return {
+        f"household-{i}": make_household(rng, forecast_start, total_slots, slot_minutes, mix)
+        for i in range(n_households)
+    }
@@ -1,3 +1,1089 @@
-from django.test import TestCase
+import asyncio
+import json
+import random
+import threading
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone
+from unittest import mock
+
+import numpy as np
+import requests
+from django.contrib.auth.models import User
+from django.core.exceptions import FieldError, ImproperlyConfigured
+from django.db import connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone as django_timezone
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .carbon_intensity import SingleFlightCache, UpstreamError
+from .diagnostics import Status, metrics_snapshot, reset_metrics
+from .events import InvalidCursor, decode_cursor, encode_cursor, ical_chunks, ndjson_chunks, page_etag
+from .fleet import fleet_schedule, fleet_scheduler
+from .forecast import BINARY_HEADER, ForecastSnapshot, forecast_store, publish_forecast
+from .history import missing_ranges
+from .household_solver import anytime_scheduler, joint_scheduler
+from .kernel import best_start_slots, cheapest_slot_sets, solve_slots
+from .models import (Appliance, CarbonIntensityRecord, CarbonPredictions, CarbonSavingsDaily, CarbonSavingsMonthly,
+                     EventInstance, ForecastRun)
+from .planner import ALL_DAYS, parse_preferred_days, plan_week
+from .rescheduler import reschedule_future_events
+from .savings import baseline_cost_g, reconcile_rollups
+from .scheduler_alg import scheduler as strict_scheduler
+from .scheduler_utils import (STRICT, batch_scheduler, parse_power_kw, schedule_households, schedule_results,
+                              scheduler)
+from .sources import Source, SourceFailed, _fetch_with_retries, fetch_sources
+from .views import ExportEventsView
+from .window_cache import WindowSumCache
+
+FORECAST_START = datetime(2025, 11, 1, 0, 0)
+# Each property is checked on this many random cases per seed.
+CASES = 200
+SEEDS = (0, 1, 2)
+
+
+def brute_force_best_start(forecast, earliest, latest_start, runtime):
+    # Every start in the window, summed from scratch; first minimum wins.
+    costs = [sum(forecast[s:s + runtime]) for s in range(earliest, latest_start + 1)]
+    best = min(range(len(costs)), key=costs.__getitem__)
+    return earliest + best, costs[best]
+
+
+def brute_force_schedule(appliances, forecast, forecast_start, slot_minutes=30, strict=False):
+    # Reference for the ISO-level schedulers, written independently of scheduler_utils.
+    schedule = {}
+    for appliance in appliances:
+        start = datetime.fromisoformat(appliance["earliest_start"])
+        end = datetime.fromisoformat(appliance["latest_end"])
+        minutes = appliance["runtime_min"]
+        offsets = [(t - forecast_start).total_seconds() / 60 for t in (start, end)]
+        if strict and (any(o % slot_minutes for o in offsets) or minutes % slot_minutes):
+            schedule[appliance["name"]] = None
+            continue
+        earliest, end_slot = (max(0, int(round(o / slot_minutes))) for o in offsets)
+        runtime = max(1, -(-minutes // slot_minutes))
+        if end_slot - runtime < earliest or end_slot > len(forecast):
+            schedule[appliance["name"]] = None
+            continue
+        best, _ = brute_force_best_start(forecast, earliest, end_slot - runtime, runtime)
+        schedule[appliance["name"]] = (forecast_start + timedelta(minutes=best * slot_minutes)).isoformat()
+    return schedule
+
+
+def random_forecast(rng, total_slots, integer=True):
+    # Integer intensities make exact ties common, which is where implementations drift apart.
+    if integer:
+        return [float(rng.randint(0, 12)) for _ in range(total_slots)]
+    return [rng.uniform(0, 400) for _ in range(total_slots)]
+
+
+def random_window(rng, total_slots):
+    runtime = rng.randint(1, min(12, total_slots))
+    earliest = rng.randint(0, total_slots - runtime)
+    latest_start = rng.randint(earliest, total_slots - runtime)
+    return earliest, latest_start, runtime
+
+
+def random_appliances(rng, total_slots, slot_minutes=30, n=20):
+    # Mostly aligned times, some off-boundary, some infeasible or past the horizon.
+    appliances = []
+    for i in range(n):
+        earliest = rng.randint(0, total_slots + 2) * slot_minutes + rng.choice((0, 0, 0, 7, slot_minutes // 2))
+        latest_end = earliest + rng.randint(-slot_minutes, total_slots * slot_minutes // 2)
+        appliances.append({
+            "name": f"appliance-{i}",
+            "runtime_min": rng.choice((slot_minutes, 2 * slot_minutes, 3 * slot_minutes, 45, 100)),
+            "earliest_start": (FORECAST_START + timedelta(minutes=earliest)).isoformat(),
+            "latest_end": (FORECAST_START + timedelta(minutes=latest_end)).isoformat(),
+        })
+    return appliances
+
+
+class KernelEquivalenceTests(SimpleTestCase):
+    def test_best_start_matches_brute_force(self):
+        for seed in SEEDS:
+            rng = random.Random(seed)
+            for _ in range(CASES):
+                total_slots = rng.randint(1, 200)
+                forecast = random_forecast(rng, total_slots)
+                jobs = [random_window(rng, total_slots) for _ in range(rng.randint(1, 30))]
+                starts, costs = best_start_slots(forecast, *zip(*jobs))
+                for job, start, cost in zip(jobs, starts.tolist(), costs.tolist()):
+                    self.assertEqual((start, cost), brute_force_best_start(forecast, *job))
+
+    def test_best_start_is_optimal_on_real_valued_forecasts(self):
+        # Float sums can differ in the last bit between methods, so compare costs, not slots.
+        rng = random.Random(3)
+        for _ in range(CASES):
+            total_slots = rng.randint(1, 576)
+            forecast = random_forecast(rng, total_slots, integer=False)
+            jobs = [random_window(rng, total_slots) for _ in range(10)]
+            starts, costs = best_start_slots(forecast, *zip(*jobs))
+            for (earliest, latest_start, runtime), start, cost in zip(jobs, starts.tolist(), costs.tolist()):
+                self.assertTrue(earliest <= start <= latest_start)
+                _, expected = brute_force_best_start(forecast, earliest, latest_start, runtime)
+                self.assertAlmostEqual(cost, expected, places=6)
+                self.assertAlmostEqual(cost, sum(forecast[start:start + runtime]), places=6)
+
+    def test_cached_indexes_give_the_same_answers(self):
+        rng = random.Random(4)
+        for case in range(CASES):
+            total_slots = rng.randint(1, 100)
+            forecast = random_forecast(rng, total_slots)
+            jobs = list(zip(*[random_window(rng, total_slots) for _ in range(20)]))
+            expected = best_start_slots(forecast, *jobs)
+            for _ in range(2):
+                actual = best_start_slots(forecast, *jobs, forecast_version=f"test-{case}")
+                np.testing.assert_array_equal(actual[0], expected[0])
+                np.testing.assert_array_equal(actual[1], expected[1])
+
+    def test_window_cache_is_a_bounded_lru(self):
+        prefix = np.cumsum([0.0, 3.0, 1.0, 2.0, 5.0])
+        cache = WindowSumCache(max_entries=2)
+        a1 = cache.get("a", prefix, 1)
+        cache.get("a", prefix, 2)
+        self.assertIs(cache.get("a", prefix, 1), a1)  # a/1 is now the most recently used
+        cache.get("b", prefix, 1)  # evicts a/2, the least recently used
+        self.assertEqual(cache.stats(), {"entries": 2, "bytes": a1.nbytes * 2, "hits": 1, "misses": 3,
+                                         "evictions": 1})
+        np.testing.assert_array_equal(a1.sums, [3.0, 1.0, 2.0, 5.0])
+
+        self.assertIs(cache.get("a", prefix, 1), a1)
+        self.assertIsNot(cache.get("a", prefix, 2), a1)  # rebuilt, evicting b/1
+        self.assertEqual((cache.stats()["misses"], cache.stats()["evictions"]), (4, 2))
+
+        # Invalidating one version keeps the others; no version clears everything.
+        cache.get("b", prefix, 1)
+        cache.invalidate("a")
+        self.assertEqual(cache.stats()["entries"], 1)
+        hits = cache.stats()["hits"]
+        cache.get("b", prefix, 1)
+        self.assertEqual(cache.stats()["hits"], hits + 1)
+        cache.invalidate()
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_cheapest_slot_sets_matches_brute_force(self):
+        rng = random.Random(5)
+        for _ in range(CASES):
+            total_slots = rng.randint(1, 100)
+            forecast = random_forecast(rng, total_slots)
+            jobs = [random_window(rng, total_slots) for _ in range(10)]
+            earliest, latest_start, runtime = zip(*jobs)
+            end = [s + r for s, r in zip(latest_start, runtime)]
+            slot_sets, costs = cheapest_slot_sets(forecast, earliest, end, runtime)
+            for lo, hi, count, slots, cost in zip(earliest, end, runtime, slot_sets, costs.tolist()):
+                slots = slots.tolist()
+                self.assertEqual(len(set(slots)), count)
+                self.assertEqual(slots, sorted(slots))
+                self.assertTrue(all(lo <= s < hi for s in slots))
+                self.assertEqual(cost, sum(sorted(forecast[lo:hi])[:count]))
+                self.assertEqual(cost, sum(forecast[s] for s in slots))
+
+    def test_solve_slots_mixes_contiguous_and_split_jobs(self):
+        forecast = [5.0, 1.0, 9.0, 1.0, 5.0]
+        results = solve_slots(forecast, [0, 0], [3, 3], [2, 2], [False, True])
+        self.assertEqual(results[0], 0)
+        self.assertEqual(results[1].tolist(), [1, 3])
+
+
+class ValidationModeTests(SimpleTestCase):
+    def test_round_mode_matches_reference(self):
+        for slot_minutes in (30, 15, 5):
+            rng = random.Random(slot_minutes)
+            for _ in range(CASES // 4):
+                total_slots = rng.randint(1, 48 * 30 // slot_minutes)
+                forecast = random_forecast(rng, total_slots)
+                appliances = random_appliances(rng, total_slots, slot_minutes)
+                self.assertEqual(
+                    scheduler(appliances, forecast, FORECAST_START, slot_minutes),
+                    brute_force_schedule(appliances, forecast, FORECAST_START, slot_minutes),
+                )
+
+    def test_strict_mode_matches_reference(self):
+        for slot_minutes in (30, 15):
+            rng = random.Random(100 + slot_minutes)
+            for _ in range(CASES // 4):
+                total_slots = rng.randint(1, 96)
+                forecast = random_forecast(rng, total_slots)
+                appliances = random_appliances(rng, total_slots, slot_minutes)
+                expected = brute_force_schedule(appliances, forecast, FORECAST_START, slot_minutes, strict=True)
+                self.assertEqual(strict_scheduler(appliances, forecast, FORECAST_START, slot_minutes), expected)
+                self.assertEqual(
+                    batch_scheduler(appliances, forecast, FORECAST_START, slot_minutes=slot_minutes, mode=STRICT),
+                    expected,
+                )
+
+    def test_modes_agree_on_aligned_input(self):
+        rng = random.Random(7)
+        forecast = random_forecast(rng, 96)
+        appliances = [
+            {
+                "name": f"appliance-{i}",
+                "runtime_min": 30 * runtime,
+                "earliest_start": (FORECAST_START + timedelta(minutes=30 * earliest)).isoformat(),
+                "latest_end": (FORECAST_START + timedelta(minutes=30 * (latest_start + runtime))).isoformat(),
+            }
+            for i, (earliest, latest_start, runtime) in enumerate(random_window(rng, 96) for _ in range(50))
+        ]
+        self.assertEqual(strict_scheduler(appliances, forecast, FORECAST_START),
+                         scheduler(appliances, forecast, FORECAST_START))
+
+    def test_strict_mode_rejects_off_boundary_input(self):
+        forecast = [1.0] * 48
+        appliances = [
+            {"name": "off-boundary", "runtime_min": 60,
+             "earliest_start": "2025-11-01T01:10:00", "latest_end": "2025-11-01T05:00:00"},
+            {"name": "partial-slot", "runtime_min": 45,
+             "earliest_start": "2025-11-01T01:00:00", "latest_end": "2025-11-01T05:00:00"},
+        ]
+        self.assertEqual(strict_scheduler(appliances, forecast, FORECAST_START),
+                         {"off-boundary": None, "partial-slot": None})
+        self.assertEqual(scheduler(appliances, forecast, FORECAST_START),
+                         {"off-boundary": "2025-11-01T01:00:00", "partial-slot": "2025-11-01T01:00:00"})
+
+    def test_households_match_single_schedules(self):
+        rng = random.Random(8)
+        forecast = random_forecast(rng, 48)
+        households = {f"user-{i}": random_appliances(rng, 48) for i in range(20)}
+        households["broken"] = [{"runtime_min": 30}]
+        schedules, errors = schedule_households(households, forecast, FORECAST_START)
+        self.assertEqual(list(errors), ["broken"])
+        for key, appliances in households.items():
+            if key != "broken":
+                self.assertEqual(schedules[key], scheduler(appliances, forecast, FORECAST_START))
+
+    def test_unknown_mode_is_rejected(self):
+        with self.assertRaises(ValueError):
+            batch_scheduler([], [1.0], FORECAST_START, mode="lenient")
+
+
+class FleetTests(SimpleTestCase):
+    def setUp(self):
+        rng = random.Random(9)
+        self.forecast = random_forecast(rng, 48)
+        self.jobs = [random_window(rng, 48) for _ in range(2000)]
+        self.power = [rng.choice((0.5, 1.0, 2.0)) for _ in self.jobs]
+        self.interruptible = [rng.random() < 0.1 for _ in self.jobs]
+
+    def test_zero_weight_is_the_independent_schedule(self):
+        solution = fleet_schedule(self.forecast, *zip(*self.jobs), self.power, self.interruptible, peak_weight=0)
+        expected = solve_slots(self.forecast, *zip(*self.jobs), self.interruptible)
+        self.assertEqual(solution["passes"], 0)
+        for actual, wanted in zip(solution["results"], expected):
+            self.assertEqual(np.asarray(actual).tolist(), np.asarray(wanted).tolist())
+
+    def test_spreads_load_and_keeps_jobs_in_their_windows(self):
+        solution = fleet_schedule(self.forecast, *zip(*self.jobs), self.power, self.interruptible)
+        self.assertLess(solution["load_kw"].max(), solution["independent_load_kw"].max())
+        self.assertAlmostEqual(solution["load_kw"].sum(), sum(p * r for p, (_, _, r) in zip(self.power, self.jobs)))
+        for (earliest, latest_start, runtime), split, result in zip(self.jobs, self.interruptible, solution["results"]):
+            if split:
+                self.assertEqual(len(result), runtime)
+                self.assertTrue(all(earliest <= s < latest_start + runtime for s in result.tolist()))
+            else:
+                self.assertTrue(earliest <= result <= latest_start)
+
+    def test_invalid_power_only_fails_its_household(self):
+        window = {"earliest_start": FORECAST_START.isoformat(),
+                  "latest_end": (FORECAST_START + timedelta(hours=4)).isoformat()}
+        households = {
+            "good": [{"name": "washer", "runtime_min": 60, "power_kw": 2, **window}],
+            "bad": [{"name": "dryer", "runtime_min": 60, "power_kw": "x", **window}],
+        }
+        schedules, errors, stats = fleet_scheduler(households, self.forecast, FORECAST_START)
+        self.assertEqual(list(schedules), ["good"])
+        self.assertIsNotNone(schedules["good"]["washer"])
+        self.assertIn("power_kw", errors["bad"])
+        self.assertAlmostEqual(sum(stats["load_curve"]), 4.0)
+
+
+class AnytimeSchedulerTests(SimpleTestCase):
+    def test_uncapped_answer_is_the_per_appliance_schedule(self):
+        rng = random.Random(10)
+        forecast = random_forecast(rng, 48)
+        appliances = random_appliances(rng, 48)
+        schedule, stats = anytime_scheduler(appliances, forecast, FORECAST_START, deadline_s=0.05)
+        self.assertEqual(schedule, scheduler(appliances, forecast, FORECAST_START))
+        self.assertTrue(stats["optimal"])
+
+    def test_capped_search_respects_cap_and_deadline(self):
+        rng = random.Random(11)
+        forecast = random_forecast(rng, 48)
+        appliances = [
+            {"name": f"appliance-{i}", "runtime_min": 30 * rng.randint(1, 4), "power_kw": rng.choice((1.0, 2.0, 3.0)),
+             "earliest_start": FORECAST_START.isoformat(),
+             "latest_end": (FORECAST_START + timedelta(hours=12)).isoformat()}
+            for i in range(25)
+        ]
+        started = time.perf_counter()
+        schedule, stats = anytime_scheduler(appliances, forecast, FORECAST_START, 0.02, max_power_kw=8.0)
+        self.assertLess(time.perf_counter() - started, 0.2)
+        self.assertTrue(stats["feasible"])
+
+        load = [0.0] * 48
+        for appliance in appliances:
+            start = int((datetime.fromisoformat(schedule[appliance["name"]]) - FORECAST_START).total_seconds() // 1800)
+            for slot in range(start, start + appliance["runtime_min"] // 30):
+                load[slot] += appliance["power_kw"]
+        self.assertLessEqual(max(load), 8.0)
+
+    def test_power_kw_is_validated_not_coerced(self):
+        self.assertIsNone(parse_power_kw(None))
+        self.assertEqual([parse_power_kw(v) for v in (0, "2.5", 3)], [0.0, 2.5, 3.0])
+        for invalid in ("abc", -1, True, float("nan"), [1]):
+            with self.assertRaises(ValueError):
+                parse_power_kw(invalid)
+
+        appliance = {"name": "a", "runtime_min": 30, "power_kw": "abc", "earliest_start": FORECAST_START.isoformat(),
+                     "latest_end": (FORECAST_START + timedelta(hours=2)).isoformat()}
+        with self.assertRaises(ValueError):
+            anytime_scheduler([appliance], [100.0] * 4, FORECAST_START, deadline_s=0.05)
+
+
+class JointSchedulerTests(SimpleTestCase):
+    def appliance(self, name, power_kw):
+        return {"name": name, "runtime_min": 30, "power_kw": power_kw, "earliest_start": FORECAST_START.isoformat(),
+                "latest_end": (FORECAST_START + timedelta(hours=2)).isoformat()}
+
+    def test_zero_power_takes_no_capacity(self):
+        # The meter can only run in slot 1; as the 1 kW default it would push the heater out of it.
+        forecast = [300.0, 100.0, 200.0, 400.0]
+        slot_1 = (FORECAST_START + timedelta(minutes=30)).isoformat()
+        meter = {**self.appliance("meter", 0), "earliest_start": slot_1,
+                 "latest_end": (FORECAST_START + timedelta(minutes=60)).isoformat()}
+        schedule, stats = joint_scheduler(
+            [meter, self.appliance("heater", 1.0)], forecast, FORECAST_START, max_power_kw=1.0
+        )
+        self.assertEqual(schedule, {"meter": slot_1, "heater": slot_1})
+        self.assertEqual(stats["carbon_cost"], 50.0)
+
+    def test_invalid_power_raises(self):
+        with self.assertRaises(ValueError):
+            joint_scheduler([self.appliance("a", "abc")], [100.0] * 4, FORECAST_START, max_power_kw=1.0)
+
+    def test_large_household_does_not_recurse(self):
+        # One search level per appliance; deeper than the default recursion limit.
+        forecast = [float(100 + (i * 37) % 200) for i in range(48)]
+        appliances = [{**self.appliance(f"a{i}", 1.0), "latest_end": (FORECAST_START + timedelta(hours=24)).isoformat()}
+                      for i in range(1500)]
+        schedule, stats = anytime_scheduler(appliances, forecast, FORECAST_START, 0.05, max_power_kw=40.0)
+        self.assertTrue(stats["feasible"])
+        self.assertNotIn(None, schedule.values())
+        self.assertEqual(len(schedule), 1500)
+
+    def test_invalid_power_cap_raises(self):
+        for cap in (float("nan"), 0.0, -1.0):
+            with self.assertRaises(ValueError):
+                joint_scheduler([self.appliance("a", 1.0)], [100.0] * 4, FORECAST_START, max_power_kw=cap)
+            with self.assertRaises(ValueError):
+                anytime_scheduler([self.appliance("a", 1.0)], [100.0] * 4, FORECAST_START, 0.05, max_power_kw=cap)
+
+
+class DiagnosticsTests(SimpleTestCase):
+    def appliance(self, name, earliest_h=0, latest_h=4, runtime_min=60):
+        return {
+            "name": name,
+            "runtime_min": runtime_min,
+            "earliest_start": (FORECAST_START + timedelta(hours=earliest_h)).isoformat(),
+            "latest_end": (FORECAST_START + timedelta(hours=latest_h)).isoformat(),
+        }
+
+    def test_every_rejection_has_a_reason(self):
+        forecast = [float(v) for v in range(48, 0, -1)]
+        appliances = [
+            self.appliance("ok"),
+            self.appliance("clamped", earliest_h=-2),
+            {"name": "missing", "runtime_min": 60, "earliest_start": None, "latest_end": None},
+            {**self.appliance("bad time"), "earliest_start": "tomorrow"},
+            self.appliance("bad runtime", runtime_min=[60]),
+            self.appliance("before", earliest_h=-6, latest_h=-2),
+            self.appliance("too short", latest_h=0.5),
+            self.appliance("beyond", latest_h=30),
+        ]
+        reasons = {}
+        schedule = batch_scheduler(appliances, forecast, FORECAST_START, reasons=reasons)
+
+        self.assertIsNotNone(schedule["ok"])
+        self.assertEqual(schedule["clamped"], schedule["ok"])
+        self.assertEqual(reasons, {
+            "missing": Status.MISSING_FIELD,
+            "bad time": Status.INVALID_TIME,
+            "bad runtime": Status.INVALID_RUNTIME,
+            "before": Status.BEFORE_FORECAST,
+            "too short": Status.WINDOW_TOO_SHORT,
+            "beyond": Status.BEYOND_HORIZON,
+        })
+
+        strict_reasons = {}
+        batch_scheduler([self.appliance("off grid", earliest_h=0.25)], forecast, FORECAST_START,
+                        mode=STRICT, reasons=strict_reasons)
+        self.assertEqual(strict_reasons, {"off grid": Status.OFF_SLOT_BOUNDARY})
+
+    def test_result_records_carry_slot_cost_and_status(self):
+        forecast = [5.0, 1.0, 1.0, 9.0, 2.0, 2.0]
+        records = schedule_results([
+            self.appliance("run", latest_h=3),
+            {**self.appliance("split", latest_h=3), "interruptible": True},
+            self.appliance("late", latest_h=6),
+        ], forecast, FORECAST_START)
+
+        self.assertEqual((records["run"].start_slot, records["run"].cost, records["run"].status), (1, 2.0, Status.OK))
+        self.assertEqual(records["split"].slots.tolist(), [1, 2])
+        self.assertEqual((records["late"].start_slot, records["late"].status), (-1, Status.BEYOND_HORIZON))
+        with self.assertRaises(AttributeError):
+            records["run"].extra = 1
+
+    def test_failures_are_counted_not_printed(self):
+        reset_metrics()
+        forecast = [1.0] * 48
+        households = {
+            "a": [self.appliance("ok"), self.appliance("beyond", latest_h=30)],
+            "b": [self.appliance("beyond", latest_h=30), self.appliance("clamped", earliest_h=-1)],
+            "c": "not a list of appliances",
+        }
+        reasons = {}
+        schedules, errors = schedule_households(households, forecast, FORECAST_START, reasons=reasons)
+
+        self.assertEqual(set(errors), {"c"})
+        self.assertEqual(reasons, {"a": {"beyond": Status.BEYOND_HORIZON}, "b": {"beyond": Status.BEYOND_HORIZON}})
+        self.assertEqual(metrics_snapshot(), {"beyond_horizon": 2, "clamped": 1})
+
+
+class ForecastSnapshotTests(SimpleTestCase):
+    def test_snapshot_from_rows(self):
+        rows = [(FORECAST_START + timedelta(minutes=15 * i), float(i)) for i in range(8)]
+        snapshot = ForecastSnapshot.from_rows(rows)
+
+        self.assertEqual((snapshot.start, snapshot.slot_minutes, len(snapshot)), (FORECAST_START, 15, 8))
+        self.assertEqual(snapshot.values.tolist(), [float(i) for i in range(8)])
+        self.assertFalse(snapshot.values.flags.writeable)
+        self.assertIsNone(ForecastSnapshot.from_rows([]))
+
+    def test_version_follows_content(self):
+        rows = [(FORECAST_START + timedelta(minutes=30 * i), float(i)) for i in range(4)]
+        same = ForecastSnapshot.from_rows(list(rows))
+        changed = ForecastSnapshot.from_rows(rows[:-1] + [(rows[-1][0], 99.0)])
+        self.assertEqual(ForecastSnapshot.from_rows(rows).version, same.version)
+        self.assertNotEqual(same.version, changed.version)
+
+    def test_schedulers_accept_the_snapshot_array(self):
+        rng = random.Random(12)
+        forecast = random_forecast(rng, 48)
+        snapshot = ForecastSnapshot(forecast, FORECAST_START, 30)
+        appliances = random_appliances(rng, 48)
+        self.assertEqual(
+            batch_scheduler(appliances, snapshot.values, snapshot.start, snapshot.version),
+            scheduler(appliances, forecast, FORECAST_START),
+        )
+
+    def test_packed_run_round_trip(self):
+        start = FORECAST_START.replace(tzinfo=timezone.utc)
+        packed = ForecastRun.pack([101.25, 99.5, 250.0])
+        self.assertEqual(len(packed), 12)
+        values = ForecastRun.unpack(packed)
+        self.assertEqual(values.tolist(), [101.25, 99.5, 250.0])
+        self.assertFalse(values.flags.owndata)
+
+        run = ForecastRun(start=start, slot_minutes=15, intensities=memoryview(packed))
+        self.assertEqual(run.as_rows()[2], (start + timedelta(minutes=30), 250.0))
+        snapshot = ForecastSnapshot.from_packed(start, 15, packed)
+        self.assertEqual((snapshot.values.tolist(), snapshot.slot_minutes), ([101.25, 99.5, 250.0], 15))
+        self.assertIsNone(ForecastSnapshot.from_packed(start, 15, b""))
+
+    def test_carbon_cost_of_a_run(self):
+        snapshot = ForecastSnapshot([100.0, 200.0, 300.0, 400.0], FORECAST_START, 30)
+        at = lambda slot: FORECAST_START + timedelta(minutes=30 * slot)
+        # 2 kW over slots 1 and 2: (200 + 300) gCO2/kWh * 2 kW * 0.5 h.
+        self.assertEqual(snapshot.carbon_g(at(1), 60, 2.0), 500.0)
+        self.assertEqual(snapshot.carbon_g(at(1), 45, 2.0), (200.0 + 0.5 * 300.0) * 2.0 * 0.5)
+        self.assertEqual(snapshot.carbon_g(at(2), 60, 1.0), 350.0)
+        self.assertIsNone(snapshot.carbon_g(at(3), 60, 1.0))
+        self.assertIsNone(snapshot.carbon_g(at(-1), 30, 1.0))
+        self.assertIsNone(snapshot.carbon_g(at(1) + timedelta(minutes=10), 30, 1.0))
+
+    def test_baseline_starts_at_first_allowed_slot(self):
+        snapshot = ForecastSnapshot([100.0, 200.0, 300.0, 400.0], FORECAST_START, 30)
+        at = lambda slot: FORECAST_START + timedelta(minutes=30 * slot)
+        self.assertEqual(baseline_cost_g(snapshot, at(1), 60, 1.0), snapshot.carbon_g(at(1), 60, 1.0))
+        # Mid-slot windows round up to the next slot, windows before the forecast to its start.
+        self.assertEqual(baseline_cost_g(snapshot, at(1) + timedelta(minutes=5), 30, 1.0), 150.0)
+        self.assertEqual(baseline_cost_g(snapshot, at(-3), 30, 1.0), 50.0)
+        self.assertIsNone(baseline_cost_g(snapshot, at(3), 60, 1.0))
+
+    def test_encoded_bodies(self):
+        start = FORECAST_START.replace(tzinfo=timezone.utc)
+        snapshot = ForecastSnapshot([101.25, 99.5, 250.0], start, 30)
+        encoded = snapshot.encoded()
+        self.assertIs(snapshot.encoded(), encoded)
+
+        magic, start_s, slot_minutes, n = BINARY_HEADER.unpack_from(encoded.binary)
+        values = np.frombuffer(encoded.binary, dtype="<f4", offset=BINARY_HEADER.size)
+        self.assertEqual((magic, start_s, slot_minutes, n), (b"GHF1", int(start.timestamp()), 30, 3))
+        self.assertEqual(values.tolist(), [101.25, 99.5, 250.0])
+        self.assertEqual(json.loads(encoded.json), {
+            "start": "2025-11-01T00:00:00Z", "slot_minutes": 30, "values": [101.25, 99.5, 250.0],
+            "version": snapshot.version,
+        })
+
+
+class SingleFlightCacheTests(SimpleTestCase):
+    def make_cache(self, fail=False, delay=0.0):
+        calls = []
+
+        def fetch(timeout):
+            calls.append(timeout)
+            time.sleep(delay)
+            if fail:
+                raise UpstreamError("down")
+            return {"intensity": len(calls)}
+
+        async def afetch(timeout):
+            calls.append(timeout)
+            await asyncio.sleep(delay)
+            if fail:
+                raise UpstreamError("down")
+            return {"intensity": len(calls)}
+
+        return SingleFlightCache(fetch, afetch), calls
+
+    @override_settings(CARBON_INTENSITY_TIMEOUT_S=1.5)
+    def test_concurrent_misses_share_one_request(self):
+        cache, calls = self.make_cache(delay=0.05)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(calls, [1.5])
+        self.assertEqual(results, [({"intensity": 1}, False)] * 8)
+
+        cache.clear()
+
+        async def burst():
+            return await asyncio.gather(*(cache.aget() for _ in range(8)))
+
+        self.assertEqual(asyncio.run(burst()), [({"intensity": 2}, False)] * 8)
+        self.assertEqual(len(calls), 2)
+
+    def test_expired_value_is_refetched(self):
+        cache, calls = self.make_cache()
+        with override_settings(CARBON_INTENSITY_TTL_S=0):
+            cache.get()
+            self.assertEqual(cache.get(), ({"intensity": 2}, False))
+        self.assertEqual(cache.get(), ({"intensity": 2}, False))
+
+    def test_upstream_failure_serves_last_good_value(self):
+        cache, _ = self.make_cache()
+        cache.get()
+        cache._fetch = self.make_cache(fail=True)[0]._fetch
+        with override_settings(CARBON_INTENSITY_TTL_S=0):
+            self.assertEqual(cache.get(), ({"intensity": 1}, True))
+            with override_settings(CARBON_INTENSITY_MAX_STALE_S=0):
+                with self.assertRaises(UpstreamError):
+                    cache.get()
+
+        empty, calls = self.make_cache(fail=True)
+        with self.assertRaises(UpstreamError):
+            empty.get()
+        # Within the retry window the upstream isn't asked again.
+        with self.assertRaises(UpstreamError):
+            empty.get()
+        self.assertEqual(len(calls), 1)
+
+
+class HistorySyncTests(SimpleTestCase):
+    def test_missing_ranges_merge_consecutive_gaps(self):
+        slot = timedelta(minutes=30)
+        start = FORECAST_START
+        present = [start + i * slot for i in (0, 1, 4, 7)]
+        self.assertEqual(missing_ranges(start, start + 8 * slot, present), [
+            (start + 2 * slot, start + 4 * slot),
+            (start + 5 * slot, start + 7 * slot),
+        ])
+        self.assertEqual(missing_ranges(start, start + 2 * slot, present), [])
+        self.assertEqual(missing_ranges(start, start + 2 * slot, []), [(start, start + 2 * slot)])
+
+
+
+class HistoryViewTests(TestCase):
+    START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    def setUp(self):
+        # Two days of half hours; actual i and forecast i + 1 in slot i.
+        CarbonIntensityRecord.objects.bulk_create([
+            CarbonIntensityRecord(timestamp=self.START + i * timedelta(minutes=30), forecast=i + 1, actual=i,
+                                  index="moderate")
+            for i in range(96)
+        ])
+        self.client = APIClient()
+        # Reads must never reach the upstream.
+        patcher = mock.patch("requests.sessions.Session.request", side_effect=AssertionError("network call"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, **params):
+        params = {"from": self.START.isoformat(), "to": (self.START + timedelta(days=2)).isoformat(), **params}
+        return self.client.get("/scheduler/historic-data/", params)
+
+    def pages(self, **params):
+        rows, after = [], None
+        while True:
+            body = self.get(**params, **({"after": after} if after else {})).json()
+            rows.extend(body["data"])
+            if body["next"] is None:
+                return rows
+            after = body["next"]
+
+    def test_aggregates_per_hour_and_day(self):
+        hours = self.get(resolution="hour").json()["data"]
+        self.assertEqual(len(hours), 48)
+        self.assertEqual(hours[3], {"from": "2025-01-01T03:00:00Z", "actual_min": 6.0, "actual_max": 7.0,
+                                    "samples": 2, "forecast": 7.5, "actual": 6.5})
+
+        days = self.get(resolution="day").json()["data"]
+        self.assertEqual([(day["from"], day["samples"]) for day in days],
+                         [("2025-01-01T00:00:00Z", 48), ("2025-01-02T00:00:00Z", 48)])
+        self.assertEqual((days[1]["actual"], days[1]["actual_min"], days[1]["actual_max"]), (71.5, 48.0, 95.0))
+
+    def test_pages_follow_the_cursor_without_gaps_or_repeats(self):
+        rows = self.pages(limit=7)
+        self.assertEqual([row["actual"] for row in rows], [float(i) for i in range(96)])
+        hours = self.pages(resolution="hour", limit=5)
+        self.assertEqual([row["actual_min"] for row in hours], [float(2 * h) for h in range(48)])
+
+    def test_bad_parameters_are_rejected(self):
+        for params in ({"from": "yesterday"}, {"to": "2025-13-01"}, {"after": "x"}, {"limit": "abc"},
+                       {"limit": 0}, {"from": "2025-01-03T00:00:00Z"}, {"resolution": "week"}):
+            self.assertEqual(self.get(**params).status_code, 400, params)
+
+class FetchSourcesTests(SimpleTestCase):
+    @staticmethod
+    def slow(value, delay):
+        def fetch(timeout):
+            time.sleep(delay)
+            return value
+        return fetch
+
+    def test_sources_run_concurrently(self):
+        sources = [Source(f"s{i}", self.slow(i, 0.2), timeout_s=1.0) for i in range(4)]
+        started = time.perf_counter()
+        values, timings = fetch_sources(sources)
+        self.assertLess(time.perf_counter() - started, 0.6)
+        self.assertEqual(values, {"s0": 0, "s1": 1, "s2": 2, "s3": 3})
+        self.assertTrue(all(t.ok and t.attempts == 1 and t.seconds >= 0.2 for t in timings.values()))
+
+    def test_retries_only_upstream_errors(self):
+        attempts, sleeps = [], []
+
+        def flaky(timeout):
+            attempts.append(timeout)
+            if len(attempts) < 3:
+                raise requests.ConnectionError("down")
+            return "ok"
+
+        value, timing = _fetch_with_retries(Source("flaky", flaky, timeout_s=2.0, retries=2), sleep=sleeps.append)
+        self.assertEqual((value, timing.attempts, attempts, sleeps), ("ok", 3, [2.0, 2.0, 2.0], [0.5, 1.0]))
+
+        def broken(timeout):
+            attempts.append(timeout)
+            raise KeyError("data")
+
+        attempts.clear()
+        with self.assertRaises(SourceFailed) as failed:
+            fetch_sources([Source("broken", broken, retries=2)])
+        self.assertEqual((len(attempts), failed.exception.timings["broken"].attempts), (1, 1))
+
+    def test_critical_failure_does_not_wait_for_others(self):
+        def failing(timeout):
+            raise requests.HTTPError("503")
+
+        started = time.perf_counter()
+        with self.assertRaises(SourceFailed) as failed:
+            fetch_sources([Source("slow", self.slow(1, 1.0)), Source("failing", failing, retries=0)])
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertEqual(failed.exception.name, "failing")
+        self.assertNotIn("slow", failed.exception.timings)
+
+    def test_budget_and_fallback(self):
+        started = time.perf_counter()
+        with self.assertRaises(SourceFailed):
+            fetch_sources([Source("hung", self.slow(1, 1.0), timeout_s=0.1, retries=0)])
+        self.assertLess(time.perf_counter() - started, 0.5)
+
+        values, timings = fetch_sources([
+            Source("empty", self.slow(None, 0.0), critical=False, fallback="default"),
+            Source("fine", self.slow("value", 0.0)),
+        ])
+        self.assertEqual(values, {"empty": "default", "fine": "value"})
+        self.assertFalse(timings["empty"].ok)
+
+
+class EventPageTests(SimpleTestCase):
+    def test_cursor_round_trip(self):
+        start = datetime.fromisoformat("2025-01-01T10:30:00+00:00")
+        self.assertEqual(decode_cursor(encode_cursor(start, 42)), (start, 42))
+        for bad in ("", "not-a-cursor", encode_cursor(start, 42)[:-4] + "AAAA"):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(bad)
+
+    def test_etag_follows_page_content(self):
+        start = datetime.fromisoformat("2025-01-01T10:30:00+00:00")
+        rows = [{"id": 1, "appliance_name": "Washer", "start_time": start}]
+        self.assertEqual(page_etag(rows), page_etag([dict(rows[0])]))
+        self.assertNotEqual(page_etag(rows), page_etag([{**rows[0], "start_time": start + timedelta(minutes=30)}]))
+        self.assertNotEqual(page_etag(rows), page_etag(rows, next_cursor=encode_cursor(start, 1)))
+
+    def test_exports_stream_every_row(self):
+        start = datetime.fromisoformat("2025-01-01T10:30:00+00:00")
+        rows = [
+            {"id": i, "appliance_name": "Washer, eco; 40\u00b0C" * (3 if i == 0 else 1), "start_time": start,
+             "runtime_min": 90 if i else None, "window_start": None, "window_end": None}
+            for i in range(3)
+        ]
+        lines = "".join(ndjson_chunks(iter(rows))).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn('"start_time":"2025-01-01T10:30:00Z"', lines[0])
+
+        feed = "".join(ical_chunks(iter(rows), name="Test"))
+        self.assertTrue(feed.startswith("BEGIN:VCALENDAR\r\n") and feed.endswith("END:VCALENDAR\r\n"))
+        self.assertEqual(feed.count("BEGIN:VEVENT"), 3)
+        self.assertEqual(feed.count("DTEND:20250101T120000Z"), 2)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in feed.split("\r\n")))
+        unfolded = feed.replace("\r\n ", "")
+        self.assertIn("SUMMARY:" + "Washer\\, eco\\; 40\u00b0C" * 3 + "\r\n", unfolded)
+
+
+class PlannerTests(SimpleTestCase):
+    # A Monday evening; 48 half-hour slots run to Tuesday 20:00.
+    START = datetime(2025, 11, 3, 20, 0, tzinfo=timezone.utc)
+
+    def prop(self, **fields):
+        return {"user_id": 1, "appliance": 1, "runtime_min": 60, "frequency_per_week": 7,
+                "earliest_start_time": dt_time(0), "latest_end_time": dt_time(23, 30), "preferred_days": "",
+                "preferred_start_time": dt_time(12), "interruptible": False, **fields}
+
+    def test_parse_preferred_days(self):
+        self.assertEqual(parse_preferred_days("Mon, wed"), 0b0000101)
+        self.assertEqual(parse_preferred_days("SAT;sun"), 0b1100000)
+        self.assertEqual(parse_preferred_days("weekdays thursday"), 0b0011111)
+        self.assertEqual(parse_preferred_days("mon, someday"), 0b0000001)
+        for malformed in ("", "  ,; ", "someday", "mon-fri"):
+            self.assertEqual(parse_preferred_days(malformed), ALL_DAYS, malformed)
+
+    def test_frequency_above_eligible_days_plans_one_run_per_day(self):
+        plan = plan_week([self.prop(frequency_per_week=5, preferred_days="tue")], [100.0] * 48, self.START, [])
+        self.assertEqual(len(plan), 1)
+        self.assertEqual(plan[0]["start_time"].weekday(), 1)
+
+        # Two eligible days in the horizon, still one run each however high the quota.
+        plan = plan_week([self.prop(frequency_per_week=50)], [100.0] * 48, self.START, [])
+        self.assertEqual(sorted(run["start_time"].weekday() for run in plan), [0, 1])
+
+    def test_overnight_window_belongs_to_the_evening_it_starts(self):
+        forecast = [200.0] * 48
+        forecast[9] = forecast[10] = 50.0  # Tuesday 00:30-01:30
+        prop = self.prop(earliest_start_time=dt_time(22), latest_end_time=dt_time(2))
+        plan = plan_week([prop], forecast, self.START, [])
+        self.assertEqual(len(plan), 1)
+        self.assertEqual(plan[0]["start_time"], self.START + timedelta(hours=4, minutes=30))
+        self.assertEqual((plan[0]["window_start"], plan[0]["window_end"]),
+                         (self.START + timedelta(hours=2), self.START + timedelta(hours=6)))
+
+        # A run already in Tuesday's early hours is Monday's run, so nothing is left to plan.
+        existing = [(1, 1, self.START + timedelta(hours=5))]
+        self.assertEqual(plan_week([prop], forecast, self.START, existing), [])
+
+
+class ForecastTestCase(TestCase):
+    """DB-backed tests against a published 24 h forecast starting on the next hour."""
+
+    def setUp(self):
+        self.start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        self.values = [float(100 + (i * 37) % 200) for i in range(48)]
+        publish_forecast(self.start, self.values, 30, "test")
+        forecast_store.invalidate()
+        self.addCleanup(forecast_store.invalidate)
+        self.user = User.objects.create_user("alice", "alice@example.com", "password")
+        self.client = APIClient()
+
+    def at(self, slot: int) -> str:
+        return (self.start + timedelta(minutes=30 * slot)).isoformat()
+
+    def schedule(self, appliances, **payload):
+        return self.client.post(
+            "/scheduler/schedule/", {"appliances": appliances, "username": "alice", **payload}, format="json"
+        )
+
+
+class ScheduleViewTests(ForecastTestCase):
+    def test_new_appliance_is_described_by_the_scheduled_duplicate(self):
+        response = self.schedule([
+            {"name": "Dryer", "runtime_min": None},
+            {"name": "Dryer", "runtime_min": 60, "power_kw": 2},
+        ])
+        self.assertEqual(response.status_code, 201)
+        dryer = Appliance.objects.get(name="Dryer")
+        self.assertEqual((dryer.average_duration, dryer.average_power_Kwh), (timedelta(minutes=60), 2.0))
+        self.assertEqual(EventInstance.objects.get().runtime_min, 60)
+
+    def test_invalid_duplicate_only_fails_its_own_bulk_household(self):
+        User.objects.create_user("bob", "bob@example.com", "password")
+        response = self.client.post("/scheduler/schedule/bulk/", {"households": [
+            {"username": "alice", "appliances": [{"name": "Z", "runtime_min": "abc"}, {"name": "Z", "runtime_min": 30}]},
+            {"username": "bob", "appliances": [{"name": "Y", "runtime_min": 30}]},
+        ]}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNotNone(response.json()["results"]["alice"]["Z"])
+        self.assertIsNotNone(response.json()["results"]["bob"]["Y"])
+        self.assertEqual(Appliance.objects.get(name="Z").average_duration, timedelta(minutes=30))
+
+    def test_capped_schedule_is_not_rescheduled_past_the_cap(self):
+        appliances = [{"name": name, "runtime_min": 60, "power_kw": 2, "earliest_start": self.at(0),
+                       "latest_end": self.at(8)} for name in ("washer", "dryer")]
+        self.assertEqual(self.schedule(appliances, max_power_kw=2.5).status_code, 201)
+        starts = set(EventInstance.objects.values_list("start_time", flat=True))
+        self.assertEqual(len(starts), 2)
+
+        report = reschedule_future_events(self.values[::-1], self.start, now=self.start - timedelta(minutes=1))
+        self.assertEqual(report["checked"], 0)
+        self.assertEqual(set(EventInstance.objects.values_list("start_time", flat=True)), starts)
+
+    def test_interruptible_must_be_a_boolean(self):
+        appliance = {"name": "EV", "runtime_min": 60, "earliest_start": self.at(0), "latest_end": self.at(8)}
+        response = self.schedule([{**appliance, "interruptible": "false"}])
+        self.assertEqual(response.status_code, 201)
+        # A single contiguous run keeps its window, so it can be rescheduled.
+        self.assertEqual(EventInstance.objects.filter(window_start__isnull=False).count(), 1)
+
+        for invalid in ("no", 1, [True]):
+            response = self.schedule([{**appliance, "interruptible": invalid}])
+            self.assertEqual(response.status_code, 400, invalid)
+
+
+    def test_deadline_is_clamped_to_the_server_maximum(self):
+        # SCHEDULER_MAX_DEADLINE_MS is 200.
+        appliance = {"name": "washer", "runtime_min": 60, "earliest_start": self.at(0), "latest_end": self.at(8)}
+        with mock.patch("scheduler.views.anytime_scheduler", wraps=anytime_scheduler) as solver:
+            self.assertEqual(self.schedule([appliance], deadline_ms=3000).status_code, 201)
+            self.assertEqual(solver.call_args.args[3], 0.2)
+            self.assertEqual(self.schedule([appliance], deadline_ms=5).status_code, 201)
+            self.assertEqual(solver.call_args.args[3], 0.005)
+
+        for invalid in ("nan", "inf", -1, "abc"):
+            self.assertEqual(self.schedule([appliance], deadline_ms=invalid).status_code, 400, invalid)
+
+    def test_power_cap_must_be_positive(self):
+        appliance = {"name": "washer", "runtime_min": 60, "earliest_start": self.at(0), "latest_end": self.at(8)}
+        for invalid in ("nan", "inf", 0, -2):
+            response = self.schedule([appliance], max_power_kw=invalid)
+            self.assertEqual(response.status_code, 400, invalid)
+            self.assertIn("max_power_kw", response.json()["error"])
+        self.assertFalse(EventInstance.objects.exists())
+
+    def test_fleet_peak_weight_must_be_finite_and_not_negative(self):
+        household = {"username": "alice", "appliances": [{"name": "washer", "runtime_min": 60}]}
+        for invalid in ("nan", "inf", -0.5, "abc"):
+            response = self.client.post("/scheduler/schedule/bulk/", {
+                "households": [household], "mode": "fleet", "peak_weight": invalid,
+            }, format="json")
+            self.assertEqual(response.status_code, 400, invalid)
+        self.assertFalse(EventInstance.objects.exists())
+        response = self.client.post("/scheduler/schedule/bulk/", {
+            "households": [household], "mode": "fleet", "peak_weight": 0,
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+
+class ForecastViewTests(ForecastTestCase):
+    def test_json_and_binary_bodies_with_conditional_gets(self):
+        response = self.client.get("/scheduler/forecast/")
+        self.assertEqual((response.status_code, response["Content-Type"]), (200, "application/json"))
+        self.assertEqual(response.json()["values"], self.values)
+        self.assertIn("Accept", response["Vary"])
+        etag = response["ETag"]
+
+        cached = self.client.get("/scheduler/forecast/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((cached.status_code, cached.content, cached["ETag"]), (304, b"", etag))
+
+        binary = self.client.get("/scheduler/forecast/", HTTP_ACCEPT="application/octet-stream")
+        self.assertEqual((binary.status_code, binary["Content-Type"]), (200, "application/octet-stream"))
+        magic, start_s, slot_minutes, n = BINARY_HEADER.unpack_from(binary.content)
+        self.assertEqual((magic, start_s, slot_minutes, n), (b"GHF1", int(self.start.timestamp()), 30, 48))
+        np.testing.assert_array_equal(np.frombuffer(binary.content, dtype="<f4", offset=BINARY_HEADER.size),
+                                      self.values)
+        # Each representation has its own ETag, so the JSON one doesn't validate the binary body.
+        self.assertNotEqual(binary["ETag"], etag)
+        self.assertEqual(self.client.get("/scheduler/forecast/", HTTP_ACCEPT="application/octet-stream",
+                                         HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get("/scheduler/forecast/", {"format": "binary"},
+                                         HTTP_IF_NONE_MATCH=binary["ETag"]).status_code, 304)
+
+        # A new run changes the ETag.
+        publish_forecast(self.start, self.values[::-1], 30, "test")
+        forecast_store.invalidate()
+        self.assertEqual(self.client.get("/scheduler/forecast/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ForecastStorageTests(ForecastTestCase):
+    def test_objects_serves_the_current_run(self):
+        # No per-slot rows are written, but per-timestamp queries still see the current forecast.
+        self.assertFalse(CarbonPredictions.legacy.exists())
+        self.assertEqual(CarbonPredictions.objects.count(), 48)
+
+        window = CarbonPredictions.objects.filter(timestamp__gte=self.start + timedelta(minutes=90),
+                                                  timestamp__lt=self.start + timedelta(hours=3))
+        self.assertEqual(window.values_list("carbon_intensity", flat=True), self.values[3:6])
+        prediction = CarbonPredictions.objects.get(timestamp=self.start + timedelta(minutes=90))
+        self.assertEqual((prediction.run, prediction.carbon_intensity), (ForecastRun.objects.current(), self.values[3]))
+
+        cutoff = self.start + timedelta(hours=23)
+        latest = CarbonPredictions.objects.exclude(timestamp__lt=cutoff).order_by("-timestamp")
+        self.assertEqual([p.carbon_intensity for p in latest], self.values[:45:-1])
+        with self.assertRaises(FieldError):
+            CarbonPredictions.objects.filter(run__issued_at__gte=self.start)
+
+        # A new run is picked up by the next query.
+        publish_forecast(self.start, [1.0] * 4, 30, "test")
+        self.assertEqual(CarbonPredictions.objects.values_list("carbon_intensity", flat=True), [1.0] * 4)
+
+
+class RescheduleTests(ForecastTestCase):
+    def setUp(self):
+        super().setUp()
+        self.appliance = Appliance.objects.create(name="Washer", average_power_Kwh=2.0,
+                                                  average_duration=timedelta(minutes=60))
+
+    def event(self, start_slot, window=(0, 48), runtime_min=60, **fields):
+        forecast = ForecastSnapshot(self.values, self.start, 30)
+        start_time = self.start + timedelta(minutes=30 * start_slot)
+        return EventInstance.objects.create(
+            user=self.user, appliance=self.appliance, start_time=start_time, runtime_min=runtime_min,
+            window_start=self.start + timedelta(minutes=30 * window[0]),
+            window_end=self.start + timedelta(minutes=30 * window[1]),
+            carbon_cost_g=forecast.carbon_g(start_time, runtime_min, 2.0), **fields,
+        )
+
+    def reschedule(self, values, **kwargs):
+        kwargs.setdefault("now", self.start - timedelta(minutes=1))
+        return reschedule_future_events(values, self.start, **kwargs)
+
+    def test_moves_to_the_cheapest_start_inside_the_clipped_window(self):
+        # The window runs 12 h past the forecast; only starts that end inside it count.
+        event = self.event(10, window=(10, 72))
+        values = [float(v) for v in range(100, 148)]
+        values[40:42] = [10.0, 10.0]
+        values[47] = 1.0
+        report = self.reschedule(values)
+
+        event.refresh_from_db()
+        self.assertEqual(event.start_time, self.start + timedelta(minutes=30 * 40))
+        self.assertEqual(report["checked"], 1)
+        # The stored cost scales with the run's summed intensity under the new forecast.
+        old_cost = 2.0 * (self.values[10] + self.values[11]) * 0.5
+        self.assertAlmostEqual(event.carbon_cost_g, old_cost * 20.0 / (values[10] + values[11]))
+        self.assertAlmostEqual(report["carbon_delta_g"], event.carbon_cost_g - old_cost)
+
+    def test_started_unwindowed_and_dry_run_events_stay(self):
+        started = self.event(1)
+        unwindowed = self.event(4)
+        EventInstance.objects.filter(id=unwindowed.id).update(window_start=None, window_end=None)
+        values = [100.0] * 47 + [1.0]
+
+        # `now` is mid-way through slot 2: the event at slot 1 has started.
+        report = self.reschedule(values, now=self.start + timedelta(minutes=75))
+        self.assertEqual(report, {"checked": 0, "moved": 0, "carbon_delta_g": 0.0})
+
+        waiting = self.event(6)
+        report = self.reschedule(values, now=self.start + timedelta(minutes=75), dry_run=True)
+        self.assertEqual((report["checked"], report["moved"]), (1, 1))
+        for event in (started, unwindowed, waiting):
+            self.assertEqual(EventInstance.objects.get(id=event.id).start_time, event.start_time)
+
+    def test_ties_are_not_moves(self):
+        self.event(5)
+        report = self.reschedule([100.0] * 48)
+        self.assertEqual((report["checked"], report["moved"]), (1, 0))
+
+    def test_moves_share_one_update_per_origin_and_target_slot(self):
+        events = [self.event(4) for _ in range(6)] + [self.event(10) for _ in range(4)]
+        values = [200.0] * 48
+        values[4] = 400.0
+        values[30:32] = [50.0, 50.0]
+        with CaptureQueriesContext(connection) as queries:
+            report = self.reschedule(values)
+        self.assertEqual(report["moved"], len(events))
+        start_updates = [q for q in queries if q["sql"].startswith("UPDATE") and '"start_time"' in q["sql"]]
+        self.assertEqual(len(start_updates), 2)
+
+        target = self.start + timedelta(minutes=30 * 30)
+        self.assertEqual(set(EventInstance.objects.values_list("start_time", flat=True)), {target})
+        # Costs scale by (50 + 50) over the summed intensity where each run was.
+        self.assertAlmostEqual(EventInstance.objects.get(id=events[0].id).carbon_cost_g,
+                               events[0].carbon_cost_g * 100.0 / 600.0)
+        self.assertAlmostEqual(EventInstance.objects.get(id=events[-1].id).carbon_cost_g,
+                               events[-1].carbon_cost_g * 100.0 / 400.0)
+
+
+class SavingsTests(ForecastTestCase):
+    def rollups(self, model):
+        return sorted((row.user_id, getattr(row, "day", None) or row.month, row.events,
+                       round(row.carbon_g, 6), round(row.baseline_g, 6)) for row in model.objects.all())
+
+    def test_incremental_rollups_match_a_rebuild(self):
+        appliances = [{"name": f"appliance-{i}", "runtime_min": 30 * (1 + i % 3), "power_kw": 1 + i % 2,
+                       "earliest_start": self.at(i), "latest_end": self.at(i + 20)} for i in range(8)]
+        self.assertEqual(self.schedule(appliances).status_code, 201)
+        self.assertEqual(CarbonSavingsDaily.objects.aggregate(n=Sum("events"))["n"], 8)
+
+        report = reschedule_future_events(self.values[::-1], self.start, now=self.start - timedelta(minutes=1))
+        self.assertGreater(report["moved"], 0)
+        daily, monthly = self.rollups(CarbonSavingsDaily), self.rollups(CarbonSavingsMonthly)
+
+        # Rebuilding from the events finds nothing to fix, and leaves the same rows.
+        today = django_timezone.localdate()
+        report = reconcile_rollups(today - timedelta(days=1), today + timedelta(days=2))
+        self.assertAlmostEqual(report["drift_g"], 0.0)
+        self.assertEqual(self.rollups(CarbonSavingsDaily), daily)
+        self.assertEqual(self.rollups(CarbonSavingsMonthly), monthly)
+
+    def test_reconcile_fixes_drift_and_summary_reads_the_rollups(self):
+        self.schedule([{"name": "washer", "runtime_min": 60, "earliest_start": self.at(0), "latest_end": self.at(16)}])
+        event = EventInstance.objects.get()
+        CarbonSavingsDaily.objects.update(carbon_g=0.0)
+        day = django_timezone.localdate(event.start_time)
+        report = reconcile_rollups(day, day)
+        self.assertAlmostEqual(report["drift_g"], event.carbon_cost_g)
+        self.assertAlmostEqual(CarbonSavingsMonthly.objects.get().carbon_g, event.carbon_cost_g)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/scheduler/savings/", {"username": "alice", "date": day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 2)  # the user, then one rollup query
+        body = response.json()
+        self.assertEqual((body["period"], body["events"]), ("week", 1))
+        self.assertAlmostEqual(body["saved_g"], event.baseline_cost_g - event.carbon_cost_g)
+
+        year = self.client.get("/scheduler/savings/", {"username": "alice", "period": "year",
+                                                      "date": day.isoformat()}).json()
+        self.assertEqual([month["month"] for month in year["months"]], [day.replace(day=1).isoformat()])
+        self.assertEqual(self.client.get("/scheduler/savings/", {"username": "alice", "period": "day"}).status_code,
+                         400)
+
+
+class ExportViewTests(ForecastTestCase):
+    def test_both_formats_stream_the_users_events(self):
+        self.schedule([{"name": "washer", "runtime_min": 60, "earliest_start": self.at(0), "latest_end": self.at(16)}])
+        ndjson = self.client.get("/scheduler/events/export.ndjson", {"username": "alice"})
+        self.assertEqual(ndjson["Content-Disposition"], 'attachment; filename="alice-schedule.ndjson"')
+        self.assertEqual(len(b"".join(ndjson.streaming_content).splitlines()), 1)
+
+        ical = self.client.get("/scheduler/events/export.ics", {"username": "alice"})
+        self.assertEqual(ical["Content-Type"], "text/calendar; charset=utf-8")
+        self.assertIn(b"X-WR-CALNAME:GreenHome schedule (alice)", b"".join(ical.streaming_content))
+
+    def test_base_view_requires_chunks(self):
+        request = APIRequestFactory().get("/", {"username": "alice"})
+        with self.assertRaises(ImproperlyConfigured):
+            ExportEventsView.as_view()(request)
 
-# Create your tests here.
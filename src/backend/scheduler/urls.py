@@ -3,9 +3,15 @@ from . import views
 
 urlpatterns = [
     path('carbon-intensity/', views.CarbonIntensityView.as_view(), name='carbon_intensity'),
+    path('carbon-intensity/async/', views.CarbonIntensityAsyncView.as_view(), name='carbon_intensity_async'),
     path('login/', views.LoginView.as_view(), name='login'),
     path('register/', views.RegisterView.as_view(), name='register'),
+    path('forecast/', views.ForecastView.as_view(), name='forecast'),
     path('historic-data/', views.HistoricCarbonIntensity.as_view(), name='historic-data'),
     path('schedule/', views.ScheduleEventsView.as_view(), name='schedule-events'),
-    path("events/", views.UserEventsView.as_view(), name="user-events-by-name")
+    path('schedule/bulk/', views.BulkScheduleEventsView.as_view(), name='schedule-events-bulk'),
+    path("events/", views.UserEventsView.as_view(), name="user-events-by-name"),
+    path("events/export.ndjson", views.ExportEventsNDJSONView.as_view(), name="user-events-ndjson"),
+    path("events/export.ics", views.ExportEventsICalView.as_view(), name="user-events-ical"),
+    path("savings/", views.CarbonSavingsView.as_view(), name="carbon-savings"),
 ]
@@ -1,21 +1,37 @@
 from greenhome import settings
 from django.shortcuts import render
 from django.views import View
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.http import JsonResponse
 from django.contrib.auth import authenticate
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics, permissions
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
+import math
 import requests
 import json
 from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone as django_timezone
+from django.utils.http import parse_etags
 
-from .models import Appliance, EventInstance
+from .models import Appliance, EventInstance, CarbonPredictions
 from .serializers import EventInstanceSerializer
 from .scheduler_alg import scheduler
+from .scheduler_utils import parse_power_kw, schedule_households
+from .household_solver import anytime_scheduler
+from .fleet import fleet_scheduler, DEFAULT_PEAK_WEIGHT
+from .household_solver import DEFAULT_POWER_KW
+from .forecast import current_forecast
+from .carbon_intensity import current_intensity, UpstreamError
+from .history import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, RESOLUTIONS, history_page
+from .diagnostics import describe
+from .savings import baseline_cost_g, record_events, summary as savings_summary
+from .events import DEFAULT_PAGE_SIZE as EVENTS_PAGE_SIZE, MAX_PAGE_SIZE as MAX_EVENTS_PAGE_SIZE
+from .events import InvalidCursor, event_page, export_rows, ical_chunks, ndjson_chunks, page_etag
 
 from .serializers import UserSerializer, RegisterSerializer, LoginSerializer
 #  Login + Register Views
@@ -80,43 +96,126 @@ class LoginView(APIView):
 
 class CarbonIntensityView(APIView):
     # View to fetch current carbon intensity data from the UK Carbon Intensity API.
-    # Requires Authentication
+    # The reading is cached per worker and concurrent misses share one upstream
+    # request (see carbon_intensity.py); if the upstream is down the last good
+    # reading is returned with "stale": true.
     # Returns:
-    # Response: JSON containing current carbon intensity and index.
+    # Response: JSON containing current carbon intensity, index and whether it is stale.
     permission_classes = [permissions.AllowAny]
     
     def get(self, request):
-        url = "https://api.carbonintensity.org.uk/intensity"
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
+            reading, stale = current_intensity.get()
+        except UpstreamError:
+            return Response({"error": "Failed to fetch carbon intensity data"}, status=500)
+        return Response({**reading, "stale": stale}, status=200)
 
-            intensity = data["data"][0]["intensity"]["actual"]
-            index = data["data"][0]["intensity"]["index"]
 
-            return Response({"intensity": intensity, "index": index}, status=200)
+class CarbonIntensityAsyncView(View):
+    # Async (ASGI) variant of CarbonIntensityView: waiting on the upstream
+    # doesn't hold a worker thread. Same cache and response.
 
-        except requests.RequestException as e:
-            return Response({"error": "Failed to fetch carbon intensity data"}, status=500)
+    async def get(self, request):
+        try:
+            reading, stale = await current_intensity.aget()
+        except UpstreamError:
+            return JsonResponse({"error": "Failed to fetch carbon intensity data"}, status=500)
+        return JsonResponse({**reading, "stale": stale}, status=200)
+
+
+def _seconds_to_next_run(now: datetime) -> int:
+    # run_inference is scheduled every FORECAST_RUN_INTERVAL_MIN minutes, aligned to the clock.
+    interval = getattr(settings, "FORECAST_RUN_INTERVAL_MIN", 30) * 60
+    return max(int(interval - now.timestamp() % interval), 1)
+
+
+class ForecastView(View):
+    """
+    The current forecast, pre-encoded once per forecast run.
+
+    Clients sending "Accept: application/octet-stream" (or ?format=binary)
+    get the little-endian float32 layout described in scheduler/forecast.py;
+    everyone else gets JSON. Both carry a strong ETag and may be cached
+    until the next inference run, after which a conditional GET usually
+    costs a 304.
+    """
+
+    def get(self, request):
+        forecast = current_forecast()
+        if forecast is None:
+            return JsonResponse({"error": "No carbon forecast available."}, status=503)
+
+        fmt = request.GET.get("format")
+        binary = fmt == "binary" or (fmt is None and "application/octet-stream" in request.headers.get("Accept", ""))
+        encoded = forecast.encoded()
+        etag = f'"{encoded.etag}"' if binary else f'"{encoded.etag}.json"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={_seconds_to_next_run(datetime.now(timezone.utc))}, must-revalidate",
+            "Vary": "Accept",
+        }
+
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in parse_etags(if_none_match)):
+            return HttpResponse(status=304, headers=headers)
+        if binary:
+            return HttpResponse(encoded.binary, content_type="application/octet-stream", headers=headers)
+        return HttpResponse(encoded.json, content_type="application/json", headers=headers)
+
+
+def _parse_query_time(value: str):
+    # ISO 8601 from a query string, where "+" may have arrived as a space; naive times are UTC.
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value.strip().replace(" ", "+").replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
 
 
 class HistoricCarbonIntensity(APIView):
+    """
+    Historic national carbon intensity from the local table (filled by the
+    sync_carbon_intensity command); never calls the upstream.
+
+    Query params:
+        from, to: ISO 8601 range (default: the last 24 hours).
+        resolution: "30min" (default), "hour" or "day"; aggregated rows hold
+            mean forecast and actual, min/max actual and the sample count.
+        after: "next" from the previous page; limit: rows per page (max 5000).
+
+    Returns:
+        Response: JSON with "data" (oldest first) and "next", the cursor for
+        the following page or null on the last one.
+    """
     permission_classes = [permissions.AllowAny]
 
     def get(self, request):
-        url = "https://api.carbonintensity.org.uk/intensity/2017-08-25T12:35Z/2017-15-25T12:35Z"
+        params = request.query_params
+        resolution = params.get("resolution", "30min")
+        if resolution not in RESOLUTIONS:
+            return Response(
+                {"error": f"resolution must be one of {', '.join(RESOLUTIONS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
+            end = _parse_query_time(params.get("to")) or datetime.now(timezone.utc)
+            start = _parse_query_time(params.get("from")) or end - timedelta(days=1)
+            after = _parse_query_time(params.get("after"))
+            limit = min(int(params.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        except ValueError:
+            return Response(
+                {"error": "from, to and after must be ISO 8601 times and limit a number."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if limit <= 0 or start >= end:
+            return Response(
+                {"error": "limit must be positive and from before to."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rows, next_after = history_page(start, end, resolution, after, limit)
+        return Response({"data": rows, "next": next_after}, status=status.HTTP_200_OK)
 
-            
 
-            return 
-        except requests.RequestException as e:
-            return Response({"error": "Failed to fetch carbon intensity data"}, status=500)
-        
 # In your_app/views.py
 
 from rest_framework.views import APIView
@@ -130,7 +229,226 @@ def T(days=0, hours=0, minutes=0):
     return dt.isoformat()
 
 
+def _runtime_minutes(value):
+    # Numeric strings are accepted; anything else is left for the scheduler to report.
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _interruptible(value) -> bool:
+    # Real booleans, or "true"/"false" from form-encoded clients; bool() would
+    # make "false" truthy and silently split the run. Missing or null is false.
+    if value is None:
+        return False
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    raise ValueError(f"interruptible must be true or false, not {value!r}.")
+
+
+def _format_appliances(appliances_data: list) -> list[dict]:
+    # Normalises the appliance dicts sent by clients into the scheduler's format.
+    # Raises ValueError for a power_kw that isn't a non-negative number or an
+    # interruptible that isn't a boolean, so the schedulers only ever see
+    # valid values.
+    formatted = []
+    for a in appliances_data:
+        formatted.append({
+            "name": a.get("name", "Unnamed task"),
+            "runtime_min": _runtime_minutes(a.get("runtime_min", 0)),
+            "earliest_start": a.get("earliest_start"),
+            "latest_end": a.get("latest_end"),
+            "power_kw": parse_power_kw(a.get("power_kw")),
+            "interruptible": _interruptible(a.get("interruptible")),
+        })
+    return formatted
+
+
+def _parse_iso(value: str, parsed: dict) -> datetime:
+    if value not in parsed:
+        parsed[value] = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed[value]
+
+
+def _window_fields(app: dict, scheduled, parsed: dict) -> dict:
+    # Single contiguous runs keep their window so they can be rescheduled when
+    # a new forecast lands; split runs are left where they are.
+    if not isinstance(scheduled, str):
+        return {}
+    return {
+        "window_start": _parse_iso(app["earliest_start"], parsed),
+        "window_end": _parse_iso(app["latest_end"], parsed),
+    }
+
+
+def _runs(scheduled, runtime_min: int, parsed: dict) -> list[tuple]:
+    # A scheduler result is None, one ISO start, or [start, stop] pairs for
+    # interruptible appliances; each run becomes its own event.
+    # Returns (start datetime, runtime in minutes) per run.
+    if not scheduled:
+        return []
+    if isinstance(scheduled, str):
+        return [(_parse_iso(scheduled, parsed), runtime_min)]
+    runs = []
+    for start_iso, stop_iso in scheduled:
+        start = _parse_iso(start_iso, parsed)
+        runs.append((start, round((_parse_iso(stop_iso, parsed) - start).total_seconds() / 60)))
+    return runs
+
+
+def _default_windows(formatted: list[dict], forecast):
+    # A missing earliest start or latest end means no preference: the forecast horizon.
+    horizon = None
+    for a in formatted:
+        if a["earliest_start"] is None or a["latest_end"] is None:
+            if horizon is None:
+                end = forecast.start + timedelta(minutes=forecast.slot_minutes * len(forecast))
+                horizon = (forecast.start.isoformat(), end.isoformat())
+            a["earliest_start"] = a["earliest_start"] or horizon[0]
+            a["latest_end"] = a["latest_end"] or horizon[1]
+
+
+def _appliance_catalogue(formatted: list[dict]) -> dict:
+    # Stored Appliance rows by name, in one query; the oldest row wins for duplicate names.
+    names = {a["name"] for a in formatted}
+    catalogue = {}
+    for appliance in Appliance.objects.filter(name__in=names).order_by("id"):
+        catalogue.setdefault(appliance.name, appliance)
+    return catalogue
+
+
+def _fill_appliance_power(formatted: list[dict], catalogue: dict):
+    # Appliances sent without a power draw fall back to the stored average for that name.
+    for a in formatted:
+        if a.get("power_kw") is None and a["name"] in catalogue:
+            a["power_kw"] = catalogue[a["name"]].average_power_Kwh
+
+
+def _create_missing_appliances(events: list[dict], catalogue: dict):
+    # Scheduled names not in the catalogue yet get a row each, in one insert.
+    # A row is described by the appliance record the events were built from
+    # (the one that was actually scheduled, see _build_events), never by an
+    # invalid duplicate of the same name.
+    missing = {}
+    for event in events:
+        name = event["appliance"]
+        if name in catalogue or name in missing:
+            continue
+        runtime_min = event["total_runtime_min"]
+        if not isinstance(runtime_min, int) or runtime_min <= 0:
+            runtime_min = event["runtime_min"]
+        missing[name] = Appliance(
+            name=name,
+            average_power_Kwh=DEFAULT_POWER_KW if event["power_kw"] is None else event["power_kw"],
+            average_duration=timedelta(minutes=runtime_min),
+        )
+    for appliance in Appliance.objects.bulk_create(missing.values()):
+        catalogue[appliance.name] = appliance
+
+
+def _build_events(user_id: int, appliances: list[dict], schedule: dict, parsed: dict,
+                  keep_windows: bool = True) -> list[dict]:
+    # One dict of EventInstance fields per scheduled run, with the appliance
+    # still by name and its requested power, earliest start and runtime.
+    # Starts are forecast slots and windows repeat a lot, so `parsed` only
+    # ever holds a handful of strings.
+    by_name = {a["name"]: a for a in appliances}
+    events = []
+    for appliance_name, scheduled in schedule.items():
+        app = by_name[appliance_name]
+        window = _window_fields(app, scheduled, parsed) if keep_windows else {}
+        for start_time, runtime_min in _runs(scheduled, app["runtime_min"], parsed):
+            events.append({
+                "user_id": user_id,
+                "appliance": appliance_name,
+                "power_kw": app.get("power_kw"),
+                "earliest_start": _parse_iso(app["earliest_start"], parsed),
+                "total_runtime_min": app["runtime_min"],
+                "start_time": start_time,
+                "runtime_min": runtime_min,
+                **window,
+            })
+    return events
+
+
+def _save_events(events: list[dict], catalogue: dict, forecast,
+                 batch_size: int = 2000) -> list:
+    # The single write path for scheduled events: missing appliances, all
+    # events and their savings rollups go in with bulk writes inside one
+    # transaction. Each event records its carbon cost under `forecast` and
+    # its share of what the whole run would have cost starting as early as
+    # allowed.
+    baselines = {}
+    with transaction.atomic():
+        _create_missing_appliances(events, catalogue)
+        instances = []
+        for event in events:
+            fields = dict(event)
+            appliance = catalogue[fields.pop("appliance")]
+            power_kw = fields.pop("power_kw")
+            if power_kw is None:
+                power_kw = appliance.average_power_Kwh
+            earliest_start, total_runtime_min = fields.pop("earliest_start"), fields.pop("total_runtime_min")
+            key = (earliest_start, total_runtime_min, power_kw)
+            if key not in baselines:
+                baselines[key] = baseline_cost_g(forecast, earliest_start, total_runtime_min, power_kw)
+            baseline = baselines[key]
+            instances.append(EventInstance(
+                appliance=appliance,
+                carbon_cost_g=forecast.carbon_g(fields["start_time"], fields["runtime_min"], power_kw),
+                baseline_cost_g=None if baseline is None else baseline * fields["runtime_min"] / total_runtime_min,
+                **fields,
+            ))
+        created = EventInstance.objects.bulk_create(instances, batch_size=batch_size)
+        record_events(created)
+        return created
+
+
+def _request_user_id(request):
+    # The authenticated user, else the "username" in the payload.
+    # Returns (user_id, None), or (None, error Response).
+    if request.user.is_authenticated:
+        return request.user.id, None
+    username = request.data.get("username")
+    if not username or not isinstance(username, str):
+        return None, Response({"error": "Username not provided"}, status=status.HTTP_400_BAD_REQUEST)
+    user_id = User.objects.filter(username=username).values_list("id", flat=True).first()
+    if user_id is None:
+        return None, Response({"error": f"User '{username}' not found"}, status=status.HTTP_404_NOT_FOUND)
+    return user_id, None
+
+
+# Upper bound on a request's "deadline_ms" if settings.SCHEDULER_MAX_DEADLINE_MS is unset.
+DEFAULT_MAX_DEADLINE_MS = 200
+
+
 class ScheduleEventsView(APIView):
+    """
+    Schedules one household's appliances and saves the resulting events.
+
+    Expects:
+        {"appliances": [...], "username": str, "max_power_kw": float, "deadline_ms": float}
+    Events belong to the authenticated user, or to "username" for anonymous
+    requests. An appliance without "earliest_start" or "latest_end" may run
+    anywhere in the forecast horizon. "max_power_kw" (optional) caps the
+    household's total draw, placing the appliances jointly; such events keep
+    no window, so the rescheduler leaves them where they are. "deadline_ms"
+    (default settings.SCHEDULER_DEADLINE_MS) bounds the time spent
+    searching, up to settings.SCHEDULER_MAX_DEADLINE_MS; the best placement
+    found by then is used.
+
+    Appliance names are resolved in one query, and new appliances and all
+    events are written with bulk inserts in one transaction.
+
+    Returns:
+        Response: JSON with the created "events", the schedule's
+        "carbon_cost" in gCO2, whether it is "optimal" and "feasible", and
+        "unscheduled": {name: {"code", "reason"}} for appliances that could
+        not be scheduled.
+    """
     permission_classes = [permissions.AllowAny] 
 
     def post(self, request, *args, **kwargs):
@@ -141,70 +459,349 @@ class ScheduleEventsView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Load your forecast data (same as before)
-        from .models import CarbonPredictions, Appliance, EventInstance
-        from .scheduler_utils import scheduler
-        from datetime import datetime, timedelta, timezone
+        user_id, error = _request_user_id(request)
+        if error is not None:
+            return error
+
+        forecast = current_forecast()
+        if forecast is None:
+            return Response({"error": "No carbon forecast available."}, status=503)
 
         try:
-            forecast_qs = CarbonPredictions.objects.order_by("timestamp")
-            if not forecast_qs.exists():
-                return Response({"error": "No carbon forecast available."}, status=503)
-            forecast_start = forecast_qs.first().timestamp
-            carbon_forecast = [f.carbon_intensity for f in forecast_qs]
-        except Exception as e:
-            return Response({"error": str(e)}, status=500)
-
-        # Prepare appliances list
-        formatted = []
-        for a in appliances_data:
-            formatted.append({
-                "name": a.get("name", "Unnamed task"),
-                "runtime_min": int(a.get("runtime_min", 0)),
-                "earliest_start": a.get("earliest_start"),
-                "latest_end": a.get("latest_end"),
-            })
+            formatted = _format_appliances(appliances_data)
+        except (AttributeError, TypeError, ValueError) as e:
+            return Response({"error": f"Invalid appliance list: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+        _default_windows(formatted, forecast)
+
+        # Run scheduler. With a household power cap the appliances are placed jointly.
+        max_power_kw = request.data.get('max_power_kw')
+        deadline_ms = request.data.get('deadline_ms', settings.SCHEDULER_DEADLINE_MS)
+        try:
+            max_power_kw = None if max_power_kw is None else float(max_power_kw)
+            deadline_ms = float(deadline_ms)
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "max_power_kw and deadline_ms must be numbers."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if max_power_kw is not None and not (math.isfinite(max_power_kw) and max_power_kw > 0):
+            return Response(
+                {"error": "max_power_kw must be a positive number."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not math.isfinite(deadline_ms) or deadline_ms < 0:
+            return Response(
+                {"error": "deadline_ms must be a finite number of milliseconds, 0 or more."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # Callers may ask for a shorter search, but never hold a worker longer than the server allows.
+        deadline_ms = min(deadline_ms, getattr(settings, "SCHEDULER_MAX_DEADLINE_MS", DEFAULT_MAX_DEADLINE_MS))
+        catalogue = _appliance_catalogue(formatted)
+        _fill_appliance_power(formatted, catalogue)
+        result, stats = anytime_scheduler(
+            formatted, forecast.values, forecast.start, deadline_ms / 1000, max_power_kw, forecast.slot_minutes
+        )
+
+        # Appliances placed jointly under a power cap must not be moved one by
+        # one by the rescheduler, which knows nothing of the cap.
+        events = _build_events(user_id, formatted, result, {}, keep_windows=max_power_kw is None)
+        created = _save_events(events, catalogue, forecast)
+        serializer = EventInstanceSerializer(created, many=True)
+        return Response({
+            "events": serializer.data,
+            "carbon_cost": stats["carbon_cost"],
+            "optimal": stats["optimal"],
+            "feasible": stats["feasible"],
+            "unscheduled": {name: describe(reason) for name, reason in stats["unscheduled"].items()},
+        }, status=201)
 
-        # Run scheduler
-        result = scheduler(formatted, carbon_forecast, forecast_start)
 
-        # Save results
-        created = []
-        for app in formatted:
-            start_iso = result.get(app["name"])
-            if not start_iso:
-                continue
-            start_time = datetime.fromisoformat(start_iso.replace("Z", "+00:00"))
-            end_time = start_time + timedelta(minutes=app["runtime_min"])
-
-            appliance_obj, _ = Appliance.objects.get_or_create(name=app["name"])
-            evt = EventInstance.objects.create(
-                appliance=appliance_obj,
-                start_time=start_time,
-                end_time=end_time,
+class BulkScheduleEventsView(APIView):
+    """
+    Schedules appliances for many households in one request.
+
+    Expects:
+        {"households": [{"username": str, "appliances": [...]}, ...],
+         "mode": "independent" | "fleet", "peak_weight": float}
+    where each appliance list has the same format as ScheduleEventsView.
+    "mode" defaults to "independent"; "fleet" schedules all households
+    together and spreads their load (see fleet.py), with "peak_weight"
+    setting how hard peaks are penalised.
+
+    The forecast is loaded once, every household is scheduled in one
+    vectorized pass and all events are written with bulk inserts. A bad
+    household only fails itself.
+
+    Returns:
+        Response: JSON with the forecast start, a per-user map of appliance
+        name to ISO start time (None if it could not be scheduled), a
+        per-user map of errors, and per user the "unscheduled" appliances
+        with their reason codes. Fleet mode adds "fleet" with the aggregate
+        load curve (kW per slot) and its peak, next to the peak the same
+        households would reach scheduled independently.
+    """
+    permission_classes = [permissions.AllowAny]
+    insert_batch_size = 2000
+
+    def post(self, request, *args, **kwargs):
+        households = request.data.get('households')
+        if not isinstance(households, list) or not households:
+            return Response(
+                {"error": "Expected a list of households."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        mode = request.data.get('mode', 'independent')
+        if mode not in ('independent', 'fleet'):
+            return Response(
+                {"error": "mode must be 'independent' or 'fleet'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            peak_weight = float(request.data.get('peak_weight', DEFAULT_PEAK_WEIGHT))
+            if not math.isfinite(peak_weight) or peak_weight < 0:
+                raise ValueError(peak_weight)
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "peak_weight must be a finite number, 0 or more."},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            created.append(evt)
 
-        from .serializers import EventInstanceSerializer
-        serializer = EventInstanceSerializer(created, many=True)
-        return Response(serializer.data, status=201)
+        forecast = current_forecast()
+        if forecast is None:
+            return Response({"error": "No carbon forecast available."}, status=503)
+
+        errors = {}
+        appliances_by_user = {}
+        for position, household in enumerate(households):
+            username = household.get("username") if isinstance(household, dict) else None
+            if not username or not isinstance(username, str):
+                errors[f"households[{position}]"] = "Username not provided"
+                continue
+            if username in appliances_by_user or username in errors:
+                errors[username] = "Duplicate household in request"
+                appliances_by_user.pop(username, None)
+                continue
+            appliances_data = household.get("appliances")
+            if not isinstance(appliances_data, list) or not appliances_data:
+                errors[username] = "Expected a list of appliances."
+                continue
+            try:
+                appliances_by_user[username] = _format_appliances(appliances_data)
+            except (AttributeError, TypeError, ValueError) as e:
+                errors[username] = f"Invalid appliance list: {e}"
+
+        user_ids = dict(
+            User.objects.filter(username__in=list(appliances_by_user)).values_list("username", "id")
+        )
+        for username in list(appliances_by_user):
+            if username not in user_ids:
+                errors[username] = f"User '{username}' not found"
+                del appliances_by_user[username]
+
+        all_appliances = [a for appliances in appliances_by_user.values() for a in appliances]
+        _default_windows(all_appliances, forecast)
+        catalogue = _appliance_catalogue(all_appliances)
+
+        fleet_stats = None
+        reasons = {}
+        if mode == 'fleet':
+            _fill_appliance_power(all_appliances, catalogue)
+            results, schedule_errors, fleet_stats = fleet_scheduler(
+                appliances_by_user, forecast.values, forecast.start, forecast.slot_minutes, peak_weight,
+                reasons=reasons,
+            )
+        else:
+            results, schedule_errors = schedule_households(
+                appliances_by_user, forecast.values, forecast.start, forecast.version, forecast.slot_minutes, reasons
+            )
+        errors.update(schedule_errors)
+
+        # Fleet placements are deliberately spread out, so they must not be
+        # pulled back to the cheapest slot by the rescheduler.
+        parsed = {}
+        events = []
+        for username, schedule in results.items():
+            events.extend(_build_events(
+                user_ids[username], appliances_by_user[username], schedule, parsed, keep_windows=mode != 'fleet'
+            ))
+        _save_events(events, catalogue, forecast, self.insert_batch_size)
+
+        body = {
+            "forecast_start": forecast.start.isoformat(),
+            "results": results,
+            "errors": errors,
+            "unscheduled": {
+                username: {name: describe(reason) for name, reason in household.items()}
+                for username, household in reasons.items()
+            },
+        }
+        if fleet_stats is not None:
+            body["fleet"] = fleet_stats
+        return Response(body, status=status.HTTP_201_CREATED)
 
 
 class UserEventsView(APIView):
+    """
+    Lists a user's events, oldest first, one page at a time.
+
+    Query params:
+        username: whose events.
+        from, to: only events starting in [from, to) (ISO 8601, optional).
+        cursor, limit: paging; the body stays a plain array and the cursor of
+            the next page comes in the "X-Next-Cursor" header (and a Link
+            rel="next" URL) while there are more.
+
+    Every page carries an ETag; a request whose If-None-Match matches gets
+    an empty 304 without the events being serialized.
+    """
     permission_classes = [permissions.AllowAny]
 
     def get(self,request):
-        username = request.query_params.get("username")
+        params = request.query_params
+        username = params.get("username")
 
         if not username:
             return Response({"error": "Username not provided"}, status=status.HTTP_400_BAD_REQUEST)
+        user_id = User.objects.filter(username=username).values_list("id", flat=True).first()
+        if user_id is None:
+            return Response({"error": f"User '{username}' not found"}, status=status.HTTP_404_NOT_FOUND)
+
         try:
-            user = User.objects.get(username=username)
-        except User.DoesNotExist:
+            start = _parse_query_time(params.get("from"))
+            end = _parse_query_time(params.get("to"))
+            limit = min(int(params.get("limit", EVENTS_PAGE_SIZE)), MAX_EVENTS_PAGE_SIZE)
+            rows, next_cursor = event_page(user_id, start, end, params.get("cursor"), max(limit, 1))
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response(
+                {"error": "from and to must be ISO 8601 times and limit a number."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        etag = page_etag(rows, next_cursor)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if next_cursor:
+            query = params.copy()
+            query["cursor"] = next_cursor
+            headers["X-Next-Cursor"] = next_cursor
+            headers["Link"] = f'<{request.build_absolute_uri("?" + query.urlencode())}>; rel="next"'
+
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in parse_etags(if_none_match)):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        serializer = EventInstanceSerializer(rows, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK, headers=headers)
+
+
+class ExportEventsView(APIView):
+    """
+    Streams all of a user's events (optionally only those starting in
+    [from, to)) as one download. Rows are read and written in chunks, so
+    memory stays flat however long the history is.
+    """
+    permission_classes = [permissions.AllowAny]
+    content_type = None
+    extension = None
+    # Required: called as chunks(rows, username), returns the body's chunks.
+    chunks = None
+
+    def get(self, request):
+        if self.chunks is None:
+            raise ImproperlyConfigured(f"{type(self).__name__} must set chunks, content_type and extension.")
+        params = request.query_params
+        username = params.get("username")
+
+        if not username:
+            return Response({"error": "Username not provided"}, status=status.HTTP_400_BAD_REQUEST)
+        user_id = User.objects.filter(username=username).values_list("id", flat=True).first()
+        if user_id is None:
             return Response({"error": f"User '{username}' not found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            start = _parse_query_time(params.get("from"))
+            end = _parse_query_time(params.get("to"))
+        except ValueError:
+            return Response({"error": "from and to must be ISO 8601 times."}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(
+            self.chunks(export_rows(user_id, start, end), username), content_type=self.content_type
+        )
+        response["Content-Disposition"] = f'attachment; filename="{username}-schedule.{self.extension}"'
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+
+def _ndjson_export(rows, username):
+    return ndjson_chunks(rows)
+
+
+def _ical_export(rows, username):
+    return ical_chunks(rows, name=f"GreenHome schedule ({username})")
 
 
-        events = EventInstance.objects.filter(user_id=user).order_by("start_time")
+class ExportEventsNDJSONView(ExportEventsView):
+    content_type = "application/x-ndjson"
+    extension = "ndjson"
+    chunks = staticmethod(_ndjson_export)
 
-        serializer = EventInstanceSerializer(events, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+
+class ExportEventsICalView(ExportEventsView):
+    content_type = "text/calendar; charset=utf-8"
+    extension = "ics"
+    chunks = staticmethod(_ical_export)
+
+
+SAVINGS_PERIODS = ("week", "month", "year")
+
+
+def _savings_period(period: str, day):
+    """The first and last day of the calendar week, month or year containing `day`."""
+    if period == "week":
+        first = day - timedelta(days=day.weekday())
+        return first, first + timedelta(days=6)
+    if period == "month":
+        first = day.replace(day=1)
+        return first, (first + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+    return day.replace(month=1, day=1), day.replace(month=12, day=31)
+
+
+class CarbonSavingsView(APIView):
+    """
+    A user's carbon savings over a calendar week, month or year.
+
+    Query params:
+        username: whose savings.
+        period: week (per day, the default), month (per day) or year (per month).
+        date: any day in the period (YYYY-MM-DD, default today).
+
+    Reads only the savings rollups (see savings.py), so the cost is one row
+    per day or month whatever the number of events.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        params = request.query_params
+        username = params.get("username")
+
+        if not username:
+            return Response({"error": "Username not provided"}, status=status.HTTP_400_BAD_REQUEST)
+        user_id = User.objects.filter(username=username).values_list("id", flat=True).first()
+        if user_id is None:
+            return Response({"error": f"User '{username}' not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        period = params.get("period", "week")
+        if period not in SAVINGS_PERIODS:
+            return Response(
+                {"error": f"period must be one of {', '.join(SAVINGS_PERIODS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            day = date.fromisoformat(params["date"]) if params.get("date") else django_timezone.localdate()
+        except ValueError:
+            return Response({"error": "date must be YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+
+        first, last = _savings_period(period, day)
+        body = savings_summary(user_id, first, last, monthly=period == "year")
+        body["period"] = period
+        return Response(body, status=status.HTTP_200_OK, headers={"Cache-Control": "private, no-cache"})
@@ -0,0 +1,134 @@
+"""
+Process-level cache of window sums over the current forecast.
+
+Every scheduling request searches the same forecast (48-576 values,
+depending on horizon and slot width) with a handful of runtimes. For each
+(forecast version, runtime_slots) this keeps the window-sum array plus a
+sparse-table range-minimum index over it, so the best start in any
+[earliest, latest_start] range is two lookups and a compare.
+
+The cache is bounded (LRU) and keyed by forecast version, so a new forecast
+simply stops hitting the old entries. run_inference also invalidates it
+after writing new predictions.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = 256
+
+
+def forecast_version(forecast_start_time, carbon_forecast, slot_minutes: int = 30) -> str:
+    """
+    Returns a short id for a forecast's content: the same start time, slot
+    width and values always give the same id, and any change gives a new one.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(f"{forecast_start_time}/{slot_minutes}".encode())
+    digest.update(np.asarray(carbon_forecast, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+class WindowSumIndex:
+    """
+    Window sums for one runtime with a sparse table for range-minimum queries.
+
+    table[j, i] is the leftmost start slot with the smallest sum in
+    [i, i + 2**j). Any range is covered by two overlapping power-of-two blocks.
+    """
+    __slots__ = ("sums", "table", "nbytes")
+
+    def __init__(self, sums: np.ndarray):
+        self.sums = sums
+        n = len(sums)
+        levels = max(1, int(n).bit_length())
+        table = np.empty((levels, n), dtype=np.int64)
+        table[0] = np.arange(n)
+        for j in range(1, levels):
+            half = 1 << (j - 1)
+            left = table[j - 1]
+            right = np.empty(n, dtype=np.int64)
+            right[:n - half] = left[half:]
+            right[n - half:] = left[n - half:]
+            # <= keeps the leftmost slot on ties.
+            table[j] = np.where(sums[left] <= sums[right], left, right)
+        self.table = table
+        self.nbytes = sums.nbytes + table.nbytes
+
+    def best_start(self, lo, hi) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Cheapest start in [lo, hi] (inclusive) for every pair of bounds.
+        Returns (start_slots, costs).
+        """
+        lo = np.asarray(lo, dtype=np.int64)
+        hi = np.asarray(hi, dtype=np.int64)
+        length = hi - lo + 1
+        k = np.frexp(length.astype(np.float64))[1] - 1  # floor(log2(length))
+        a = self.table[k, lo]
+        b = self.table[k, hi - (1 << k) + 1]
+        best = np.where(self.sums[a] <= self.sums[b], a, b)
+        return best, self.sums[best]
+
+
+class WindowSumCache:
+    """
+    Bounded LRU map of (forecast version, runtime_slots) -> WindowSumIndex,
+    with hit/miss counters. Safe to share between threads.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, version: str, prefix: np.ndarray, runtime_slots: int) -> WindowSumIndex:
+        """
+        Returns the index for `runtime_slots` over the forecast whose prefix
+        sums are `prefix`, building and caching it on a miss.
+        """
+        key = (version, runtime_slots)
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return index
+            self.misses += 1
+
+        index = WindowSumIndex(prefix[runtime_slots:] - prefix[:-runtime_slots])
+
+        with self._lock:
+            self._entries[key] = index
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return index
+
+    def invalidate(self, version: str = None):
+        """Drops every entry, or only those of one forecast version."""
+        with self._lock:
+            if version is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == version]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(index.nbytes for index in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+window_cache = WindowSumCache()
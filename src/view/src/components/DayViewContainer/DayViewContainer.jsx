@@ -10,8 +10,12 @@ function DayViewContainer(){
     const {user, setUser} = useContext(AuthContext);
     useEffect(() => {
     const username = user.username;
+    // Only today and tomorrow are shown; the endpoint pages from the oldest event otherwise.
+    const from = startOfDay(new Date());
+    const to = addDays(from, 2);
+    const query = new URLSearchParams({username, from: from.toISOString(), to: to.toISOString()});
 
-    fetch(`http://127.0.0.1:8000/scheduler/events/?username=${username}`)
+    fetch(`http://127.0.0.1:8000/scheduler/events/?${query}`)
       .then((res) => res.json())
       .then((data) => {
         console.log("Fetched events:", data);
@@ -1,7 +1,9 @@
 import React from "react";
 import './EventSetter.css';
+import { AuthContext } from "../../Contexts/AuthContext.jsx";
 
 function EventSetter() {
+    const { user } = React.useContext(AuthContext);
     const appliances = [
       {name: "Washing Machine", runtime_min: 120},
       {name: "Dishwasher", runtime_min: 90},
@@ -141,7 +143,8 @@ function EventSetter() {
       headers: {
         "Content-Type": "application/json"
       },
-      body: JSON.stringify({ appliances: [payload] }), // Django expects a list
+      // Django expects a list, and the user the events belong to.
+      body: JSON.stringify({ appliances: [payload], username: user.username }),
     });
 
     const data = await response.json();